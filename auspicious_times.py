@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Auspicious Times Library
+Import-safe API over the enhancement pipeline for long-lived processes
+such as a web service.
+
+    enhancer = Enhancer()                              # nothing read yet
+    enhanced, run = enhancer.enhance_calendar(ics_text)  # tables load here, once
+    auspicious, inauspicious, skipped = Splitter().split_calendar(enhanced)
+
+Importing this module does no I/O. An Enhancer loads good_bad_time.ics and
+pengzu_100_taboos.ics on first use (from the compiled lookup cache when it
+is valid), exactly once even under concurrent first calls, and then reuses
+the tables for every calendar. Nothing is kept in module globals: each call
+records into its own RunMetrics, so one Enhancer can serve many requests
+at the same time.
+"""
+
+import re
+import threading
+from typing import NamedTuple
+
+from ganzhi import DEFAULT_ZI_CONVENTION, day_key
+from ics_extract import parse_event, summary_marker, time_ganzhi as extract_time_ganzhi, value_date
+from ics_mmap import CalendarBuffer, MappedCalendar
+from ics_tokenizer import fold_line, iter_components
+from ics_writer import PatchWriter, write_ics
+from lookup_cache import default_cache_path, load_cache, save_cache
+from marker_index import MarkerIndex
+from metrics import RunMetrics
+from progress import progress_reporter
+from taboo_index import TabooIndex
+
+__all__ = [
+    'Enhancer',
+    'MarkerIndex',
+    'RunMetrics',
+    'Splitter',
+    'SummaryPatch',
+    'TabooIndex',
+    'enhance_summary',
+    'process_event',
+    'process_mapped_event',
+]
+
+GOOD_BAD_FILE = "good_bad_time.ics"
+PENGZU_FILE = "pengzu_100_taboos.ics"
+
+AUSPICIOUS_NAME = "Auspicious Times"
+INAUSPICIOUS_NAME = "Inauspicious Times"
+
+CALNAME_PATTERN = re.compile(r'X-WR-CALNAME:[^\r\n]*')
+
+
+# Reference data
+
+def iter_marker_entries(events):
+    """Yield (date, ganzhi, marker) for every time slot in good_bad_time events
+
+    events are property dicts as returned by read_events().
+    """
+    progress = progress_reporter(len(events), 'good_bad_time.ics')
+    for idx, event in enumerate(events):
+        progress.update(idx + 1)
+
+        # Date and summary with 13 time slots
+        date = value_date(event.get('DTSTART'))
+        summary = event.get('SUMMARY')
+        if not date or not summary:
+            continue
+
+        # Parse each time slot: "ganzhi + marker"
+        slots = summary.split()
+        for slot in slots:
+            if len(slot) >= 3:  # At least 2 chars ganzhi + 1 char marker
+                ganzhi = slot[:-1]  # Everything except last char
+                marker = slot[-1]    # Last char (吉 or 凶)
+                yield date, ganzhi, marker
+    progress.finish()
+
+def iter_taboo_entries(events):
+    """Yield (date, taboo_text) for every taboo in pengzu_100_taboos events
+
+    events are property dicts as returned by read_events().
+    """
+    progress = progress_reporter(len(events), 'pengzu_100_taboos.ics')
+    for idx, event in enumerate(events):
+        progress.update(idx + 1)
+
+        # Date and summary with taboos
+        date = value_date(event.get('DTSTART'))
+        summary = event.get('SUMMARY')
+        if not date or not summary:
+            continue
+
+        # Parse taboos separated by comma
+        # Format: "庚不经络 织机虚张,午不苫盖 屋主更张"
+        # The first character (stem '庚' or branch '午') keys the taboo
+        taboo_pairs = summary.split(',')
+        for taboo_pair in taboo_pairs:
+            taboo_pair = taboo_pair.strip()
+            if taboo_pair:
+                yield date, taboo_pair
+    progress.finish()
+
+def read_events(filepath):
+    """Top-level {NAME: value} properties of each VEVENT of an ICS file
+
+    Read with ics_tokenizer, so folded lines, CRLF endings and nested
+    components such as VALARM are handled.
+    """
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        return list(iter_components(f))
+
+def load_reference_tables(good_bad_file=GOOD_BAD_FILE, pengzu_file=PENGZU_FILE, use_cache=True):
+    """Return (marker_index, taboo_index, from_cache) for the given sources"""
+    sources = {'good_bad': good_bad_file, 'pengzu': pengzu_file}
+    cache_path = default_cache_path(good_bad_file)
+
+    if use_cache:
+        cached = load_cache(cache_path, sources)
+        if cached is not None:
+            return cached + (True,)
+
+    marker_index = MarkerIndex.from_entries(iter_marker_entries(read_events(good_bad_file)))
+    taboo_index = TabooIndex.from_entries(iter_taboo_entries(read_events(pengzu_file)))
+
+    if use_cache:
+        try:
+            save_cache(cache_path, sources, marker_index, taboo_index)
+        except OSError:
+            pass  # The cache is an optimization; a read-only directory is fine
+
+    return marker_index, taboo_index, False
+
+
+# Enhancement
+
+def enhance_summary(summary, day, marker_lookup, taboo_lookup):
+    """Enhance a summary with marker and taboos
+
+    day is the reference-day ordinal of the hour (see ganzhi.day_key).
+    Format: 『{marker} [{taboo}] {original_content}』
+    """
+    # Extract time ganzhi from summary: 『XX时
+    time_ganzhi = extract_time_ganzhi(summary)
+    if not time_ganzhi:
+        return summary, False, False
+
+    enhanced = summary
+    marker_found = False
+    taboo_found = False
+
+    # Look up marker
+    marker = marker_lookup.lookup_day(day, time_ganzhi)
+    if marker:
+        marker_found = True
+
+    # Look up taboos for this date and stem (and branch, if enabled)
+    taboos = taboo_lookup.lookup_day(day, time_ganzhi)
+    if taboos:
+        taboo_found = True
+
+    # Build enhanced summary
+    if marker_found or taboo_found:
+        # Start building the enhanced summary
+        content = summary[1:-1]  # Remove 『 and 』
+
+        # Build the new content with marker and taboos
+        parts = []
+        if marker:
+            parts.append(marker)
+
+        for taboo in taboos:
+            parts.append(f"[{taboo}]")
+
+        enhanced = f"『{' '.join(parts)} {content}』"
+
+        return enhanced, marker_found, taboo_found
+
+    return summary, False, False
+
+def resolve_summary(summary, date, dtstart, marker_lookup, taboo_lookup, metrics,
+                    zi_convention=DEFAULT_ZI_CONVENTION):
+    """Enhanced summary of one event, or None; the outcome is recorded in metrics"""
+    enhanced_summary, marker_found, taboo_found = enhance_summary(
+        summary, day_key(dtstart, zi_convention), marker_lookup, taboo_lookup
+    )
+
+    if marker_found or taboo_found:
+        metrics.record_lookup(marker_found, taboo_found)
+        metrics.enhanced_events += 1
+        if taboo_found:
+            metrics.taboo_added += 1
+
+        # Store sample
+        metrics.add_sample({
+            'date': date,
+            'before': f'SUMMARY:{summary.strip()}',
+            'after': f'SUMMARY:{enhanced_summary}'
+        })
+        return enhanced_summary
+
+    metrics.skipped_events += 1
+    time_ganzhi = extract_time_ganzhi(summary)
+    if time_ganzhi:
+        metrics.record_lookup(False, False)
+        metrics.warn(f"No enhancement found for {date}/{time_ganzhi}")
+        metrics.missing_lookups += 1
+    return None
+
+def process_event(event_text, marker_lookup, taboo_lookup, metrics, fold=False,
+                  zi_convention=DEFAULT_ZI_CONVENTION):
+    """Process a single VEVENT block, recording the outcome in metrics
+
+    zi_convention decides which reference day a 23:00 hour is looked up
+    on (see ganzhi.ZI_CONVENTIONS). Line endings and folding of the
+    untouched lines are kept as they are in event_text.
+    """
+    # Locate DTSTART and SUMMARY in a single scan
+    record = parse_event(event_text)
+    if record.text is not event_text:
+        # Folded or CRLF block: patch it in place instead of its unfolded LF form
+        data = event_text.encode('utf-8')
+        event = CalendarBuffer(data).event(0, len(data))
+        patch = process_mapped_event(event, marker_lookup, taboo_lookup, metrics,
+                                     fold=fold, zi_convention=zi_convention)
+        if patch is None:
+            return event_text
+        return b''.join(patched_chunks(event, patch)).decode('utf-8')
+    date = record.date
+    if record.summary is None or not date:
+        return event_text
+
+    enhanced_summary = resolve_summary(record.summary_text, date, record.value('dtstart'),
+                                       marker_lookup, taboo_lookup, metrics, zi_convention)
+    if enhanced_summary is None:
+        return event_text
+
+    # Splice the new SUMMARY value into the original text
+    return record.replace_summary(enhanced_summary, fold=fold)
+
+class SummaryPatch(NamedTuple):
+    """Replacement of one SUMMARY value: source[start:end] becomes data"""
+    start: int
+    end: int
+    data: bytes
+    summary: str
+
+def process_mapped_event(event, marker_lookup, taboo_lookup, metrics, fold=False,
+                         zi_convention=DEFAULT_ZI_CONVENTION):
+    """process_event() for an ics_mmap.MappedEvent; return a SummaryPatch or None
+
+    Only DTSTART and SUMMARY are decoded, and the only bytes built are
+    those of the new SUMMARY value (the whole line when folding), as a
+    patch against the mapped source; None means the event is unchanged.
+    Unlike process_event, line endings and folding of the untouched lines
+    are kept as they are in the source.
+    """
+    span = event.span('SUMMARY')
+    date = event.date
+    if span is None or not date:
+        return None
+
+    enhanced_summary = resolve_summary(event.summary_text, date, event.value('dtstart'),
+                                       marker_lookup, taboo_lookup, metrics, zi_convention)
+    if enhanced_summary is None:
+        return None
+
+    start, end = span
+    if fold:
+        start = event.line_start(start)
+        head = str(event.view[start:span[0]], 'utf-8')
+        replacement = fold_line(head + enhanced_summary, newline=event.newline().decode('ascii'))
+    else:
+        replacement = enhanced_summary
+    return SummaryPatch(start, end, replacement.encode('utf-8'), enhanced_summary)
+
+def patched_chunks(event, patch):
+    """Byte chunks of a MappedEvent with its SummaryPatch (or None) applied"""
+    if patch is None:
+        return [event.chunk]
+    view = event.view
+    return [view[event.start:patch.start], patch.data, view[patch.end:event.end]]
+
+def iter_mapped_parts(calendar, marker_lookup, taboo_lookup, metrics, fold=False,
+                      zi_convention=DEFAULT_ZI_CONVENTION):
+    """Enhance an ics_mmap.MappedCalendar part by part
+
+    Yields (kind, start, end, event, patch): the part's offsets in the map,
+    and for events the MappedEvent and its SummaryPatch (None if unchanged).
+    """
+    for kind, start, end in calendar.parts():
+        if kind == 'event':
+            event = calendar.event(start, end)
+            patch = process_mapped_event(event, marker_lookup, taboo_lookup, metrics,
+                                         fold=fold, zi_convention=zi_convention)
+            yield kind, start, end, event, patch
+        else:
+            yield kind, start, end, None, None
+
+def calendar_sections(content):
+    """Split calendar text into (header, events, footer)
+
+    events are the blocks following each 'BEGIN:VEVENT', each ending with
+    its END:VEVENT line; the footer is whatever trails the last END:VEVENT
+    line (normally END:VCALENDAR), so header + events + footer round-trips.
+    """
+    # Extract header (everything before first VEVENT)
+    header_match = re.search(r'(.*?)BEGIN:VEVENT', content, re.DOTALL)
+    header = header_match.group(1) if header_match else ""
+
+    events = content.split('BEGIN:VEVENT')[1:]
+
+    # Cut the footer off the last event, after its END:VEVENT line
+    footer = ""
+    if events:
+        last = events[-1]
+        end = last.rfind('END:VEVENT')
+        if end != -1:
+            line_end = last.find('\n', end)
+            cut = len(last) if line_end == -1 else line_end + 1
+            events[-1], footer = last[:cut], last[cut:]
+    return header, events, footer
+
+def iter_calendar_parts(filepath):
+    """Stream an ICS file as ('header' | 'event' | 'gap' | 'footer', text) parts
+
+    Reads line by line so that at most one VEVENT is held in memory; line
+    endings are kept as they are in the file. Text outside VEVENT blocks is buffered until we know whether another
+    VEVENT follows it ('gap') or it is the end of the file ('footer').
+    """
+    pending = []
+    seen_event = False
+    current_event = None
+
+    with open(filepath, 'rb') as f:
+        for raw in f:
+            line = raw.decode('utf-8')
+
+            if current_event is not None:
+                current_event.append(line)
+                if line.startswith('END:VEVENT'):
+                    yield 'event', ''.join(current_event), f.tell()
+                    current_event = None
+                continue
+
+            if line.startswith('BEGIN:VEVENT'):
+                if pending:
+                    yield ('gap' if seen_event else 'header'), ''.join(pending), f.tell()
+                    pending = []
+                elif not seen_event:
+                    yield 'header', '', f.tell()
+                seen_event = True
+                current_event = [line]
+            else:
+                pending.append(line)
+
+    if current_event is not None:
+        # Unterminated trailing VEVENT: pass it through untouched
+        pending = current_event + pending
+    yield ('footer' if seen_event else 'header'), ''.join(pending), None
+
+def rename_calendar(header, calendar_name):
+    """Header with its X-WR-CALNAME replaced"""
+    return CALNAME_PATTERN.sub(lambda _: f'X-WR-CALNAME:{calendar_name}', header)
+
+
+class Enhancer:
+    """Add 吉/凶 markers and Pengzu taboos to trunk calendars
+
+    Construct once and reuse: the reference tables are loaded on first use
+    and shared by every later call. marker_index/taboo_index may be passed
+    in to skip loading altogether. The Enhancer owns its taboo index and
+    sets its include_branch flag from branch_taboos. zi_convention picks
+    the reference day of 23:00 hours (see ganzhi.ZI_CONVENTIONS).
+    """
+
+    def __init__(self, good_bad_file=GOOD_BAD_FILE, pengzu_file=PENGZU_FILE, *,
+                 branch_taboos=False, fold=False, use_cache=True,
+                 marker_index=None, taboo_index=None, zi_convention=DEFAULT_ZI_CONVENTION):
+        self.good_bad_file = good_bad_file
+        self.pengzu_file = pengzu_file
+        self.branch_taboos = branch_taboos
+        self.fold = fold
+        self.zi_convention = zi_convention
+        self.use_cache = use_cache
+        self._lock = threading.Lock()
+        self._tables = None
+        if marker_index is not None and taboo_index is not None:
+            self._set_tables(marker_index, taboo_index)
+
+    def _set_tables(self, marker_index, taboo_index):
+        taboo_index.include_branch = self.branch_taboos
+        self._tables = (marker_index, taboo_index)
+
+    def tables(self):
+        """(marker_index, taboo_index), loading them on the first call"""
+        tables = self._tables
+        if tables is None:
+            with self._lock:
+                if self._tables is None:
+                    marker_index, taboo_index, _ = load_reference_tables(
+                        self.good_bad_file, self.pengzu_file, self.use_cache
+                    )
+                    self._set_tables(marker_index, taboo_index)
+                tables = self._tables
+        return tables
+
+    @property
+    def loaded(self):
+        return self._tables is not None
+
+    @property
+    def marker_index(self):
+        return self.tables()[0]
+
+    @property
+    def taboo_index(self):
+        return self.tables()[1]
+
+    def enhance_event(self, event_text, metrics=None):
+        """Enhanced text of one VEVENT block"""
+        metrics = metrics if metrics is not None else RunMetrics()
+        marker_index, taboo_index = self.tables()
+        return process_event(event_text, marker_index, taboo_index, metrics, fold=self.fold,
+                             zi_convention=self.zi_convention)
+
+    def enhance_calendar(self, content, metrics=None):
+        """Enhance a whole calendar; return (enhanced_text, metrics)"""
+        metrics = metrics if metrics is not None else RunMetrics()
+        marker_index, taboo_index = self.tables()
+        header, events, footer = calendar_sections(content)
+        metrics.bytes_read += len(content.encode('utf-8'))
+        metrics.total_events += len(events)
+
+        options = {'fold': self.fold, 'zi_convention': self.zi_convention}
+        with metrics.stage('enhance') as stage:
+            enhanced = ''.join([
+                header,
+                *(f'BEGIN:VEVENT{process_event(event, marker_index, taboo_index, metrics, **options)}'
+                  for event in events),
+                footer,
+            ])
+            stage.events = len(events)
+        return enhanced, metrics
+
+    def enhance_file(self, source, destination, metrics=None, atomic=False, fsync=False):
+        """Enhance the calendar at source into destination; return metrics
+
+        The source is memory-mapped and only DTSTART and SUMMARY are
+        decoded: each enhanced SUMMARY becomes a patch against the source
+        and everything in between is copied byte for byte. The copied and
+        patched byte counts are recorded in metrics.
+        """
+        metrics = metrics if metrics is not None else RunMetrics()
+        marker_index, taboo_index = self.tables()
+        options = {'fold': self.fold, 'zi_convention': self.zi_convention}
+        with MappedCalendar(source) as calendar, \
+                PatchWriter(destination, calendar.view, calendar.fileno(), atomic=atomic, fsync=fsync) as writer, \
+                metrics.stage('enhance') as stage:
+            events = 0
+            for kind, _, _, _, patch in iter_mapped_parts(calendar, marker_index, taboo_index, metrics, **options):
+                if patch is not None:
+                    writer.patch(patch.start, patch.end, patch.data)
+                events += kind == 'event'
+            writer.copy_to(calendar.size)
+            stage.events += events
+            metrics.total_events += events
+            metrics.bytes_read += calendar.size
+        metrics.record_patches(writer)
+        return metrics
+
+
+class Splitter:
+    """Split an enhanced calendar into auspicious (吉) and inauspicious (凶) calendars"""
+
+    def __init__(self, auspicious_name=AUSPICIOUS_NAME, inauspicious_name=INAUSPICIOUS_NAME):
+        self.auspicious_name = auspicious_name
+        self.inauspicious_name = inauspicious_name
+
+    @staticmethod
+    def classify(event_text):
+        """'吉', '凶' or None from the marker at the start of SUMMARY"""
+        return summary_marker(parse_event(event_text).summary_text)
+
+    def partition(self, content):
+        """Return (header, footer, auspicious_events, inauspicious_events, skipped)"""
+        header, events, footer = calendar_sections(content)
+        auspicious_events = []
+        inauspicious_events = []
+        skipped = 0
+        for event in events:
+            marker = self.classify(event)
+            if marker == '吉':
+                auspicious_events.append(event)
+            elif marker == '凶':
+                inauspicious_events.append(event)
+            else:
+                skipped += 1
+        return header, footer, auspicious_events, inauspicious_events, skipped
+
+    def split_calendar(self, content):
+        """Return (auspicious_text, inauspicious_text, skipped)"""
+        header, footer, auspicious, inauspicious, skipped = self.partition(content)
+
+        def render(name, events):
+            return ''.join([rename_calendar(header, name), *(f'BEGIN:VEVENT{e}' for e in events), footer])
+
+        return (render(self.auspicious_name, auspicious),
+                render(self.inauspicious_name, inauspicious),
+                skipped)
+
+    def split_file(self, source, auspicious_path, inauspicious_path, atomic=False, fsync=False):
+        """Split the calendar at source; return (auspicious, inauspicious, skipped) counts"""
+        with open(source, 'r', encoding='utf-8') as f:
+            content = f.read()
+        header, footer, auspicious, inauspicious, skipped = self.partition(content)
+        for path, name, events in ((auspicious_path, self.auspicious_name, auspicious),
+                                   (inauspicious_path, self.inauspicious_name, inauspicious)):
+            write_ics(path, rename_calendar(header, name), events, footer,
+                      event_prefix='BEGIN:VEVENT', atomic=atomic, fsync=fsync)
+        return len(auspicious), len(inauspicious), skipped
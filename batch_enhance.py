@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Batch Calendar Enhancement
+Enhance and split many trunk calendars against one load of the reference
+tables.
+
+    python3 batch_enhance.py trunks/ -o enhanced/
+    python3 batch_enhance.py 'trunks/**/cal_*.ics' -o enhanced/ --workers 4
+
+Inputs are directories (searched recursively for *.ics), glob patterns or
+single files. good_bad_time.ics and pengzu_100_taboos.ics are parsed (or
+read from the lookup cache) once; a bounded pool of worker processes then
+takes one trunk file at a time, so the tables are shared instead of being
+re-parsed by one interpreter per file. Each trunk file X.ics is written to
+the same relative directory under the output directory as
+X_enhanced.ics, X_auspicious.ics and X_inauspicious.ics, in the single
+memory-mapped pass used by `enhance_calendar_v2.py --stream`, with the
+enhanced file validated as it is written. A summary line is printed per
+file as it finishes, then a table of all files.
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from auspicious_times import (
+    GOOD_BAD_FILE, PENGZU_FILE, iter_mapped_parts, load_reference_tables, patched_chunks,
+)
+from enhance_calendar_v2 import positive_int
+from ganzhi import DEFAULT_ZI_CONVENTION, ZI_CONVENTIONS
+from ics_mmap import MappedCalendar
+from ics_validator import ICSValidator
+from ics_writer import PatchWriter
+from metrics import RunMetrics
+from split_engine import EventFacts, SplitEngine, standard_feeds
+
+OUTPUT_DIR = "enhanced"
+
+OUTPUT_SUFFIXES = ('_enhanced', '_auspicious', '_inauspicious')
+
+
+class BatchJob(NamedTuple):
+    source: Path
+    relative: Path  # source path relative to its input root
+    enhanced: Path
+    auspicious: Path
+    inauspicious: Path
+
+
+class FileResult(NamedTuple):
+    relative: Path
+    events: int = 0
+    enhanced: int = 0
+    missing: int = 0
+    auspicious: int = 0
+    inauspicious: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+    errors: int = 0  # validation errors in the enhanced file
+    failure: str = ''  # exception that stopped the file, if any
+
+    @property
+    def ok(self):
+        return not self.failure and not self.errors
+
+
+# Discovery
+
+def _glob_root(pattern):
+    """Leading directories of a glob pattern that contain no wildcards"""
+    root = []
+    for part in Path(pattern).parts:
+        if glob.has_magic(part):
+            break
+        root.append(part)
+    return Path(*root) if root else Path('.')
+
+
+def _is_output(path):
+    return path.stem.endswith(OUTPUT_SUFFIXES)
+
+
+def find_trunk_files(inputs, exclude=()):
+    """[(source, relative path)] for every calendar named by the inputs
+
+    Directories are searched recursively for *.ics files; globs are
+    expanded (** included) and mirrored from their first wildcard. Files
+    that look like outputs (X_enhanced.ics, ...) or are listed in exclude
+    (e.g. the reference calendars) are skipped.
+    """
+    excluded = {Path(path).resolve() for path in exclude}
+    found = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            root = Path(item)
+            matches = root.rglob('*.ics')
+        elif glob.has_magic(item):
+            root = _glob_root(item)
+            matches = (Path(match) for match in glob.glob(item, recursive=True))
+        elif os.path.isfile(item):
+            root = Path(item).parent
+            matches = [Path(item)]
+        else:
+            raise FileNotFoundError(f"no such file or directory: {item}")
+
+        for path in matches:
+            resolved = path.resolve()
+            if not path.is_file() or _is_output(path) or resolved in excluded:
+                continue
+            if any(resolved.is_relative_to(directory) for directory in excluded if directory.is_dir()):
+                continue
+            found.setdefault(resolved, (path, path.relative_to(root)))
+    return sorted(found.values(), key=lambda item: item[1])
+
+
+def plan_jobs(sources, output_dir):
+    """BatchJob per (source, relative path), refusing two sources with one output"""
+    jobs = []
+    targets = {}
+    for source, relative in sources:
+        directory = Path(output_dir) / relative.parent
+        stem = relative.stem
+        other = targets.setdefault(relative, source)
+        if other != source:
+            raise ValueError(f"{source} and {other} would both be written to {directory / stem}_*.ics")
+        jobs.append(BatchJob(source, relative, *(directory / f'{stem}{suffix}.ics' for suffix in OUTPUT_SUFFIXES)))
+    return jobs
+
+
+# Enhancement
+
+def enhance_job(job, marker_lookup, taboo_lookup, fold=False, zi_convention=DEFAULT_ZI_CONVENTION,
+                atomic=False, fsync=False):
+    """Enhance and split one trunk calendar; return its FileResult"""
+    began = time.perf_counter()
+    metrics = RunMetrics()
+    feeds = standard_feeds(job.auspicious, job.inauspicious)
+    validator = ICSValidator()
+    job.enhanced.parent.mkdir(parents=True, exist_ok=True)
+
+    with MappedCalendar(job.source) as calendar, \
+            PatchWriter(job.enhanced, calendar.view, calendar.fileno(),
+                        atomic=atomic, fsync=fsync, validator=validator) as enhanced_out, \
+            SplitEngine(feeds, atomic=atomic, fsync=fsync) as split_out:
+        parts = iter_mapped_parts(calendar, marker_lookup, taboo_lookup, metrics,
+                                  fold=fold, zi_convention=zi_convention)
+        for kind, start, end, event, patch in parts:
+            if kind == 'event':
+                metrics.total_events += 1
+                if patch is not None:
+                    enhanced_out.patch(patch.start, patch.end, patch.data)
+                split_out.write_event_chunks(patched_chunks(event, patch),
+                                             EventFacts.from_record(event, patch and patch.summary))
+            elif kind == 'header':
+                split_out.write_header(calendar.text(start, end))
+            elif kind == 'footer':
+                split_out.write_footer(calendar.text(start, end))
+        enhanced_out.copy_to(calendar.size)
+
+    return FileResult(
+        job.relative,
+        events=metrics.total_events,
+        enhanced=metrics.enhanced_events,
+        missing=metrics.missing_lookups,
+        auspicious=feeds[0].events,
+        inauspicious=feeds[1].events,
+        bytes_written=enhanced_out.bytes_written + split_out.bytes_written,
+        seconds=time.perf_counter() - began,
+        errors=validator.report.error_count,
+    )
+
+
+# Reference tables and options of a worker process, set once by _init_worker
+_worker_state = None
+
+
+def _init_worker(marker_lookup, taboo_lookup, options):
+    global _worker_state
+    _worker_state = (marker_lookup, taboo_lookup, options)
+
+
+def _run_job(job):
+    """Worker: enhance one file, turning any failure into a FileResult
+
+    Every Exception is caught so that one malformed calendar cannot abort
+    the rest of the batch.
+    """
+    marker_lookup, taboo_lookup, options = _worker_state
+    try:
+        return enhance_job(job, marker_lookup, taboo_lookup, **options)
+    except Exception as e:
+        return FileResult(job.relative, failure=f'{type(e).__name__}: {e}')
+
+
+def run_batch(jobs, marker_lookup, taboo_lookup, workers=1, **options):
+    """Yield a FileResult per job as each one finishes
+
+    With workers > 1 the files are shared out to a pool of that many
+    processes (at most one file per worker at a time), which receive the
+    reference tables once when the pool starts.
+    """
+    state = (marker_lookup, taboo_lookup, options)
+    if workers <= 1 or len(jobs) <= 1:
+        _init_worker(*state)
+        for job in jobs:
+            yield _run_job(job)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with context.Pool(min(workers, len(jobs)), initializer=_init_worker, initargs=state) as pool:
+        yield from pool.imap_unordered(_run_job, jobs)
+
+
+# Reporting
+
+def describe(result):
+    """One summary line for a finished file"""
+    if result.failure:
+        return f"  ✗ {result.relative}: {result.failure}"
+    mark = '✓' if result.ok else '✗'
+    line = (f"  {mark} {result.relative}: {result.events:,} events, {result.enhanced:,} enhanced, "
+            f"{result.auspicious:,} 吉 / {result.inauspicious:,} 凶, {result.missing:,} missing, "
+            f"{result.seconds:.2f}s")
+    if result.errors:
+        line += f", {result.errors:,} validation errors"
+    return line
+
+
+def print_summary(results, seconds):
+    """Table of every file plus totals"""
+    width = max([len(str(result.relative)) for result in results] + [4])
+    print(f"\n📊 Batch Summary:")
+    print(f"  {'File':<{width}} {'Events':>8} {'Enhanced':>9} {'吉':>7} {'凶':>7} {'Missing':>8} {'Bytes':>12}  Status")
+    for result in results:
+        status = 'OK' if result.ok else ('FAILED' if result.failure else 'INVALID')
+        print(f"  {str(result.relative):<{width}} {result.events:>8,} {result.enhanced:>9,} "
+              f"{result.auspicious:>7,} {result.inauspicious:>7,} {result.missing:>8,} "
+              f"{result.bytes_written:>12,}  {status}")
+    print(f"  {'─' * (width + 66)}")
+    print(f"  {'Total':<{width}} {sum(r.events for r in results):>8,} {sum(r.enhanced for r in results):>9,} "
+          f"{sum(r.auspicious for r in results):>7,} {sum(r.inauspicious for r in results):>7,} "
+          f"{sum(r.missing for r in results):>8,} {sum(r.bytes_written for r in results):>12,}")
+    failed = sum(1 for result in results if not result.ok)
+    print(f"\n  {len(results) - failed}/{len(results)} files OK in {seconds:.2f}s")
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help='trunk calendar files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR,
+                        help=f'root of the mirrored output tree (default {OUTPUT_DIR})')
+    parser.add_argument('--workers', type=positive_int, default=min(os.cpu_count() or 1, 8), metavar='N',
+                        help='files enhanced at the same time, one worker process each (default: CPUs, up to 8)')
+    parser.add_argument('--good-bad', default=GOOD_BAD_FILE, help=f'marker reference calendar (default {GOOD_BAD_FILE})')
+    parser.add_argument('--pengzu', default=PENGZU_FILE, help=f'taboo reference calendar (default {PENGZU_FILE})')
+    parser.add_argument('--branch-taboos', action='store_true',
+                        help="also apply the earthly-branch taboo (e.g. '午不苫盖 屋主更张') to matching hours")
+    parser.add_argument('--fold', action='store_true', help='fold enhanced SUMMARY lines longer than 75 octets (RFC 5545)')
+    parser.add_argument('--zi-convention', choices=ZI_CONVENTIONS, default=DEFAULT_ZI_CONVENTION,
+                        help="reference day of the 23:00 hour (see enhance_calendar_v2.py)")
+    parser.add_argument('--atomic-writes', action='store_true',
+                        help='write each output to a temporary file and atomically rename it into place')
+    parser.add_argument('--fsync', action='store_true', help='fsync each output file before closing it')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always re-parse the reference calendars and do not write the lookup cache')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+    try:
+        sources = find_trunk_files(args.inputs, exclude=(args.good_bad, args.pengzu, args.output_dir))
+        jobs = plan_jobs(sources, args.output_dir)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"❌ {e}")
+    if not jobs:
+        raise SystemExit("❌ No trunk calendars found")
+
+    began = time.perf_counter()
+    print(f"[1/2] Loading reference tables...")
+    marker_lookup, taboo_lookup, from_cache = load_reference_tables(args.good_bad, args.pengzu, not args.no_cache)
+    taboo_lookup.include_branch = args.branch_taboos
+    print(f"✓ {len(marker_lookup):,} markers, {len(taboo_lookup):,} taboos"
+          f"{' (from cache)' if from_cache else ''}\n")
+
+    workers = min(args.workers, len(jobs))
+    print(f"[2/2] Enhancing {len(jobs)} calendars into {args.output_dir}/ with {workers} worker(s)...\n")
+    results = []
+    for result in run_batch(jobs, marker_lookup, taboo_lookup, workers=workers,
+                            fold=args.fold, zi_convention=args.zi_convention,
+                            atomic=args.atomic_writes, fsync=args.fsync):
+        print(describe(result))
+        results.append(result)
+
+    results.sort(key=lambda result: result.relative)
+    print_summary(results, time.perf_counter() - began)
+    if not all(result.ok for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
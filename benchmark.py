@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Enhancement Benchmark
+Time each stage of enhance_calendar_v2.py on synthetic (or given) calendars
+and report throughput, peak RSS and allocations as JSON.
+
+    python3 benchmark.py --years 10 --json results.json
+    python3 benchmark.py --years 10 --baseline results.json   # exit 1 on regression
+
+Stages run in pipeline order with the script's own functions:
+build_lookup_dictionary, build_taboo_dictionary, enhance_trunk_branch,
+split_into_two_files and validate_output_file. The enhanced file is
+normally validated while it is written, which the enhance stage already
+includes, so validate_output_file times a full ics_validator.validate_file()
+pass over the written file instead. Timings are the best of --repeat runs. Allocations (tracemalloc peak and allocated blocks) are
+measured in a separate pass, because tracing slows everything down.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import enhance_calendar_v2 as enhancer
+import ics_validator
+import synthetic_calendar
+from metrics import RunMetrics
+
+STAGES = (
+    'build_lookup_dictionary',
+    'build_taboo_dictionary',
+    'enhance_trunk_branch',
+    'split_into_two_files',
+    'validate_output_file',
+)
+
+# Fractional slowdown against a baseline that counts as a regression
+DEFAULT_MAX_REGRESSION = 0.20
+
+BENCHMARK_VERSION = 1
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident set size"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def point_enhancer_at(data_dir, output_dir):
+    """Redirect the enhancer's input and output files into the given directories"""
+    enhancer.GOOD_BAD_FILE = os.path.join(data_dir, synthetic_calendar.GOOD_BAD_NAME)
+    enhancer.PENGZU_FILE = os.path.join(data_dir, synthetic_calendar.PENGZU_NAME)
+    enhancer.TRUNK_FILE = os.path.join(data_dir, synthetic_calendar.TRUNK_NAME)
+    enhancer.ENHANCED_FILE = os.path.join(output_dir, 'cal_trunkBranch_enhanced.ics')
+    enhancer.AUSPICIOUS_FILE = os.path.join(output_dir, 'cal_trunkBranch_auspicious.ics')
+    enhancer.INAUSPICIOUS_FILE = os.path.join(output_dir, 'cal_trunkBranch_inauspicious.ics')
+    enhancer.LOG_FILE = os.path.join(output_dir, 'enhancement_log.txt')
+
+
+def count_events(filepath):
+    with open(filepath, 'rb') as f:
+        return sum(chunk.count(b'BEGIN:VEVENT') for chunk in iter(lambda: f.read(1 << 20), b''))
+
+
+def run_pipeline(on_stage):
+    """Run every stage once, calling on_stage(name, thunk) to execute each"""
+    enhancer.metrics = RunMetrics()
+    marker_lookup = on_stage('build_lookup_dictionary', enhancer.build_lookup_dictionary)
+    taboo_lookup = on_stage('build_taboo_dictionary', enhancer.build_taboo_dictionary)
+    content = on_stage(
+        'enhance_trunk_branch', lambda: enhancer.enhance_trunk_branch(marker_lookup, taboo_lookup)
+    )
+    counts = on_stage('split_into_two_files', lambda: enhancer.split_into_two_files(content))
+    # validate_output_file() would return the report of the inline validator
+    report = on_stage('validate_output_file', lambda: ics_validator.validate_file(enhancer.ENHANCED_FILE))
+    return counts, report
+
+
+def time_stages(repeat):
+    """Best wall time per stage over `repeat` runs, plus peak RSS after each"""
+    seconds = {name: float('inf') for name in STAGES}
+    rss = {}
+
+    def timed(name, thunk):
+        start = time.perf_counter()
+        result = thunk()
+        seconds[name] = min(seconds[name], time.perf_counter() - start)
+        rss[name] = peak_rss_bytes()
+        return result
+
+    for _ in range(repeat):
+        counts, report = run_pipeline(timed)
+    return seconds, rss, counts, report
+
+
+def trace_stages():
+    """tracemalloc peak bytes and allocated blocks per stage"""
+    allocations = {}
+
+    def traced(name, thunk):
+        tracemalloc.start()
+        try:
+            result = thunk()
+            _, peak = tracemalloc.get_traced_memory()
+            blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        finally:
+            tracemalloc.stop()
+        allocations[name] = {'peak_bytes': peak, 'live_blocks': blocks}
+        return result
+
+    run_pipeline(traced)
+    return allocations
+
+
+def run_benchmark(data_dir, output_dir, repeat=1, allocations=True):
+    """Benchmark the stages on the calendars in data_dir; return the result dict"""
+    point_enhancer_at(data_dir, output_dir)
+
+    inputs = {
+        'good_bad': enhancer.GOOD_BAD_FILE,
+        'pengzu': enhancer.PENGZU_FILE,
+        'trunk': enhancer.TRUNK_FILE,
+    }
+    sizes = {role: os.path.getsize(path) for role, path in inputs.items()}
+    events = {role: count_events(path) for role, path in inputs.items()}
+
+    # The stages report progress on stdout; keep it out of the measurements
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        seconds, rss, counts, report = time_stages(repeat)
+        traced = trace_stages() if allocations else {}
+
+    enhanced_bytes = os.path.getsize(enhancer.ENHANCED_FILE)
+    work = {
+        'build_lookup_dictionary': (events['good_bad'], sizes['good_bad']),
+        'build_taboo_dictionary': (events['pengzu'], sizes['pengzu']),
+        'enhance_trunk_branch': (events['trunk'], sizes['trunk']),
+        'split_into_two_files': (events['trunk'], enhanced_bytes),
+        'validate_output_file': (events['trunk'], enhanced_bytes),
+    }
+
+    stages = {}
+    for name in STAGES:
+        elapsed = seconds[name]
+        stage_events, stage_bytes = work[name]
+        stages[name] = {
+            'seconds': round(elapsed, 6),
+            'events': stage_events,
+            'bytes': stage_bytes,
+            'events_per_second': round(stage_events / elapsed, 1) if elapsed else None,
+            'mb_per_second': round(stage_bytes / elapsed / 1e6, 3) if elapsed else None,
+            'peak_rss_bytes': rss[name],
+        }
+        if name in traced:
+            stages[name].update(
+                alloc_peak_bytes=traced[name]['peak_bytes'],
+                alloc_live_blocks=traced[name]['live_blocks'],
+            )
+
+    auspicious, inauspicious, skipped = counts
+    return {
+        'version': BENCHMARK_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'inputs': {role: {'bytes': sizes[role], 'events': events[role]} for role in inputs},
+        'stages': stages,
+        'total_seconds': round(sum(seconds.values()), 6),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'result': {
+            'enhanced_events': enhancer.metrics.enhanced_events,
+            'auspicious': auspicious,
+            'inauspicious': inauspicious,
+            'skipped': skipped,
+            'valid': report.ok,
+        },
+    }
+
+
+def find_regressions(result, baseline, max_regression):
+    """Stages whose time grew by more than max_regression over the baseline"""
+    regressions = []
+    for name, stage in result['stages'].items():
+        before = baseline.get('stages', {}).get(name, {}).get('seconds')
+        if before and stage['seconds'] > before * (1 + max_regression):
+            regressions.append((name, before, stage['seconds']))
+    return regressions
+
+
+def print_summary(result):
+    inputs = result['inputs']
+    print(f"Trunk: {inputs['trunk']['events']:,} events ({inputs['trunk']['bytes']:,} bytes), "
+          f"best of {result['repeat']}")
+    print(f"{'Stage':<26}{'Seconds':>10}{'Events/s':>14}{'MB/s':>9}{'Peak RSS':>12}{'Alloc peak':>13}")
+    for name, stage in result['stages'].items():
+        alloc = stage.get('alloc_peak_bytes')
+        alloc = f"{alloc / 1e6:.1f} MB" if alloc is not None else '-'
+        print(f"{name:<26}{stage['seconds']:>10.3f}{stage['events_per_second'] or 0:>14,.0f}"
+              f"{stage['mb_per_second'] or 0:>9.1f}{stage['peak_rss_bytes'] / 1e6:>9.1f} MB{alloc:>13}")
+    print(f"{'total':<26}{result['total_seconds']:>10.3f}")
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=int, default=1,
+                        help=f'years of synthetic data, 1-{synthetic_calendar.MAX_YEARS} (default 1)')
+    parser.add_argument('--start-year', type=int, default=2025, help='first synthetic year (default 2025)')
+    parser.add_argument('--data-dir', help='benchmark the calendars in this directory instead of synthetic data')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage; the best is kept (default 3)')
+    parser.add_argument('--no-allocations', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--json', metavar='PATH', help="write the JSON result to PATH ('-' for stdout)")
+    parser.add_argument('--baseline', metavar='PATH', help='compare against a previous JSON result')
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help=f'allowed slowdown vs the baseline (default {int(DEFAULT_MAX_REGRESSION * 100)}%%)')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='auspicious_bench_') as scratch:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = os.path.join(scratch, 'data')
+            try:
+                synthetic_calendar.generate(data_dir, args.start_year, args.years)
+            except ValueError as e:
+                raise SystemExit(f"❌ {e}")
+        result = run_benchmark(data_dir, scratch, repeat=max(1, args.repeat),
+                               allocations=not args.no_allocations)
+
+    if args.json == '-':
+        json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        print_summary(result)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            print(f"\n✓ Wrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(result, baseline, args.max_regression)
+        for name, before, after in regressions:
+            print(f"⚠️  {name}: {before:.3f}s -> {after:.3f}s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Binary Calendar Format
+Compact intermediate representation of an enhanced calendar, read in place
+through mmap so later stages never re-parse ICS text.
+
+    python3 binary_calendar.py encode cal_trunkBranch_enhanced.ics cal_trunkBranch_enhanced.bin
+    python3 binary_calendar.py decode cal_trunkBranch_enhanced.bin out.ics --marker 吉
+    python3 binary_calendar.py info cal_trunkBranch_enhanced.bin
+
+Each VEVENT becomes one fixed-width row spread over typed columns:
+DTSTART, DTEND and CREATED as int64 seconds, a uint32 UID serial, the
+year/month/day/hour sexagenary indices, the 吉/凶 marker and a taboo
+flag, plus uint32 ids into a deduplicated string table. The table holds
+the SUMMARY prefixes (marker and taboo texts) and event templates: the
+event text with those fields replaced by placeholders, so the repeated
+property lines and DESCRIPTION suffixes are stored once per shape rather
+than once per event. Templates are kept with LF line endings and the
+file's line ending (LF or CRLF) is recorded once in the header, so CRLF
+and folded calendars share templates like LF ones. An event that cannot
+be rebuilt exactly from its fields (e.g. one with mixed line endings) is
+stored verbatim as its own template, which keeps the format lossless for
+any input.
+
+File layout (little-endian), in the lookup cache's section format:
+    8 bytes   magic b'AUSPBIN1'
+    4 bytes   header length N
+    N bytes   UTF-8 JSON header: event count, line ending, header/footer
+              string ids and section offsets
+    ...       one section per column (see COLUMNS)
+    ...       string table: uint32 end offsets, then the UTF-8 blob
+"""
+
+import argparse
+import calendar
+import mmap
+import re
+import sys
+import time
+from array import array
+from functools import lru_cache
+
+from auspicious_times import AUSPICIOUS_NAME, INAUSPICIOUS_NAME, calendar_sections, rename_calendar
+from ganzhi import SEXAGENARY, SEXAGENARY_INDEX
+from ics_extract import parse_event, summary_marker
+from ics_writer import ICSWriter
+from lookup_cache import native_bytes, native_view, read_sections_header, write_sections
+from split_engine import TABOO_PATTERN, EventFacts
+
+MAGIC = b'AUSPBIN1'
+FORMAT_VERSION = 2
+
+BINARY_SUFFIX = '.bin'
+
+MARKER_CODES = {None: 0, '吉': 1, '凶': 2}
+MARKERS = {code: marker for marker, code in MARKER_CODES.items()}
+MARKER_NAMES = {'吉': AUSPICIOUS_NAME, '凶': INAUSPICIOUS_NAME}
+
+FLAG_TABOO = 1
+FLAG_VERBATIM = 2
+FLAG_START = 4
+
+# Sexagenary column value for a missing pillar
+NO_PILLAR = 255
+
+# (name, typecode) of each column, in file order
+COLUMNS = (
+    ('starts', 'q'),
+    ('ends', 'q'),
+    ('created', 'q'),
+    ('serials', 'I'),
+    ('templates', 'I'),
+    ('prefixes', 'I'),
+    ('years', 'B'),
+    ('months', 'B'),
+    ('days', 'B'),
+    ('hours', 'B'),
+    ('markers', 'B'),
+    ('flags', 'B'),
+)
+
+# Placeholders inside templates: NUL followed by a field code
+PLACEHOLDER = '\0'
+START, END, CREATED, SERIAL, PREFIX = 'S', 'E', 'C', 'N', 'P'
+PILLAR_CODES = ('Y', 'M', 'D', 'H')
+
+DATETIME_PATTERN = re.compile(r'^\d{8}T\d{6}$')
+CREATED_PATTERN = re.compile(r'^CREATED:(\d{8}T\d{6})$', re.MULTILINE)
+# Last run of digits before the '@' of the UID, e.g. the 1 in ..._ganzhi_1@YangH9
+UID_SERIAL_PATTERN = re.compile(r'^(UID:[^\n@]*?)(\d{1,9})(\D*@[^\n]*)$', re.MULTILINE)
+PREFIX_PATTERN = re.compile(r'^『((?:[吉凶] )?(?:\[[^\]\n]*\] )*)')
+
+
+def binary_path(calendar_path):
+    """Binary intermediate kept alongside the calendar"""
+    stem = calendar_path[:-4] if calendar_path.endswith('.ics') else calendar_path
+    return stem + BINARY_SUFFIX
+
+
+@lru_cache(maxsize=1 << 16)
+def _day_seconds(yyyymmdd):
+    return calendar.timegm((int(yyyymmdd[:4]), int(yyyymmdd[4:6]), int(yyyymmdd[6:8]), 0, 0, 0, 0, 0, 0))
+
+
+def to_seconds(value):
+    """Seconds since 1970 of a floating YYYYMMDDTHHMMSS value"""
+    return _day_seconds(value[:8]) + int(value[9:11]) * 3600 + int(value[11:13]) * 60 + int(value[13:15])
+
+
+def from_seconds(seconds):
+    """Inverse of to_seconds"""
+    t = time.gmtime(seconds)
+    return '%04d%02d%02dT%02d%02d%02d' % (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec)
+
+
+class StringTable:
+    """Deduplicated strings addressed by id; id 0 is the empty string"""
+
+    def __init__(self):
+        self.strings = ['']
+        self.ids = {'': 0}
+
+    def add(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def sections(self):
+        blob = bytearray()
+        ends = array('I')
+        for text in self.strings:
+            blob += text.encode('utf-8')
+            ends.append(len(blob))
+        return [('string_ends', native_bytes(ends)), ('string_blob', bytes(blob))]
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template):
+    """Template text as (leading literal, ((code, literal), ...))"""
+    parts = template.split(PLACEHOLDER)
+    return parts[0], tuple((part[0], part[1:]) for part in parts[1:])
+
+
+def render(compiled, values):
+    """Fill a compiled template from a {code: text} mapping"""
+    head, pieces = compiled
+    out = [head]
+    for code, literal in pieces:
+        out.append(values[code])
+        out.append(literal)
+    return ''.join(out)
+
+
+def encode_event(text, strings, newline='\n'):
+    """Row values (in COLUMNS order) for one VEVENT text, adding to strings
+
+    newline is the calendar's line ending; templates are built on the
+    LF form of the text and rendered back with newline.
+    """
+    row = [0, 0, 0, 0, 0, 0, NO_PILLAR, NO_PILLAR, NO_PILLAR, NO_PILLAR, 0, 0]
+    original = text
+    if newline != '\n':
+        text = text.replace(newline, '\n')
+    record = parse_event(text)
+    summary = record.summary_text or ''
+    # Marker and taboo columns are filled even for verbatim events
+    row[10] = MARKER_CODES[summary_marker(summary)]
+    match = PREFIX_PATTERN.match(summary)
+    prefix = match.group(1) if match else ''
+    if '[' in prefix:
+        row[11] = FLAG_TABOO
+
+    def verbatim():
+        row[:10] = [0, 0, 0, 0, strings.add(original), 0, NO_PILLAR, NO_PILLAR, NO_PILLAR, NO_PILLAR]
+        row[11] = (row[11] & FLAG_TABOO) | FLAG_VERBATIM
+        return row
+
+    # A stray CR (mixed line endings) cannot be rendered back from the LF form
+    if PLACEHOLDER in text or '\r' in text:
+        return verbatim()
+
+    template = text
+    values = {}
+
+    for column, code, field in ((0, START, 'dtstart'), (1, END, 'dtend')):
+        value = record.value(field)
+        if value and DATETIME_PATTERN.match(value):
+            row[column] = to_seconds(value)
+            values[code] = value
+            template = template.replace(f':{value}\n', f':{PLACEHOLDER}{code}\n')
+    if START in values:
+        row[11] |= FLAG_START
+
+    match = CREATED_PATTERN.search(template)
+    if match:
+        row[2] = to_seconds(match.group(1))
+        values[CREATED] = match.group(1)
+        template = template.replace(match.group(1), PLACEHOLDER + CREATED)
+
+    match = UID_SERIAL_PATTERN.search(template)
+    if match and str(int(match.group(2))) == match.group(2):
+        row[3] = int(match.group(2))
+        values[SERIAL] = match.group(2)
+        template = template[:match.start(2)] + PLACEHOLDER + SERIAL + template[match.end(2):]
+
+    if prefix:
+        row[5] = strings.add(prefix)
+        values[PREFIX] = prefix
+        template = template.replace(f'SUMMARY:『{prefix}', f'SUMMARY:『{PLACEHOLDER}{PREFIX}', 1)
+
+    pillars = (record.value('location') or '').split()
+    if len(pillars) == 4 and all(pillar in SEXAGENARY_INDEX for pillar in pillars):
+        for column, code, pillar in zip(range(6, 10), PILLAR_CODES, pillars):
+            row[column] = SEXAGENARY_INDEX[pillar]
+            values[code] = pillar
+            template = template.replace(pillar, PLACEHOLDER + code)
+
+    # Only keep the decomposition if it rebuilds the event exactly; a value
+    # split by folding is simply left in the template as literal text
+    if render(compile_template(template), values) != text:
+        return verbatim()
+
+    row[4] = strings.add(template)
+    return row
+
+
+class BinaryEncoder:
+    """Accumulate events one at a time, then write the binary file
+
+    Usage:
+        encoder = BinaryEncoder()
+        for event in events:
+            encoder.add(event)
+        encoder.write('out.bin', header, footer)
+
+    newline is the calendar's line ending; by default it is taken from the
+    first event added.
+    """
+
+    def __init__(self, newline=None):
+        self.strings = StringTable()
+        self.columns = [array(typecode) for _, typecode in COLUMNS]
+        self.events = 0
+        self.newline = newline
+
+    def add(self, text):
+        """Encode one VEVENT text (starting at 'BEGIN:VEVENT'); return its row number"""
+        if self.newline is None:
+            self.newline = '\r\n' if '\r\n' in text else '\n'
+        for column, value in zip(self.columns, encode_event(text, self.strings, self.newline)):
+            column.append(value)
+        self.events += 1
+        return self.events - 1
+
+    def write(self, filepath, header, footer, atomic=False, fsync=False):
+        """Write the encoded calendar; return the bytes written"""
+        strings = self.strings
+        meta = {
+            'version': FORMAT_VERSION,
+            'events': self.events,
+            'newline': self.newline or '\n',
+            'header': strings.add(header),
+            'footer': strings.add(footer),
+            'strings': len(strings.strings),
+            'sections': {},
+        }
+        sections = [(name, native_bytes(cells) if cells.itemsize > 1 else cells.tobytes())
+                    for (name, _), cells in zip(COLUMNS, self.columns)]
+        sections += strings.sections()
+        return write_sections(filepath, MAGIC, meta, sections, atomic=atomic, fsync=fsync)
+
+
+def encode_calendar(filepath, header, events, footer, atomic=False, fsync=False):
+    """Write the binary form of a calendar; return the bytes written
+
+    events are full VEVENT texts, starting at 'BEGIN:VEVENT'.
+    """
+    encoder = BinaryEncoder()
+    for text in events:
+        encoder.add(text)
+    return encoder.write(filepath, header, footer, atomic=atomic, fsync=fsync)
+
+
+def encode_file(source, destination=None, atomic=False, fsync=False):
+    """Encode the ICS file at source; return the bytes written"""
+    with open(source, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    header, events, footer = calendar_sections(content)
+    return encode_calendar(destination or binary_path(source), header,
+                           (f'BEGIN:VEVENT{event}' for event in events), footer, atomic, fsync)
+
+
+class RowFacts:
+    """split_engine.EventFacts for one row, answered from the columns without the text"""
+
+    __slots__ = ('binary', 'row')
+
+    def __init__(self, binary, row):
+        self.binary = binary
+        self.row = row
+
+    @property
+    def marker(self):
+        return self.binary.marker(self.row)
+
+    @property
+    def taboos(self):
+        return tuple(TABOO_PATTERN.findall(self.binary.string(self.binary.prefixes[self.row])))
+
+    @property
+    def pillars(self):
+        return self.binary.pillars(self.row)
+
+    @property
+    def year(self):
+        return self.pillars[0]
+
+    @property
+    def month(self):
+        return self.pillars[1]
+
+    @property
+    def day(self):
+        return self.pillars[2]
+
+    @property
+    def hour(self):
+        return self.pillars[3]
+
+    @property
+    def date(self):
+        if not self.binary.flags[self.row] & FLAG_START:
+            return None
+        return from_seconds(self.binary.starts[self.row])[:8]
+
+    @property
+    def weekday(self):
+        if not self.binary.flags[self.row] & FLAG_START:
+            return None
+        # 1970-01-01 was a Thursday
+        return (self.binary.starts[self.row] // 86400 + 3) % 7
+
+
+class BinaryCalendar:
+    """Memory-mapped reader of the binary format
+
+    The columns are typed memoryviews over the mapping; strings are
+    decoded on first use. Use open() rather than the constructor.
+    """
+
+    def __init__(self, mapping, meta):
+        self.meta = meta
+        self._mapping = mapping
+        view = memoryview(mapping)
+
+        def section(name):
+            offset, length = meta['sections'][name]
+            return view[offset:offset + length]
+
+        for name, typecode in COLUMNS:
+            data = section(name)
+            setattr(self, name, native_view(data, typecode) if typecode not in 'bB' else data)
+        self._string_ends = native_view(section('string_ends'), 'I')
+        self._string_blob = section('string_blob')
+        self._strings = {}
+        self._templates = {}
+        self.newline = meta['newline']
+
+    @classmethod
+    def open(cls, filepath):
+        """Map filepath; raises ValueError if it is not a binary calendar"""
+        with open(filepath, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        meta = read_sections_header(mapping, MAGIC)
+        if meta is None or meta.get('version') != FORMAT_VERSION or meta.get('newline') not in ('\n', '\r\n'):
+            mapping.close()
+            raise ValueError(f"{filepath} is not a version {FORMAT_VERSION} binary calendar")
+        return cls(mapping, meta)
+
+    def __len__(self):
+        return self.meta['events']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views into the mapping must be released before it closes
+        for name in [name for name, _ in COLUMNS] + ['_string_ends', '_string_blob']:
+            column = getattr(self, name, None)
+            if isinstance(column, memoryview):
+                column.release()
+            setattr(self, name, None)
+        self._mapping.close()
+
+    def string(self, string_id):
+        text = self._strings.get(string_id)
+        if text is None:
+            begin = self._string_ends[string_id - 1] if string_id else 0
+            text = str(self._string_blob[begin:self._string_ends[string_id]], 'utf-8')
+            self._strings[string_id] = text
+        return text
+
+    @property
+    def header(self):
+        return self.string(self.meta['header'])
+
+    @property
+    def footer(self):
+        return self.string(self.meta['footer'])
+
+    def marker(self, row):
+        """'吉', '凶' or None"""
+        return MARKERS[self.markers[row]]
+
+    def has_taboo(self, row):
+        return bool(self.flags[row] & FLAG_TABOO)
+
+    def pillars(self, row):
+        """(year, month, day, hour) ganzhi, None where unknown"""
+        return tuple(None if value == NO_PILLAR else SEXAGENARY[value]
+                     for value in (self.years[row], self.months[row], self.days[row], self.hours[row]))
+
+    def event(self, row):
+        """ICS text of one event"""
+        template_id = self.templates[row]
+        if self.flags[row] & FLAG_VERBATIM:
+            return self.string(template_id)
+        compiled = self._templates.get(template_id)
+        if compiled is None:
+            compiled = self._templates[template_id] = compile_template(self.string(template_id))
+
+        values = {}
+        for code, _ in compiled[1]:
+            if code in values:
+                continue
+            if code == START:
+                values[code] = from_seconds(self.starts[row])
+            elif code == END:
+                values[code] = from_seconds(self.ends[row])
+            elif code == CREATED:
+                values[code] = from_seconds(self.created[row])
+            elif code == SERIAL:
+                values[code] = str(self.serials[row])
+            elif code == PREFIX:
+                values[code] = self.string(self.prefixes[row])
+            else:
+                column = (self.years, self.months, self.days, self.hours)[PILLAR_CODES.index(code)]
+                values[code] = SEXAGENARY[column[row]]
+        text = render(compiled, values)
+        return text if self.newline == '\n' else text.replace('\n', self.newline)
+
+    def facts(self, row):
+        """Facts for split_engine predicates; only verbatim rows are parsed"""
+        if self.flags[row] & FLAG_VERBATIM:
+            return EventFacts(self.event(row))
+        return RowFacts(self, row)
+
+    def rows(self, marker=None, taboo=None):
+        """Row numbers filtered on the marker and taboo columns, without decoding events"""
+        code = MARKER_CODES[marker] if marker is not None else None
+        markers, flags = self.markers, self.flags
+        for row in range(len(self)):
+            if code is not None and markers[row] != code:
+                continue
+            if taboo is not None and bool(flags[row] & FLAG_TABOO) != taboo:
+                continue
+            yield row
+
+    def iter_events(self, rows=None):
+        """ICS text of the given rows (default: all) in order"""
+        for row in (range(len(self)) if rows is None else rows):
+            yield self.event(row)
+
+    def write_ics(self, filepath, rows=None, calendar_name=None, atomic=False, fsync=False):
+        """Materialize the calendar (or the given rows) as ICS; return the bytes written"""
+        header = self.header
+        if calendar_name:
+            header = rename_calendar(header, calendar_name)
+        with ICSWriter(filepath, atomic=atomic, fsync=fsync) as writer:
+            writer.write(header)
+            writer.writelines(self.iter_events(rows))
+            writer.write(self.footer)
+        return writer.bytes_written
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    encode = commands.add_parser('encode', help='convert an ICS calendar to the binary format')
+    encode.add_argument('calendar')
+    encode.add_argument('output', nargs='?', help='binary file (default: the calendar with .bin)')
+
+    decode = commands.add_parser('decode', help='materialize ICS from a binary calendar')
+    decode.add_argument('binary')
+    decode.add_argument('output')
+    decode.add_argument('--marker', choices=('吉', '凶'), help='only events with this marker')
+
+    info = commands.add_parser('info', help='show the size breakdown of a binary calendar')
+    info.add_argument('binary')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+
+    if args.command == 'encode':
+        output = args.output or binary_path(args.calendar)
+        size = encode_file(args.calendar, output)
+        print(f"✓ Encoded {args.calendar} into {output} ({size:,} bytes)")
+        return
+
+    try:
+        binary = BinaryCalendar.open(args.binary)
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+    with binary:
+        if args.command == 'decode':
+            rows = binary.rows(marker=args.marker) if args.marker else None
+            size = binary.write_ics(args.output, rows, MARKER_NAMES.get(args.marker))
+            print(f"✓ Wrote {args.output} ({size:,} bytes)")
+            return
+
+        verbatim = sum(1 for flag in binary.flags if flag & FLAG_VERBATIM)
+        print(f"Events:     {len(binary):,} ({verbatim:,} stored verbatim)")
+        print(f"Strings:    {binary.meta['strings']:,}")
+        for name, (_, length) in binary.meta['sections'].items():
+            print(f"  {name:<12} {length:>10,} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Calendar Subscription Server
+Local asyncio HTTP endpoint that serves enhanced and filtered calendars on
+demand instead of re-hosting the three precomputed files.
+
+    python3 calendar_server.py --port 8765
+    curl 'http://127.0.0.1:8765/calendar.ics?start=20250101&end=20250131&filter=auspicious&taboos=0'
+
+Query parameters (all optional):
+    start, end   inclusive date range on DTSTART, YYYYMMDD or YYYY-MM-DD
+    filter       all (default) | auspicious (吉) | inauspicious (凶)
+    taboos       1 (default) | 0 to leave the Pengzu taboos out
+
+The marker and taboo indexes and the trunk events stay in memory; each
+response is enhanced and streamed event by event with chunked transfer
+encoding (HTTP/1.0 clients get a plain body ended by closing the
+connection). A failure before the response starts is answered with 500;
+after that the connection is closed. The ETag is derived from the identities of the loaded source
+files and the normalized query, so a matching If-None-Match is answered
+with 304 before any event is touched. The trunk calendar and the
+reference tables are reloaded when a file's size or mtime changes.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from auspicious_times import (
+    AUSPICIOUS_NAME, INAUSPICIOUS_NAME, Enhancer, Splitter, TabooIndex, rename_calendar,
+)
+from ics_extract import parse_event
+from lookup_cache import source_key
+
+TRUNK_FILE = "cal_trunkBranch.ics"
+GOOD_BAD_FILE = "good_bad_time.ics"
+PENGZU_FILE = "pengzu_100_taboos.ics"
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+CALENDAR_PATH = "/calendar.ics"
+HEALTH_PATH = "/healthz"
+
+# Events enhanced between writer.drain() calls
+DRAIN_EVERY = 256
+
+MAX_REQUEST_HEAD = 16 * 1024
+
+FILTERS = {
+    'all': None,
+    'auspicious': '吉',
+    '吉': '吉',
+    'inauspicious': '凶',
+    '凶': '凶',
+}
+FILTER_NAMES = {None: 'all', '吉': 'auspicious', '凶': 'inauspicious'}
+CALENDAR_NAMES = {'吉': AUSPICIOUS_NAME, '凶': INAUSPICIOUS_NAME}
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+EVENT_PATTERN = re.compile(r'^BEGIN:VEVENT\r?\n.*?^END:VEVENT[^\n]*\n?', re.MULTILINE | re.DOTALL)
+
+REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+class BadRequest(ValueError):
+    """Client error reported as 400 with the message as body"""
+
+
+class TrunkCalendar:
+    """Trunk events held in memory, sorted by DTSTART date for range queries"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.identity = None
+        self.header = ''
+        self.footer = ''
+        self.dates = []
+        self.events = []
+
+    def refresh(self):
+        """Reload the file if its size or mtime changed; return True when reloaded"""
+        key = source_key(self.filepath, with_hash=False)
+        if key == self.identity:
+            return False
+
+        with open(self.filepath, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+
+        events = []
+        first = last = None
+        for match in EVENT_PATTERN.finditer(content):
+            if first is None:
+                first = match.start()
+            last = match.end()
+            text = match.group()
+            events.append((parse_event(text).date or '', text))
+        events.sort(key=lambda item: item[0])
+
+        self.header = content[:first] if first is not None else content
+        self.footer = content[last:] if last is not None else ''
+        self.dates = [date for date, _ in events]
+        self.events = [text for _, text in events]
+        self.identity = key
+        return True
+
+    def select(self, start=None, end=None):
+        """Event texts whose DTSTART date lies in [start, end]"""
+        lo = bisect_left(self.dates, start) if start else 0
+        hi = bisect_right(self.dates, end) if end else len(self.dates)
+        return self.events[lo:hi]
+
+
+class CalendarService:
+    """Query parsing, ETags and response generation, independent of the transport"""
+
+    def __init__(self, trunk_file=TRUNK_FILE, good_bad_file=GOOD_BAD_FILE, pengzu_file=PENGZU_FILE,
+                 branch_taboos=False, use_cache=True):
+        self.trunk = TrunkCalendar(trunk_file)
+        self.sources = (good_bad_file, pengzu_file)
+        self.branch_taboos = branch_taboos
+        self.use_cache = use_cache
+        # source_key() of each reference file when its tables were loaded
+        self.identities = None
+        self.with_taboos = None
+        self.without_taboos = None
+
+    def load(self):
+        """Load the trunk calendar and the reference tables up front"""
+        self.refresh()
+
+    def refresh(self):
+        """Reload the trunk and the reference tables if a source's size or mtime changed"""
+        self.trunk.refresh()
+        identities = tuple(source_key(path, with_hash=False) for path in self.sources)
+        if identities == self.identities:
+            return
+        with_taboos = Enhancer(*self.sources, branch_taboos=self.branch_taboos, use_cache=self.use_cache)
+        marker_index, _ = with_taboos.tables()
+        self.with_taboos = with_taboos
+        self.without_taboos = Enhancer(marker_index=marker_index, taboo_index=TabooIndex())
+        self.identities = identities
+
+    def parse_query(self, query):
+        """Normalized (start, end, marker, taboos) from a query string"""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+
+        def date_param(name):
+            value = params.get(name, '').replace('-', '')
+            if not value:
+                return None
+            try:
+                datetime.strptime(value, '%Y%m%d')
+            except ValueError:
+                raise BadRequest(f"{name} must be a date like 20250101 or 2025-01-01")
+            return value
+
+        start = date_param('start')
+        end = date_param('end')
+        if start and end and start > end:
+            raise BadRequest("start must not be after end")
+
+        filter_name = params.get('filter', 'all').lower()
+        if filter_name not in FILTERS:
+            raise BadRequest("filter must be all, auspicious or inauspicious")
+
+        taboos = params.get('taboos', '1').lower()
+        if taboos not in TRUE_VALUES + FALSE_VALUES:
+            raise BadRequest("taboos must be 1 or 0")
+
+        return start, end, FILTERS[filter_name], taboos in TRUE_VALUES
+
+    def etag(self, query):
+        """Strong ETag for a normalized query against the loaded sources"""
+        start, end, marker, taboos = query
+        digest = hashlib.blake2b(digest_size=12)
+        loaded = zip((self.trunk.filepath,) + self.sources, (self.trunk.identity,) + self.identities)
+        for path, key in loaded:
+            digest.update(f"{path}:{key['size']}:{key['mtime_ns']};".encode('utf-8'))
+        digest.update(f"{start}|{end}|{FILTER_NAMES[marker]}|{taboos}|{self.branch_taboos}".encode('utf-8'))
+        return f'"{digest.hexdigest()}"'
+
+    def iter_calendar(self, query):
+        """Yield the response body in pieces: header, one piece per event, footer"""
+        start, end, marker, taboos = query
+        enhancer = self.with_taboos if taboos else self.without_taboos
+        header = self.trunk.header
+        if marker:
+            header = rename_calendar(header, CALENDAR_NAMES[marker])
+        yield header
+
+        classify = Splitter.classify
+        for event in self.trunk.select(start, end):
+            enhanced = enhancer.enhance_event(event)
+            if marker is None or classify(enhanced) == marker:
+                yield enhanced
+        yield self.trunk.footer
+
+
+def if_none_match(header_value, etag):
+    """True when an If-None-Match header value matches etag"""
+    if not header_value:
+        return False
+    candidates = [value.strip() for value in header_value.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+async def read_request(reader):
+    """Parse the request line and headers; None on EOF"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise BadRequest("request header too large")
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise BadRequest("malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, version, headers
+
+
+def response_head(status, headers):
+    lines = [f'HTTP/1.1 {status} {REASONS[status]}']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_text(writer, status, text, keep_alive, extra=None):
+    body = text.encode('utf-8')
+    headers = {
+        'Content-Type': 'text/plain; charset=utf-8',
+        'Content-Length': str(len(body)),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }
+    headers.update(extra or {})
+    writer.write(response_head(status, headers) + body)
+    await writer.drain()
+
+
+async def handle_calendar(service, writer, method, version, query_string, headers, keep_alive):
+    """Answer one calendar request; return whether the connection can be reused
+
+    HTTP/1.1 bodies are sent with chunked transfer encoding; HTTP/1.0 has
+    none, so its body runs to the end of the connection, which is closed.
+    """
+    try:
+        query = service.parse_query(query_string)
+    except BadRequest as e:
+        await send_text(writer, 400, f"{e}\n", keep_alive)
+        return keep_alive
+
+    try:
+        service.refresh()
+        etag = service.etag(query)
+    except Exception as e:
+        print(f"❌ Could not load the calendar: {type(e).__name__}: {e}")
+        await send_text(writer, 500, "could not load the calendar\n", keep_alive=False)
+        return False
+
+    chunked = version == 'HTTP/1.1'
+    if method == 'GET' and not chunked:
+        keep_alive = False
+    common = {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }
+
+    if if_none_match(headers.get('if-none-match'), etag):
+        writer.write(response_head(304, common))
+        await writer.drain()
+        return keep_alive
+
+    common['Content-Type'] = 'text/calendar; charset=utf-8'
+    if method == 'HEAD':
+        writer.write(response_head(200, common))
+        await writer.drain()
+        return keep_alive
+
+    if chunked:
+        common['Transfer-Encoding'] = 'chunked'
+    writer.write(response_head(200, common))
+
+    def frame(data):
+        return b'%x\r\n%s\r\n' % (len(data), data) if chunked else data
+
+    pending = []
+    try:
+        for count, piece in enumerate(service.iter_calendar(query), 1):
+            pending.append(piece)
+            if count % DRAIN_EVERY == 0:
+                data = ''.join(pending).encode('utf-8')
+                pending = []
+                writer.write(frame(data))
+                await writer.drain()
+                # drain() returns at once below the high-water mark; let other connections run
+                await asyncio.sleep(0)
+    except (ConnectionError, asyncio.CancelledError):
+        raise
+    except Exception as e:
+        # The status line is already out: cutting the connection is the only signal left
+        print(f"❌ Enhancement failed mid-response: {type(e).__name__}: {e}")
+        return False
+    data = ''.join(pending).encode('utf-8')
+    if data:
+        writer.write(frame(data))
+    if chunked:
+        writer.write(b'0\r\n\r\n')
+    await writer.drain()
+    return keep_alive
+
+
+async def handle_connection(service, reader, writer):
+    """Serve requests on one connection until it closes"""
+    peer = writer.get_extra_info('peername')
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except BadRequest as e:
+                await send_text(writer, 400, f"{e}\n", keep_alive=False)
+                break
+            if request is None:
+                break
+
+            method, target, version, headers = request
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+            url = urlsplit(target)
+
+            if method not in ('GET', 'HEAD'):
+                # Any request body is left unread, so the connection cannot be reused
+                keep_alive = False
+                await send_text(writer, 405, "only GET and HEAD are supported\n", keep_alive,
+                                {'Allow': 'GET, HEAD'})
+            elif url.path == HEALTH_PATH:
+                await send_text(writer, 200, "ok\n", keep_alive)
+            elif url.path == CALENDAR_PATH:
+                keep_alive = await handle_calendar(service, writer, method, version, url.query, headers,
+                                                   keep_alive)
+            else:
+                await send_text(writer, 404, f"try {CALENDAR_PATH}\n", keep_alive)
+
+            print(f"{peer[0] if peer else '-'} {method} {target}")
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer),
+        host, port, limit=MAX_REQUEST_HEAD
+    )
+    addresses = ', '.join(f'{sock.getsockname()[0]}:{sock.getsockname()[1]}' for sock in server.sockets)
+    print(f"✓ Serving {CALENDAR_PATH} on http://{addresses}")
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'address to bind (default {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to bind (default {DEFAULT_PORT})')
+    parser.add_argument('--trunk', default=TRUNK_FILE, help='trunk calendar to serve')
+    parser.add_argument(
+        '--branch-taboos', action='store_true',
+        help="also apply the earthly-branch taboo (e.g. '午不苫盖 屋主更张') to matching hours"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='always re-parse the reference calendars and do not write the lookup cache'
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+    service = CalendarService(args.trunk, branch_taboos=args.branch_taboos, use_cache=not args.no_cache)
+    service.load()
+    print(f"✓ Loaded {len(service.trunk.events):,} events from {args.trunk}")
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,13 @@ Calendar Enhancement Script
 Enhance cal_trunkBranch.ics with auspiciousness markers from good_bad_time.ics
 """
 
-import re
 from pathlib import Path
 from collections import defaultdict
 from datetime import datetime
 
+from ics_extract import parse_event, time_ganzhi as extract_time_ganzhi
+from progress import progress_reporter
+
 # Configuration
 GOOD_BAD_FILE = "good_bad_time.ics"
 TRUNK_FILE = "cal_trunkBranch.ics"
@@ -25,13 +27,6 @@ stats = {
     'warnings': []
 }
 
-def progress_bar(current, total, width=50):
-    """Simple progress bar"""
-    percent = current / total
-    filled = int(width * percent)
-    bar = '█' * filled + '░' * (width - filled)
-    print(f'\r[{bar}] {current}/{total} ({100*percent:.1f}%)', end='', flush=True)
-
 def build_lookup_dictionary():
     """Build lookup dictionary from good_bad_time.ics"""
     lookup = defaultdict(dict)
@@ -44,22 +39,16 @@ def build_lookup_dictionary():
     # Split by VEVENT
     events = content.split('BEGIN:VEVENT')[1:]
     
+    progress = progress_reporter(len(events), 'good_bad_time.ics')
     for idx, event in enumerate(events):
-        progress_bar(idx + 1, len(events))
-        # Extract date
-        date_match = re.search(r'DTSTART;VALUE=DATE:(\d{8})', event)
-        if not date_match:
+        progress.update(idx + 1)
+        # Extract date and summary with 13 time slots in one scan
+        record = parse_event(event)
+        date = record.date
+        summary = record.summary_text
+        if not date or not summary:
             continue
         
-        date = date_match.group(1)
-        
-        # Extract summary with 13 time slots
-        summary_match = re.search(r'SUMMARY:([^\n]+)', event)
-        if not summary_match:
-            continue
-        
-        summary = summary_match.group(1)
-        
         # Parse each time slot: "ganzhi + marker"
         slots = summary.split()
         for slot in slots:
@@ -67,8 +56,9 @@ def build_lookup_dictionary():
                 ganzhi = slot[:-1]  # Everything except last char
                 marker = slot[-1]    # Last char (吉 or 凶)
                 lookup[date][ganzhi] = marker
+    progress.finish()
     
-    print(f"\n✓ Built lookup dictionary with {sum(len(v) for v in lookup.values())} entries\n")
+    print(f"✓ Built lookup dictionary with {sum(len(v) for v in lookup.values())} entries\n")
     return lookup
 
 def enhance_summary(summary, date, lookup):
@@ -77,12 +67,10 @@ def enhance_summary(summary, date, lookup):
     Returns: (enhanced_summary, marker_found)
     """
     # Extract time ganzhi from summary: 『XX时
-    match = re.search(r'『(\S{2})时', summary)
-    if not match:
+    time_ganzhi = extract_time_ganzhi(summary)
+    if not time_ganzhi:
         return summary, False
     
-    time_ganzhi = match.group(1)
-    
     # Look up in dictionary
     if date in lookup and time_ganzhi in lookup[date]:
         marker = lookup[date][time_ganzhi]
@@ -104,12 +92,13 @@ def enhance_trunk_branch(lookup):
     output_lines = []
     current_event = []
     event_count = 0
+    progress = progress_reporter(total_events, 'Enhancing')
     
     for line in lines:
         if 'BEGIN:VEVENT' in line:
             current_event = [line]
             event_count += 1
-            progress_bar(event_count, total_events)
+            progress.update(event_count)
         elif 'END:VEVENT' in line:
             current_event.append(line)
             
@@ -121,56 +110,42 @@ def enhance_trunk_branch(lookup):
             current_event = []
         else:
             current_event.append(line)
+    progress.finish()
 
 def process_event(event_text, lookup):
     """Process a single VEVENT block"""
-    lines = event_text.split('\n')
-    enhanced_lines = []
+    # Locate DTSTART and SUMMARY in a single scan
+    record = parse_event(event_text)
+    date = record.date
+    if record.summary is None or not date:
+        return event_text
     
-    # Extract date from DTSTART
-    date_match = re.search(r'DTSTART:(\d{8})', event_text)
-    date = date_match.group(1) if date_match else None
+    summary = record.summary_text
+    enhanced_summary, found = enhance_summary(summary, date, lookup)
     
-    # Extract original summary
-    summary_line_idx = -1
-    for i, line in enumerate(lines):
-        if line.startswith('SUMMARY:'):
-            summary_line_idx = i
-            break
-    
-    # Process lines
-    for i, line in enumerate(lines):
-        if i == summary_line_idx and date:
-            summary = line.replace('SUMMARY:', '', 1)
-            enhanced_summary, found = enhance_summary(summary, date, lookup)
-            
-            if found:
-                enhanced_lines.append(f'SUMMARY:{enhanced_summary}')
-                stats['enhanced_events'] += 1
-                
-                # Store sample
-                if len(stats['samples']) < 5:
-                    stats['samples'].append({
-                        'date': date,
-                        'before': f'SUMMARY:{summary}',
-                        'after': f'SUMMARY:{enhanced_summary}'
-                    })
-            else:
-                enhanced_lines.append(line)
-                stats['skipped_events'] += 1
-                
-                if date:
-                    match = re.search(r'『(\S{2})时', summary)
-                    if match:
-                        time_ganzhi = match.group(1)
-                        warning = f"No marker found for {date}/{time_ganzhi}"
-                        if warning not in stats['warnings']:
-                            stats['warnings'].append(warning)
-                        stats['missing_lookups'] += 1
-        else:
-            enhanced_lines.append(line)
-    
-    return '\n'.join(enhanced_lines)
+    if found:
+        stats['enhanced_events'] += 1
+        
+        # Store sample
+        if len(stats['samples']) < 5:
+            stats['samples'].append({
+                'date': date,
+                'before': f'SUMMARY:{summary}',
+                'after': f'SUMMARY:{enhanced_summary}'
+            })
+        
+        # Splice the new SUMMARY value into the original text
+        return record.replace_summary(enhanced_summary)
+    
+    stats['skipped_events'] += 1
+    time_ganzhi = extract_time_ganzhi(summary)
+    if time_ganzhi:
+        warning = f"No marker found for {date}/{time_ganzhi}"
+        if warning not in stats['warnings']:
+            stats['warnings'].append(warning)
+        stats['missing_lookups'] += 1
+    
+    return event_text
 
 def validate_output_file():
     """Validate the output file is valid ICS"""
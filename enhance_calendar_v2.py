@@ -7,11 +7,36 @@ Enhance cal_trunkBranch.ics with:
 Then split into auspicious and inauspicious files
 """
 
-import re
+import argparse
+import multiprocessing
+from collections import deque
+from contextlib import ExitStack
 from pathlib import Path
-from collections import defaultdict
 from datetime import datetime
 
+from auspicious_times import (
+    AUSPICIOUS_NAME, INAUSPICIOUS_NAME, calendar_sections, iter_calendar_parts, iter_mapped_parts,
+    iter_marker_entries, iter_taboo_entries, patched_chunks, process_event, process_mapped_event,
+    read_events, rename_calendar,
+)
+from binary_calendar import BinaryCalendar, BinaryEncoder
+from event_index import build_index, index_path
+from ganzhi import DEFAULT_ZI_CONVENTION, ZI_CONVENTIONS
+from ics_extract import parse_event, time_ganzhi as extract_time_ganzhi, summary_marker
+from ics_mmap import BlockReader, MappedCalendar
+from ics_validator import ICSValidator, validate_file
+from ics_writer import BackgroundWriter, ICSWriter, PatchWriter
+from incremental import (
+    FLAG_AUSPICIOUS, FLAG_ENHANCED, FLAG_INAUSPICIOUS, FLAG_MISSING, FLAG_TABOO,
+    ManifestEntry, event_digest, last_modified, load_manifest, manifest_path, save_manifest
+)
+from lookup_cache import default_cache_path, file_digest, load_cache, save_cache
+from marker_index import MarkerIndex
+from metrics import RunMetrics
+from progress import MODES as PROGRESS_MODES, configure as configure_progress, progress_reporter
+from split_engine import EventFacts, SplitEngine, parse_feed, split_content, standard_feeds
+from taboo_index import TabooIndex
+
 # Configuration
 GOOD_BAD_FILE = "good_bad_time.ics"
 PENGZU_FILE = "pengzu_100_taboos.ics"
@@ -19,369 +44,523 @@ TRUNK_FILE = "cal_trunkBranch.ics"
 ENHANCED_FILE = "cal_trunkBranch_enhanced.ics"
 AUSPICIOUS_FILE = "cal_trunkBranch_auspicious.ics"
 INAUSPICIOUS_FILE = "cal_trunkBranch_inauspicious.ics"
+BINARY_FILE = "cal_trunkBranch_enhanced.bin"
 LOG_FILE = "enhancement_log.txt"
 
-# Global tracking
-stats = {
-    'total_events': 0,
-    'enhanced_events': 0,
-    'taboo_added': 0,
-    'skipped_events': 0,
-    'missing_lookups': 0,
-    'samples': [],
-    'warnings': []
+# Events per shard handed to a worker process in --workers mode
+SHARD_SIZE = 512
+
+# Output write policy (see ics_writer.ICSWriter)
+WRITE_POLICY = {
+    'atomic': False,
+    'fsync': False,
 }
 
-def progress_bar(current, total, width=50):
-    """Simple progress bar"""
-    if total == 0:
-        return
-    percent = current / total
-    filled = int(width * percent)
-    bar = '█' * filled + '░' * (width - filled)
-    print(f'\r[{bar}] {current}/{total} ({100*percent:.1f}%)', end='', flush=True)
+# Fold enhanced SUMMARY lines at 75 octets as RFC 5545 requires
+FOLD_SUMMARY = False
+
+# Reference day of 23:00 hours: 'early' (next day) or 'late' (same date)
+ZI_CONVENTION = DEFAULT_ZI_CONVENTION
+
+# Also write the binary intermediate (--binary) and split from its columns
+WRITE_BINARY = False
+
+# Derived feeds (--feed) written alongside the 吉/凶 pair in the same pass
+EXTRA_FEEDS = []
+
+# Counters and stage timings of the current run
+metrics = RunMetrics()
+
+# Validator fed inline while this run writes ENHANCED_FILE
+output_validator = None
+
+def enhanced_writer(source=None, background=False, **policy):
+    """ICSWriter for ENHANCED_FILE that validates the bytes as they are written
+
+    Given a source MappedCalendar, a PatchWriter over its bytes instead;
+    with background=True, one that writes (and validates) on a thread.
+    """
+    global output_validator
+    output_validator = ICSValidator()
+    if source is not None:
+        return PatchWriter(ENHANCED_FILE, source.view, source.fileno(), validator=output_validator, **policy)
+    writer = ICSWriter(ENHANCED_FILE, validator=output_validator, **policy)
+    return BackgroundWriter(writer) if background else writer
 
 def build_lookup_dictionary():
-    """Build lookup dictionary from good_bad_time.ics"""
-    lookup = defaultdict(dict)
-    
+    """Build the flat marker index from good_bad_time.ics"""
     print("[1/5] Building lookup dictionary from good_bad_time.ics...")
     
-    with open(GOOD_BAD_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
+    events = read_events(GOOD_BAD_FILE)
+    metrics.bytes_read += Path(GOOD_BAD_FILE).stat().st_size
     
-    # Split by VEVENT
-    events = content.split('BEGIN:VEVENT')[1:]
+    lookup = MarkerIndex.from_entries(iter_marker_entries(events))
     
-    for idx, event in enumerate(events):
-        progress_bar(idx + 1, len(events))
-        
-        # Extract date
-        date_match = re.search(r'DTSTART;VALUE=DATE:(\d{8})', event)
-        if not date_match:
-            continue
-        
-        date = date_match.group(1)
-        
-        # Extract summary with 13 time slots
-        summary_match = re.search(r'SUMMARY:([^\n]+)', event)
-        if not summary_match:
-            continue
-        
-        summary = summary_match.group(1)
-        
-        # Parse each time slot: "ganzhi + marker"
-        slots = summary.split()
-        for slot in slots:
-            if len(slot) >= 3:  # At least 2 chars ganzhi + 1 char marker
-                ganzhi = slot[:-1]  # Everything except last char
-                marker = slot[-1]    # Last char (吉 or 凶)
-                lookup[date][ganzhi] = marker
-    
-    print(f"\n✓ Built lookup dictionary with {sum(len(v) for v in lookup.values())} entries\n")
+    print(f"✓ Built lookup dictionary with {len(lookup)} entries ({lookup.nbytes:,} bytes)\n")
     return lookup
 
 def build_taboo_dictionary():
-    """Build lookup dictionary from pengzu_100_taboos.ics"""
-    taboo_lookup = defaultdict(list)
-    
+    """Build the (date, stem/branch) taboo index from pengzu_100_taboos.ics"""
     print("[2/5] Building taboo lookup from pengzu_100_taboos.ics...")
     
-    with open(PENGZU_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
+    events = read_events(PENGZU_FILE)
+    metrics.bytes_read += Path(PENGZU_FILE).stat().st_size
     
-    # Split by VEVENT
-    events = content.split('BEGIN:VEVENT')[1:]
+    taboo_lookup = TabooIndex.from_entries(iter_taboo_entries(events))
     
-    for idx, event in enumerate(events):
-        progress_bar(idx + 1, len(events))
-        
-        # Extract date
-        date_match = re.search(r'DTSTART;VALUE=DATE:(\d{8})', event)
-        if not date_match:
-            continue
-        
-        date = date_match.group(1)
-        
-        # Extract summary with taboos
-        summary_match = re.search(r'SUMMARY:([^\n]+)', event)
-        if not summary_match:
-            continue
-        
-        summary = summary_match.group(1)
-        
-        # Parse taboos separated by comma
-        # Format: "庚不经络 织机虚张,午不苫盖 屋主更张"
-        # Extract stem character (first char) and taboo text
-        taboo_pairs = summary.split(',')
-        for taboo_pair in taboo_pairs:
-            taboo_pair = taboo_pair.strip()
-            if not taboo_pair:
-                continue
-            
-            # Extract stem character (first character of the pair)
-            stem = taboo_pair[0]  # e.g., '庚' from '庚不经络 织机虚张'
-            taboo_lookup[date].append((stem, taboo_pair))
-    
-    print(f"\n✓ Built taboo dictionary with {sum(len(v) for v in taboo_lookup.values())} taboo entries\n")
+    print(f"✓ Built taboo dictionary with {len(taboo_lookup)} taboo entries "
+          f"({len(taboo_lookup.texts) - 1} distinct)\n")
     return taboo_lookup
 
-def enhance_summary(summary, date, marker_lookup, taboo_lookup):
-    """Enhance a summary with marker and taboos
+def load_reference_tables(use_cache=True):
+    """Return (marker_lookup, taboo_lookup), from the compiled cache when valid"""
+    sources = {'good_bad': GOOD_BAD_FILE, 'pengzu': PENGZU_FILE}
+    cache_path = default_cache_path(GOOD_BAD_FILE)
+    
+    if use_cache:
+        cached = load_cache(cache_path, sources)
+        if cached is not None:
+            marker_lookup, taboo_lookup = cached
+            print(f"[1/5] Loaded lookup dictionary from cache {cache_path}")
+            print(f"✓ {len(marker_lookup)} marker entries\n")
+            print(f"[2/5] Loaded taboo lookup from cache {cache_path}")
+            print(f"✓ {len(taboo_lookup)} taboo entries\n")
+            return marker_lookup, taboo_lookup
     
-    Format: 『{marker} [{taboo}] {original_content}』
-    """
-    # Extract time ganzhi from summary: 『XX时
-    match = re.search(r'『(\S{2})时', summary)
-    if not match:
-        return summary, False, False
-    
-    time_ganzhi = match.group(1)
-    time_stem = time_ganzhi[0]  # First character only (e.g., '庚' from '庚辰')
-    
-    enhanced = summary
-    marker_found = False
-    taboo_found = False
-    
-    # Look up marker
-    marker = None
-    if date in marker_lookup and time_ganzhi in marker_lookup[date]:
-        marker = marker_lookup[date][time_ganzhi]
-        marker_found = True
-    
-    # Look up taboos for this date and stem
-    taboos = []
-    if date in taboo_lookup:
-        for stem, taboo_text in taboo_lookup[date]:
-            if stem == time_stem:
-                taboos.append(taboo_text)
-                taboo_found = True
-    
-    # Build enhanced summary
-    if marker_found or taboo_found:
-        # Start building the enhanced summary
-        content = summary[1:-1]  # Remove 『 and 』
-        
-        # Build the new content with marker and taboos
-        parts = []
-        if marker:
-            parts.append(marker)
-        
-        for taboo in taboos:
-            parts.append(f"[{taboo}]")
-        
-        enhanced = f"『{' '.join(parts)} {content}』"
-        
-        return enhanced, marker_found, taboo_found
-    
-    return summary, False, False
-
-def process_event(event_text, marker_lookup, taboo_lookup):
-    """Process a single VEVENT block"""
-    lines = event_text.split('\n')
-    enhanced_lines = []
-    
-    # Extract date from DTSTART
-    date_match = re.search(r'DTSTART:(\d{8})', event_text)
-    date = date_match.group(1) if date_match else None
-    
-    # Extract original summary
-    summary_line_idx = -1
-    for i, line in enumerate(lines):
-        if line.startswith('SUMMARY:'):
-            summary_line_idx = i
-            break
-    
-    # Process lines
-    for i, line in enumerate(lines):
-        if i == summary_line_idx and date:
-            summary = line.replace('SUMMARY:', '', 1)
-            enhanced_summary, marker_found, taboo_found = enhance_summary(
-                summary, date, marker_lookup, taboo_lookup
-            )
-            
-            if marker_found or taboo_found:
-                enhanced_lines.append(f'SUMMARY:{enhanced_summary}')
-                stats['enhanced_events'] += 1
-                if taboo_found:
-                    stats['taboo_added'] += 1
-                
-                # Store sample
-                if len(stats['samples']) < 5:
-                    stats['samples'].append({
-                        'date': date,
-                        'before': f'SUMMARY:{summary.strip()}',
-                        'after': f'SUMMARY:{enhanced_summary}'
-                    })
-            else:
-                enhanced_lines.append(line)
-                stats['skipped_events'] += 1
-                
-                if date:
-                    match = re.search(r'『(\S{2})时', summary)
-                    if match:
-                        time_ganzhi = match.group(1)
-                        warning = f"No enhancement found for {date}/{time_ganzhi}"
-                        if warning not in stats['warnings']:
-                            stats['warnings'].append(warning)
-                        stats['missing_lookups'] += 1
-        else:
-            enhanced_lines.append(line)
+    marker_lookup = build_lookup_dictionary()
+    taboo_lookup = build_taboo_dictionary()
+    
+    if use_cache:
+        try:
+            size = save_cache(cache_path, sources, marker_lookup, taboo_lookup)
+            print(f"✓ Saved lookup cache to {cache_path} ({size:,} bytes)\n")
+        except OSError as e:
+            print(f"⚠️  Could not write lookup cache {cache_path}: {e}\n")
     
-    return '\n'.join(enhanced_lines)
+    return marker_lookup, taboo_lookup
 
 def enhance_trunk_branch(marker_lookup, taboo_lookup):
     """Enhance cal_trunkBranch.ics with markers and taboos"""
     print("[3/5] Enhancing cal_trunkBranch.ics...\n")
     
-    with open(TRUNK_FILE, 'r', encoding='utf-8') as f:
+    # newline='' keeps CRLF input as CRLF, as the streaming modes do
+    with open(TRUNK_FILE, 'r', encoding='utf-8', newline='') as f:
         content = f.read()
     
-    # Count total events for progress bar
-    total_events = content.count('BEGIN:VEVENT')
-    
-    # Extract header (everything before first VEVENT)
-    header_match = re.search(r'(.*?)BEGIN:VEVENT', content, re.DOTALL)
-    header = header_match.group(1) if header_match else ""
-    
-    # Extract footer (everything after last VEVENT)
-    footer_match = re.search(r'END:VEVENT\s*$', content, re.DOTALL)
-    if footer_match:
-        footer_start = footer_match.start() + len('END:VEVENT')
-        footer = content[footer_start:]
-    else:
-        footer = ""
+    metrics.bytes_read += Path(TRUNK_FILE).stat().st_size
     
-    # Split and process events
-    events = content.split('BEGIN:VEVENT')[1:]
+    # Header, VEVENT blocks and footer
+    header, events, footer = calendar_sections(content)
+    metrics.total_events += len(events)
     enhanced_events = []
     
+    progress = progress_reporter(len(events), 'Enhancing')
     for idx, event in enumerate(events):
-        progress_bar(idx + 1, len(events))
-        enhanced_event = process_event(event, marker_lookup, taboo_lookup)
+        progress.update(idx + 1)
+        enhanced_event = process_event(event, marker_lookup, taboo_lookup, metrics,
+                                       fold=FOLD_SUMMARY, zi_convention=ZI_CONVENTION)
         enhanced_events.append(enhanced_event)
-    
-    print()
+    progress.finish()
     
     # Write enhanced file
     print(f"[4/5] Writing enhanced file to {ENHANCED_FILE}...")
     
-    enhanced_content = header
-    for event in enhanced_events:
-        enhanced_content += f'BEGIN:VEVENT{event}'
-    enhanced_content += footer
+    enhanced_content = ''.join([header, *(f'BEGIN:VEVENT{event}' for event in enhanced_events), footer])
     
-    with open(ENHANCED_FILE, 'w', encoding='utf-8') as f:
-        f.write(enhanced_content)
+    with enhanced_writer(**WRITE_POLICY) as writer:
+        writer.write(enhanced_content)
+    metrics.bytes_written += writer.bytes_written
     
-    print(f"✓ Enhanced file written to {ENHANCED_FILE}\n")
+    print(f"✓ Enhanced file written to {ENHANCED_FILE} ({writer.bytes_written:,} bytes)\n")
+    
+    if WRITE_BINARY:
+        encoder = BinaryEncoder()
+        for event in enhanced_events:
+            encoder.add(f'BEGIN:VEVENT{event}')
+        write_binary(encoder, header, footer)
     
     return enhanced_content
 
+def write_binary(encoder, header, footer):
+    """Write the binary intermediate of the enhanced calendar (see binary_calendar.py)"""
+    size = encoder.write(BINARY_FILE, header, footer, **WRITE_POLICY)
+    metrics.bytes_written += size
+    print(f"✓ Binary intermediate written to {BINARY_FILE} ({size:,} bytes)\n")
+
 def split_into_two_files(content):
-    """Split enhanced calendar into auspicious and inauspicious files"""
+    """Split enhanced calendar into auspicious and inauspicious files (plus any --feed outputs)"""
     print("[5/5] Splitting into auspicious and inauspicious files...\n")
     
-    # Extract header and footer
-    header_match = re.search(r'(.*?)BEGIN:VEVENT', content, re.DOTALL)
-    header = header_match.group(1) if header_match else ""
-    
-    # Match the LAST END:VEVENT to get true footer
-    footer_match = re.search(r'END:VEVENT\s*$', content, re.DOTALL)
-    if footer_match:
-        footer_start = footer_match.start() + len('END:VEVENT')
-        footer = content[footer_start:]
+    # One pass over the events, fanned out to every feed
+    feeds = standard_feeds(AUSPICIOUS_FILE, INAUSPICIOUS_FILE) + EXTRA_FEEDS
+    if WRITE_BINARY:
+        # Route by the intermediate's columns instead of re-parsing every event
+        with BinaryCalendar.open(BINARY_FILE) as binary:
+            engine = split_content(content, feeds, facts=binary.facts, **WRITE_POLICY)
     else:
-        footer = ""
-    
-    # Split events
-    events = content.split('BEGIN:VEVENT')[1:]
+        engine = split_content(content, feeds, **WRITE_POLICY)
+    metrics.bytes_written += engine.bytes_written
     
-    auspicious_events = []
-    inauspicious_events = []
-    skipped = 0
-    
-    for idx, event in enumerate(events):
-        progress_bar(idx + 1, len(events))
-        
-        # Extract SUMMARY to check for marker
-        summary_match = re.search(r'SUMMARY:([^\n]+)', event)
-        if not summary_match:
-            skipped += 1
-            continue
-        
-        summary = summary_match.group(1)
-        
-        # Classify by first marker character
-        if summary.startswith('『吉'):
-            auspicious_events.append(event)
-        elif summary.startswith('『凶'):
-            inauspicious_events.append(event)
+    auspicious_count, inauspicious_count = feeds[0].events, feeds[1].events
+    return auspicious_count, inauspicious_count, engine.total_events - auspicious_count - inauspicious_count
+
+# Reference tables and mapped trunk of a worker process, set once by _init_worker
+_worker_tables = None
+_worker_calendar = None
+
+def _init_worker(marker_lookup, taboo_lookup, fold_summary=False, zi_convention=DEFAULT_ZI_CONVENTION,
+                 trunk_file=TRUNK_FILE):
+    global _worker_tables, _worker_calendar, FOLD_SUMMARY, ZI_CONVENTION
+    _worker_tables = (marker_lookup, taboo_lookup)
+    _worker_calendar = MappedCalendar(trunk_file)
+    FOLD_SUMMARY = fold_summary
+    ZI_CONVENTION = zi_convention
+
+def _enhance_shard(spans):
+    """Worker: SummaryPatch (or None) for each (start, end) event span of the trunk"""
+    shard_metrics = RunMetrics()
+    marker_lookup, taboo_lookup = _worker_tables
+    patches = [
+        process_mapped_event(_worker_calendar.event(start, end), marker_lookup, taboo_lookup, shard_metrics,
+                             fold=FOLD_SUMMARY, zi_convention=ZI_CONVENTION)
+        for start, end in spans
+    ]
+    return patches, shard_metrics
+
+def iter_shards(parts, shard_size):
+    """Group a part stream into contiguous lists holding shard_size events"""
+    shard = []
+    events = 0
+    for part in parts:
+        shard.append(part)
+        if part[0] == 'event':
+            events += 1
+            if events == shard_size:
+                yield shard
+                shard = []
+                events = 0
+    if shard:
+        yield shard
+
+def _merge_shard(calendar, shard, result):
+    """(kind, start, end, event, patch) parts of a shard, given its worker result"""
+    patches, shard_metrics = result
+    metrics.merge(shard_metrics)
+    patches = iter(patches)
+    for kind, start, end in shard:
+        if kind == 'event':
+            yield kind, start, end, calendar.event(start, end), next(patches)
         else:
-            skipped += 1
+            yield kind, start, end, None, None
+
+def enhance_parts_parallel(calendar, marker_lookup, taboo_lookup, workers, shard_size=SHARD_SIZE):
+    """iter_mapped_parts() over a process pool, yielding results in input order
+
+    Workers map the same trunk file and receive only the byte spans of a
+    shard's events, returning their SummaryPatches, so the output is the
+    same as the serial pass whatever the line endings. The reference
+    tables are handed to each worker once when the pool starts (inherited
+    copy-on-write where fork is available). At most two shards per worker
+    are in flight, so memory stays bounded on long calendars.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    pending = deque()
+
+    with context.Pool(workers, initializer=_init_worker,
+                      initargs=(marker_lookup, taboo_lookup, FOLD_SUMMARY, ZI_CONVENTION,
+                                calendar.filepath)) as pool:
+        for shard in iter_shards(calendar.parts(), shard_size):
+            spans = [(start, end) for kind, start, end in shard if kind == 'event']
+            pending.append((shard, pool.apply_async(_enhance_shard, (spans,))))
+            if len(pending) >= 2 * workers:
+                shard, result = pending.popleft()
+                yield from _merge_shard(calendar, shard, result.get())
+        while pending:
+            shard, result = pending.popleft()
+            yield from _merge_shard(calendar, shard, result.get())
+
+def iter_pipelined_parts(reader, marker_lookup, taboo_lookup):
+    """Enhance the event-aligned blocks of a BlockReader part by part
+
+    Yields (kind, chunks, facts, patch, position) like the other
+    enhance_streaming sources; chunks are slices of the block around
+    each patched SUMMARY value.
+    """
+    for block in reader:
+        parts = iter_mapped_parts(block, marker_lookup, taboo_lookup, metrics,
+                                  fold=FOLD_SUMMARY, zi_convention=ZI_CONVENTION)
+        for kind, start, end, event, patch in parts:
+            if event is None:
+                yield kind, (block.view[start:end],), None, None, block.offset + end
+            else:
+                facts = EventFacts.from_record(event, patch and patch.summary)
+                yield kind, patched_chunks(event, patch), facts, patch, block.offset + end
+
+def enhance_streaming(marker_lookup, taboo_lookup, workers=1, pipelined=False):
+    """Enhance, write and split cal_trunkBranch.ics in a single streaming pass
+
+    Each VEVENT is enhanced as soon as it is read and written straight to the
+    enhanced, auspicious and inauspicious files, so memory stays bounded by
+    one event instead of several copies of the calendar. With workers > 1
+    the events are enhanced in contiguous shards by a process pool and merged
+    back in order, so the output is byte-identical to the serial pass.
+
+    With pipelined=True reading, enhancing and writing overlap: a reader
+    thread queues event-aligned blocks of the trunk (ics_mmap.BlockReader)
+    and every output file is written by its own thread from a bounded
+    queue (ics_writer.BackgroundWriter), so this thread only enhances.
+    Combined with workers > 1 only the split files are written that way.
+    """
+    print("[3/4] Streaming enhancement of cal_trunkBranch.ics...\n")
     
+    total_bytes = Path(TRUNK_FILE).stat().st_size
+    progress = progress_reporter(total_bytes, 'Streaming')
+    feeds = standard_feeds(AUSPICIOUS_FILE, INAUSPICIOUS_FILE) + EXTRA_FEEDS
+    encoder = BinaryEncoder() if WRITE_BINARY else None
+    header = footer = ''
+
+    with ExitStack() as stack:
+        if pipelined and workers == 1:
+            print("      Reading, enhancing and writing on overlapping threads\n")
+            calendar = None
+            reader = stack.enter_context(BlockReader(TRUNK_FILE))
+            processed = iter_pipelined_parts(reader, marker_lookup, taboo_lookup)
+        else:
+            # The trunk is memory-mapped and only DTSTART/SUMMARY are
+            # decoded: the enhanced file is the trunk with each new SUMMARY
+            # patched in, the split files get byte slices of it
+            calendar = stack.enter_context(MappedCalendar(TRUNK_FILE))
+            if workers > 1:
+                print(f"      Using {workers} worker processes ({SHARD_SIZE} events per shard)\n")
+                parts = enhance_parts_parallel(calendar, marker_lookup, taboo_lookup, workers)
+            else:
+                parts = iter_mapped_parts(calendar, marker_lookup, taboo_lookup, metrics,
+                                          fold=FOLD_SUMMARY, zi_convention=ZI_CONVENTION)
+            processed = (
+                (kind,
+                 patched_chunks(event, patch) if event else (calendar.view[start:end],),
+                 event and EventFacts.from_record(event, patch and patch.summary),
+                 patch,
+                 end)
+                for kind, start, end, event, patch in parts
+            )
+        enhanced_out = stack.enter_context(enhanced_writer(calendar, background=pipelined, **WRITE_POLICY))
+        split_out = stack.enter_context(SplitEngine(feeds, background=pipelined, **WRITE_POLICY))
+
+        for kind, chunks, facts, patch, position in processed:
+            if calendar is None:
+                for chunk in chunks:
+                    enhanced_out.write_bytes(chunk)
+            elif patch is not None:
+                enhanced_out.patch(patch.start, patch.end, patch.data)
+
+            if kind == 'event':
+                split_out.write_event_chunks(chunks, facts)
+                metrics.total_events += 1
+                if encoder is not None:
+                    encoder.add(b''.join(chunks).decode('utf-8'))
+                if position is not None:
+                    progress.update(position)
+            elif kind == 'header':
+                header = b''.join(chunks).decode('utf-8')
+                split_out.write_header(header)
+            elif kind == 'footer':
+                footer = b''.join(chunks).decode('utf-8')
+                split_out.write_footer(footer)
+
+        if calendar is not None:
+            enhanced_out.copy_to(calendar.size)
+
+    progress.finish()
+    if encoder is not None:
+        write_binary(encoder, header, footer)
+    metrics.bytes_read += total_bytes
+    if isinstance(enhanced_out, PatchWriter):
+        metrics.record_patches(enhanced_out)
+        print(f"[4/4] ✓ Wrote {enhanced_out.filepath} ({enhanced_out.bytes_written:,} bytes: "
+              f"{enhanced_out.bytes_copied:,} copied, {enhanced_out.bytes_patched:,} patched "
+              f"in {enhanced_out.patches:,} spans)")
+    else:
+        metrics.bytes_written += enhanced_out.bytes_written
+        print(f"[4/4] ✓ Wrote {enhanced_out.filepath} ({enhanced_out.bytes_written:,} bytes)")
+    for writer in (feed.writer for feed in feeds):
+        metrics.bytes_written += writer.bytes_written
+        print(f"[4/4] ✓ Wrote {writer.filepath} ({writer.bytes_written:,} bytes)")
     print()
     
-    # Function to write split file
-    def write_split_file(filepath, events, calendar_name):
-        updated_header = re.sub(
-            r'X-WR-CALNAME:[^\n]*',
-            f'X-WR-CALNAME:{calendar_name}',
-            header
-        )
-        
-        file_content = updated_header
-        for event in events:
-            file_content += f'BEGIN:VEVENT{event}'
-        file_content += footer
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(file_content)
-        
-        return len(events)
-    
-    # Write both files
-    auspicious_count = write_split_file(
-        AUSPICIOUS_FILE,
-        auspicious_events,
-        "Auspicious Times"
-    )
-    
-    inauspicious_count = write_split_file(
-        INAUSPICIOUS_FILE,
-        inauspicious_events,
-        "Inauspicious Times"
-    )
-    
-    return auspicious_count, inauspicious_count, skipped
+    auspicious_count, inauspicious_count = feeds[0].events, feeds[1].events
+    return auspicious_count, inauspicious_count, split_out.total_events - auspicious_count - inauspicious_count
 
-def validate_output_file():
-    """Validate the output file is valid ICS"""
-    with open(ENHANCED_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    checks = {
-        'starts_with_BEGIN:VCALENDAR': content.startswith('BEGIN:VCALENDAR'),
-        'ends_with_END:VCALENDAR': content.strip().endswith('END:VCALENDAR'),
-        'has_VEVENT_blocks': 'BEGIN:VEVENT' in content and 'END:VEVENT' in content,
-        'event_count_matches': content.count('BEGIN:VEVENT') == content.count('END:VEVENT'),
+def enhance_incremental(load_tables, branch_taboos=False):
+    """Re-enhance only the trunk events added or changed since the last run
+
+    Events whose UID, LAST-MODIFIED and content hash match the previous
+    run's manifest are copied byte for byte from the previous enhanced file;
+    everything else goes through process_event(). The reference tables are
+    only loaded (via load_tables) when at least one event needs enhancing.
+    All three outputs are rewritten atomically together with a new manifest.
+    """
+    print("[3/4] Incremental enhancement of cal_trunkBranch.ics...\n")
+    
+    key = {
+        'good_bad': file_digest(GOOD_BAD_FILE),
+        'pengzu': file_digest(PENGZU_FILE),
+        'branch_taboos': branch_taboos,
+        'fold': FOLD_SUMMARY,
+        'zi_convention': ZI_CONVENTION,
     }
-    
-    return checks
+    manifest_file = manifest_path(ENHANCED_FILE)
+    previous = load_manifest(manifest_file, key, ENHANCED_FILE)
+    if previous is None:
+        print("      No reusable manifest, enhancing every event\n")
+        previous = {}
+    
+    tables = None
+    entries = []
+    seen = set()
+    reused = 0
+    counts = {FLAG_AUSPICIOUS: 0, FLAG_INAUSPICIOUS: 0, 0: 0}
+    total_bytes = Path(TRUNK_FILE).stat().st_size
+    progress = progress_reporter(total_bytes, 'Incremental')
+    policy = dict(WRITE_POLICY, atomic=True)
+    
+    encoder = BinaryEncoder() if WRITE_BINARY else None
+    header = footer = ''
+    old_enhanced = open(ENHANCED_FILE, 'rb') if previous else None
+    try:
+        with enhanced_writer(**policy) as enhanced_out, \
+                ICSWriter(AUSPICIOUS_FILE, **policy) as auspicious_out, \
+                ICSWriter(INAUSPICIOUS_FILE, **policy) as inauspicious_out, \
+                SplitEngine(EXTRA_FEEDS, **policy) as extra_out:
+            split_out = {FLAG_AUSPICIOUS: auspicious_out, FLAG_INAUSPICIOUS: inauspicious_out}
+            
+            for kind, text, position in iter_calendar_parts(TRUNK_FILE):
+                if kind == 'header':
+                    enhanced_out.write(text)
+                    auspicious_out.write(rename_calendar(text, AUSPICIOUS_NAME))
+                    inauspicious_out.write(rename_calendar(text, INAUSPICIOUS_NAME))
+                    extra_out.write_header(text)
+                    header = text
+                    continue
+                
+                if kind == 'gap':
+                    enhanced_out.write(text)
+                    continue
+                
+                if kind == 'footer':
+                    enhanced_out.write(text)
+                    auspicious_out.write(text)
+                    inauspicious_out.write(text)
+                    extra_out.write_footer(text)
+                    footer = text
+                    continue
+                
+                metrics.total_events += 1
+                record = parse_event(text)
+                uid = record.value('uid')
+                modified = last_modified(text)
+                digest = event_digest(text)
+                entry = previous.get(uid) if uid not in seen else None
+                seen.add(uid)
+                
+                if entry and entry.last_modified == modified and entry.digest == digest:
+                    # Unchanged upstream: copy the previous enhanced bytes
+                    old_enhanced.seek(entry.offset)
+                    data = old_enhanced.read(entry.length)
+                    flags = entry.flags
+                    reused += 1
+                    metrics.enhanced_events += bool(flags & FLAG_ENHANCED)
+                    metrics.taboo_added += bool(flags & FLAG_TABOO)
+                    metrics.skipped_events += not flags & FLAG_ENHANCED
+                    if flags & FLAG_MISSING:
+                        metrics.missing_lookups += 1
+                        metrics.warn(f"No enhancement found for {record.date}/"
+                                     f"{extract_time_ganzhi(record.summary_text)}")
+                else:
+                    if tables is None:
+                        print()
+                        tables = load_tables()
+                    before = (metrics.enhanced_events, metrics.taboo_added, metrics.missing_lookups)
+                    enhanced_event = process_event(text, *tables, metrics, fold=FOLD_SUMMARY,
+                                                   zi_convention=ZI_CONVENTION)
+                    data = enhanced_event.encode('utf-8')
+                    flags = 0
+                    if metrics.enhanced_events > before[0]:
+                        flags |= FLAG_ENHANCED
+                    if metrics.taboo_added > before[1]:
+                        flags |= FLAG_TABOO
+                    if metrics.missing_lookups > before[2]:
+                        flags |= FLAG_MISSING
+                    marker = summary_marker(parse_event(enhanced_event).summary_text)
+                    if marker == '吉':
+                        flags |= FLAG_AUSPICIOUS
+                    elif marker == '凶':
+                        flags |= FLAG_INAUSPICIOUS
+                
+                offset = enhanced_out.bytes_written
+                enhanced_out.write_bytes(data)
+                route = flags & (FLAG_AUSPICIOUS | FLAG_INAUSPICIOUS)
+                counts[route] += 1
+                if route:
+                    split_out[route].write_bytes(data)
+                if EXTRA_FEEDS or encoder is not None:
+                    # The 吉/凶 pair is routed by flags; extra feeds need the event's facts
+                    enhanced_event = data.decode('utf-8')
+                    if EXTRA_FEEDS:
+                        extra_out.write_event(enhanced_event)
+                    if encoder is not None:
+                        encoder.add(enhanced_event)
+                entries.append(ManifestEntry(uid, digest, modified, offset, len(data), flags))
+                
+                if position is not None:
+                    progress.update(position)
+    finally:
+        if old_enhanced is not None:
+            old_enhanced.close()
+    
+    save_manifest(manifest_file, key, ENHANCED_FILE, entries)
+    if encoder is not None:
+        write_binary(encoder, header, footer)
+    
+    removed = len(set(previous) - seen)
+    progress.finish()
+    print(f"[4/4] ✓ Reused {reused:,} events, re-enhanced {len(entries) - reused:,}, "
+          f"dropped {removed:,}")
+    metrics.bytes_read += total_bytes
+    for writer in (enhanced_out, auspicious_out, inauspicious_out, *(feed.writer for feed in EXTRA_FEEDS)):
+        metrics.bytes_written += writer.bytes_written
+        print(f"      Wrote {writer.filepath} ({writer.bytes_written:,} bytes)")
+    print(f"      Manifest saved to {manifest_file}\n")
+    
+    return counts[FLAG_AUSPICIOUS], counts[FLAG_INAUSPICIOUS], counts[0]
+
+def validate_output_file():
+    """Validation report of the enhanced file (see ics_validator.py)
+
+    Uses the validator the writer fed during this run; only when the file
+    was not written by this process is it scanned again, memory-mapped.
+    """
+    if output_validator is not None and output_validator.closed:
+        return output_validator.report
+    return validate_file(ENHANCED_FILE)
 
 def generate_report():
     """Generate and display completion report"""
+    warnings = metrics.warnings
     print("\n" + "="*80)
     print("ENHANCEMENT COMPLETE - SUMMARY REPORT")
     print("="*80)
     
     print(f"\n📊 Statistics:")
-    print(f"  Total events processed:  {stats['total_events']:,}")
-    enhancement_pct = 100*stats['enhanced_events']/max(stats['total_events'],1)
-    print(f"  Events enhanced:         {stats['enhanced_events']:,} ({enhancement_pct:.1f}%)")
-    print(f"  Events with taboos:      {stats['taboo_added']:,}")
-    print(f"  Events skipped:          {stats['skipped_events']:,}")
-    print(f"  Missing lookups:         {stats['missing_lookups']}")
+    print(f"  Total events processed:  {metrics.total_events:,}")
+    enhancement_pct = 100*metrics.enhanced_events/max(metrics.total_events,1)
+    print(f"  Events enhanced:         {metrics.enhanced_events:,} ({enhancement_pct:.1f}%)")
+    print(f"  Events with taboos:      {metrics.taboo_added:,}")
+    print(f"  Events skipped:          {metrics.skipped_events:,}")
+    print(f"  Missing lookups:         {metrics.missing_lookups}")
+    if metrics.bytes_copied or metrics.bytes_patched:
+        print(f"  Bytes copied / patched:  {metrics.bytes_copied:,} / {metrics.bytes_patched:,}")
     
     print(f"\n📁 Output:")
     print(f"  Enhanced file:           {ENHANCED_FILE}")
@@ -402,28 +581,38 @@ def generate_report():
     
     # Validation
     print(f"\n✅ Validation Results:")
-    checks = validate_output_file()
-    for check, result in checks.items():
+    with metrics.stage('validate'):
+        report = validate_output_file()
+    for check, result in report.checks().items():
         status = "PASS" if result else "FAIL"
         print(f"  ✓ {check}: {status}")
+    for error in report.errors[:5]:
+        print(f"    ✗ {error}")
+    if report.error_count > 5:
+        print(f"    ... {report.error_count - 5} more errors")
     
-    overall = all(checks.values())
-    print(f"  Overall status:          {'VALID ✓' if overall else 'INVALID ✗'}")
+    print(f"  Overall status:          {'VALID ✓' if report.ok else 'INVALID ✗'}")
     
     # Samples
-    if stats['samples']:
-        print(f"\n📝 Sample Transformations (first {len(stats['samples'])} events):")
-        for idx, sample in enumerate(stats['samples'], 1):
+    if metrics.samples:
+        print(f"\n📝 Sample Transformations (first {len(metrics.samples)} events):")
+        for idx, sample in enumerate(metrics.samples, 1):
             print(f"\n  Sample {idx} - Date: {sample['date']}")
             print(f"    Before: {sample['before']}")
             print(f"    After:  {sample['after']}")
     
     # Warnings
-    if stats['warnings']:
-        print(f"\n⚠️  First {min(5, len(stats['warnings']))} Warnings (total: {len(stats['warnings'])}):")
-        for warning in stats['warnings'][:5]:
+    if warnings:
+        print(f"\n⚠️  First {min(5, len(warnings))} Warnings (total: {len(warnings)}):")
+        for warning in warnings[:5]:
             print(f"    • {warning}")
     
+    # Stage timings
+    print(f"\n⏱️  Stage Timings:")
+    for name, timing in metrics.stages.items():
+        rate = f"{timing.events_per_second:>12,.0f} events/s" if timing.events else ''
+        print(f"  {name:<22} {timing.wall_seconds:8.3f}s wall {timing.cpu_seconds:8.3f}s cpu {rate}")
+    
     print(f"\n📋 Log file saved to:    {LOG_FILE}\n")
     print("="*80)
     
@@ -431,25 +620,128 @@ def generate_report():
     with open(LOG_FILE, 'w', encoding='utf-8') as f:
         f.write(f"Enhancement Timestamp: {datetime.now().isoformat()}\n\n")
         f.write(f"📊 Statistics:\n")
-        f.write(f"  Total events processed:  {stats['total_events']}\n")
-        f.write(f"  Events enhanced:         {stats['enhanced_events']}\n")
-        f.write(f"  Events with taboos:      {stats['taboo_added']}\n")
-        f.write(f"  Events skipped:          {stats['skipped_events']}\n")
-        f.write(f"  Missing lookups:         {stats['missing_lookups']}\n\n")
+        f.write(f"  Total events processed:  {metrics.total_events}\n")
+        f.write(f"  Events enhanced:         {metrics.enhanced_events}\n")
+        f.write(f"  Events with taboos:      {metrics.taboo_added}\n")
+        f.write(f"  Events skipped:          {metrics.skipped_events}\n")
+        f.write(f"  Missing lookups:         {metrics.missing_lookups}\n\n")
         
         f.write(f"📝 Sample Transformations:\n")
-        for idx, sample in enumerate(stats['samples'], 1):
+        for idx, sample in enumerate(metrics.samples, 1):
             f.write(f"\n  Sample {idx} - Date: {sample['date']}\n")
             f.write(f"    {sample['before']}\n")
             f.write(f"    {sample['after']}\n")
         
-        if stats['warnings']:
-            f.write(f"\n⚠️  Warnings (total: {len(stats['warnings'])}):\n")
-            for warning in stats['warnings'][:10]:
+        if warnings:
+            f.write(f"\n⚠️  Warnings (total: {len(warnings)}):\n")
+            for warning in warnings[:10]:
                 f.write(f"    • {warning}\n")
 
+def positive_int(text):
+    """argparse type for counts of at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid count: {text!r}")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {text!r}")
+    return value
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='enhance and split in a single streaming pass (memory bounded by one event)'
+    )
+    parser.add_argument(
+        '--workers', type=positive_int, default=1, metavar='N',
+        help='enhance shards of events in N worker processes (implies --stream)'
+    )
+    parser.add_argument(
+        '--pipelined', action='store_true',
+        help='overlap reading, enhancing and writing on separate threads with bounded queues (implies --stream)'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='only re-enhance events added or changed since the previous --incremental run'
+    )
+    parser.add_argument(
+        '--atomic-writes', action='store_true',
+        help='write each output to a temporary file and atomically rename it into place'
+    )
+    parser.add_argument(
+        '--fsync', action='store_true',
+        help='fsync each output file before closing it'
+    )
+    parser.add_argument(
+        '--branch-taboos', action='store_true',
+        help="also apply the earthly-branch taboo (e.g. '午不苫盖 屋主更张') to matching hours"
+    )
+    parser.add_argument(
+        '--fold', action='store_true',
+        help='fold enhanced SUMMARY lines longer than 75 octets (RFC 5545)'
+    )
+    parser.add_argument(
+        '--zi-convention', choices=ZI_CONVENTIONS, default=DEFAULT_ZI_CONVENTION,
+        help="reference day of the 23:00 hour: 'early' looks it up on the next day, whose "
+             "子 hour it starts (default, as the trunk calendar dates it); 'late' on its own date"
+    )
+    parser.add_argument(
+        '--feed', action='append', default=[], metavar='PATH=SPEC',
+        help="also write the events matching SPEC (e.g. 'auspicious+weekday:sat,sun', "
+             "see split_engine.py) to PATH; repeatable"
+    )
+    parser.add_argument(
+        '--binary', action='store_true',
+        help=f'also write the compact binary intermediate {BINARY_FILE} and split from its columns '
+             '(see binary_calendar.py)'
+    )
+    parser.add_argument(
+        '--index', action='store_true',
+        help='also write a sorted DTSTART range index next to the enhanced calendar (see event_index.py)'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='always re-parse the reference calendars and do not write the lookup cache'
+    )
+    parser.add_argument(
+        '--progress', choices=PROGRESS_MODES, default='auto',
+        help="progress output: 'auto' (bar on a terminal, silent otherwise), 'tty', 'json' lines or 'none'"
+    )
+    parser.add_argument(
+        '--metrics-json', metavar='PATH',
+        help='write run counters and per-stage timings to PATH as JSON'
+    )
+    parser.add_argument(
+        '--metrics-prom', metavar='PATH',
+        help='write run counters and per-stage timings to PATH in Prometheus text format'
+    )
+    return parser.parse_args()
+
+def write_metrics(json_path=None, prom_path=None):
+    """Export the run metrics for schedulers and dashboards"""
+    for path, text in ((json_path, metrics.to_json), (prom_path, metrics.to_prometheus)):
+        if path:
+            with ICSWriter(path, atomic=True) as writer:
+                writer.write(text())
+            print(f"✓ Metrics written to {path}")
+
 def main():
     """Main execution"""
+    global FOLD_SUMMARY, WRITE_BINARY, ZI_CONVENTION
+    args = parse_args()
+    FOLD_SUMMARY = args.fold
+    ZI_CONVENTION = args.zi_convention
+    WRITE_BINARY = args.binary
+    try:
+        EXTRA_FEEDS[:] = [parse_feed(argument) for argument in args.feed]
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    configure_progress(args.progress)
+    WRITE_POLICY['atomic'] = args.atomic_writes
+    WRITE_POLICY['fsync'] = args.fsync
+
     print("╔" + "="*78 + "╗")
     print("║" + " "*78 + "║")
     print("║" + "Calendar Enhancement Script (Extended)".center(78) + "║")
@@ -458,20 +750,47 @@ def main():
     print("╚" + "="*78 + "╝")
     print()
     
-    # Count total events
-    with open(TRUNK_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
-    stats['total_events'] = content.count('BEGIN:VEVENT')
-    
-    # Build lookups
-    marker_lookup = build_lookup_dictionary()
-    taboo_lookup = build_taboo_dictionary()
-    
-    # Enhance and write enhanced file
-    enhanced_content = enhance_trunk_branch(marker_lookup, taboo_lookup)
+    def load_tables():
+        # Build lookups (or load them from the compiled cache)
+        with metrics.stage('load_tables'):
+            marker_lookup, taboo_lookup = load_reference_tables(use_cache=not args.no_cache)
+        taboo_lookup.include_branch = args.branch_taboos
+        return marker_lookup, taboo_lookup
+    
+    if args.incremental:
+        # Only re-enhance events that changed since the previous run
+        with metrics.stage('enhance_split') as stage:
+            auspicious_count, inauspicious_count, split_skipped = enhance_incremental(
+                load_tables, branch_taboos=args.branch_taboos
+            )
+            stage.events = metrics.total_events
+    elif args.stream or args.pipelined or args.workers > 1:
+        marker_lookup, taboo_lookup = load_tables()
+        
+        # Enhance, write and split in one pass
+        with metrics.stage('enhance_split') as stage:
+            auspicious_count, inauspicious_count, split_skipped = enhance_streaming(
+                marker_lookup, taboo_lookup, workers=args.workers, pipelined=args.pipelined
+            )
+            stage.events = metrics.total_events
+    else:
+        marker_lookup, taboo_lookup = load_tables()
+        
+        # Enhance and write enhanced file
+        with metrics.stage('enhance') as stage:
+            enhanced_content = enhance_trunk_branch(marker_lookup, taboo_lookup)
+            stage.events = metrics.total_events
+        
+        # Split into two files
+        with metrics.stage('split') as stage:
+            auspicious_count, inauspicious_count, split_skipped = split_into_two_files(enhanced_content)
+            stage.events = metrics.total_events
     
-    # Split into two files
-    auspicious_count, inauspicious_count, split_skipped = split_into_two_files(enhanced_content)
+    if args.index:
+        # Sorted DTSTART index for range queries over the enhanced file
+        with metrics.stage('index') as stage:
+            stage.events = build_index(ENHANCED_FILE)
+        print(f"✓ Range index written to {index_path(ENHANCED_FILE)}\n")
     
     # Generate report
     generate_report()
@@ -483,6 +802,8 @@ def main():
     print(f"  ────────────────────────")
     print(f"  Total in output:        {auspicious_count + inauspicious_count}")
     print()
+    
+    write_metrics(args.metrics_json, args.metrics_prom)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Enhanced Event Range Index
+Sorted on-disk index of the VEVENTs in an enhanced calendar, so date-range
+and time-window slices can be cut out of it without parsing the rest.
+
+    python3 event_index.py build cal_trunkBranch_enhanced.ics
+    python3 event_index.py query --start 20250101 --end 20250201 --marker 吉 -o january.ics
+
+Index file layout (little-endian), written next to the calendar as
+<calendar>.idx:
+    8 bytes   magic b'AUSPIDX1'
+    4 bytes   header length N
+    N bytes   UTF-8 JSON header: calendar identity, time zone, event
+              count, header/footer spans and section offsets
+    ...       int64   DTSTART epoch seconds, ascending
+    ...       uint64  byte offset of the VEVENT in the calendar
+    ...       uint32  byte length of the VEVENT
+    ...       uint8   marker (0 none, 1 吉, 2 凶)
+    ...       uint8   flags (FLAG_TABOO)
+
+The index is opened with mmap and the columns are used in place: a range
+query is two binary searches over the epoch column, after which the
+matching VEVENT spans are sliced straight out of the memory-mapped
+calendar. The index is tied to the calendar's size and mtime and is
+ignored once the calendar changes.
+
+Floating DTSTART values are read in the calendar's X-WR-TIMEZONE (UTC
+when it has none); values with a TZID use that zone and values ending in
+'Z' are UTC.
+"""
+
+import argparse
+import mmap
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+from ics_extract import parse_event, summary_marker
+from ics_writer import ICSWriter
+from lookup_cache import native_bytes, native_view, read_sections_header, source_key, write_sections
+
+MAGIC = b'AUSPIDX1'
+FORMAT_VERSION = 1
+
+ENHANCED_FILE = "cal_trunkBranch_enhanced.ics"
+
+MARKER_CODES = {None: 0, '吉': 1, '凶': 2}
+MARKERS = {code: marker for marker, code in MARKER_CODES.items()}
+
+FLAG_TABOO = 1
+
+# (name, typecode) of each column, in file order
+COLUMNS = (
+    ('epochs', 'q'),
+    ('offsets', 'Q'),
+    ('lengths', 'I'),
+    ('markers', 'B'),
+    ('flags', 'B'),
+)
+
+EVENT_PATTERN = re.compile(rb'^BEGIN:VEVENT\r?\n.*?^END:VEVENT[^\n]*\n?', re.MULTILINE | re.DOTALL)
+TIMEZONE_PATTERN = re.compile(rb'^X-WR-TIMEZONE:([^\r\n]*)', re.MULTILINE)
+TZID_PATTERN = re.compile(r';TZID=("?)([^;:"]*)\1')
+
+
+def index_path(calendar_path):
+    """Index file kept alongside the calendar"""
+    return f'{calendar_path}.idx'
+
+
+def get_zone(name):
+    """tzinfo for an IANA zone name, or None if unknown or unavailable"""
+    if not name or ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def to_epoch(value, zone=None):
+    """Epoch seconds of an ICS DATE/DATE-TIME value (or YYYY-MM-DD[THH:MM])
+
+    Values ending in 'Z' are UTC; others are read in `zone` (UTC if None).
+    Raises ValueError for anything else.
+    """
+    value = value.strip().replace('-', '').replace(':', '')
+    utc = value.endswith('Z')
+    value = value.rstrip('Z')
+    for fmt in ('%Y%m%dT%H%M%S', '%Y%m%dT%H%M', '%Y%m%d'):
+        try:
+            moment = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"not a date or date-time: {value!r}")
+    moment = moment.replace(tzinfo=timezone.utc if utc or zone is None else zone)
+    return int(moment.timestamp())
+
+
+def dtstart_epoch(record, zone):
+    """Epoch seconds of an EventRecord's DTSTART, honouring a TZID parameter"""
+    start, end = record.dtstart
+    line_start = record.text.rfind('\n', 0, start) + 1
+    tzid = TZID_PATTERN.search(record.text, line_start, start)
+    if tzid:
+        zone = get_zone(tzid.group(2)) or zone
+    return to_epoch(record.text[start:end], zone)
+
+
+def build_index(calendar_path, output_path=None):
+    """Index every VEVENT of calendar_path; return the number of events indexed
+
+    Events without a DTSTART are left out of the index.
+    """
+    output_path = output_path or index_path(calendar_path)
+    identity = source_key(calendar_path, with_hash=False)
+
+    with open(calendar_path, 'rb') as f:
+        data = f.read()
+
+    match = TIMEZONE_PATTERN.search(data)
+    zone_name = match.group(1).decode('utf-8').strip() if match else None
+    zone = get_zone(zone_name)
+
+    rows = []
+    first = last = None
+    for match in EVENT_PATTERN.finditer(data):
+        offset, end = match.span()
+        if first is None:
+            first = offset
+        last = end
+        record = parse_event(match.group().decode('utf-8'))
+        if record.dtstart is None:
+            continue
+        try:
+            epoch = dtstart_epoch(record, zone)
+        except ValueError:
+            continue
+        summary = record.summary_text or ''
+        marker = MARKER_CODES[summary_marker(summary)]
+        flags = FLAG_TABOO if summary.startswith('『') and '[' in summary else 0
+        rows.append((epoch, offset, end - offset, marker, flags))
+    rows.sort()
+
+    columns = [array(typecode, (row[idx] for row in rows)) for idx, (_, typecode) in enumerate(COLUMNS)]
+    sections = [(name, native_bytes(cells) if cells.itemsize > 1 else cells.tobytes())
+                for (name, _), cells in zip(COLUMNS, columns)]
+
+    header = {
+        'version': FORMAT_VERSION,
+        'calendar': identity,
+        'timezone': zone_name if zone else None,
+        'events': len(rows),
+        'header_end': first if first is not None else len(data),
+        'footer_start': last if last is not None else len(data),
+        'sections': {},
+    }
+
+    write_sections(output_path, MAGIC, header, sections)
+    return len(rows)
+
+
+class EventIndex:
+    """Memory-mapped range index over one enhanced calendar
+
+    Use open() rather than the constructor; close() (or a with block)
+    releases both mappings.
+    """
+
+    def __init__(self, calendar_path, header, index_map, calendar_map):
+        self.calendar_path = calendar_path
+        self.header = header
+        self.zone = get_zone(header['timezone'])
+        self._index_map = index_map
+        self._calendar_map = calendar_map
+        self._calendar = memoryview(calendar_map) if calendar_map is not None else memoryview(b'')
+        view = memoryview(index_map)
+        for name, typecode in COLUMNS:
+            offset, length = header['sections'][name]
+            section = view[offset:offset + length]
+            setattr(self, name, native_view(section, typecode) if typecode not in 'bB' else section)
+
+    @classmethod
+    def open(cls, calendar_path, path=None):
+        """EventIndex for calendar_path, or None if the index is missing or stale"""
+        path = path or index_path(calendar_path)
+        try:
+            with open(path, 'rb') as f:
+                index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        header = read_sections_header(index_map, MAGIC)
+        try:
+            current = source_key(calendar_path, with_hash=False)
+        except FileNotFoundError:
+            current = None
+        if (header is None or header.get('version') != FORMAT_VERSION or header.get('calendar') != current
+                or not _columns_match(header)):
+            index_map.close()
+            return None
+
+        calendar_map = None
+        if current['size']:
+            with open(calendar_path, 'rb') as f:
+                calendar_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(calendar_path, header, index_map, calendar_map)
+
+    def __len__(self):
+        return self.header['events']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views into the mappings must be released before the mappings close
+        for name, _ in COLUMNS:
+            column = getattr(self, name, None)
+            if isinstance(column, memoryview):
+                column.release()
+            setattr(self, name, None)
+        self._calendar.release()
+        self._index_map.close()
+        if self._calendar_map is not None:
+            self._calendar_map.close()
+
+    def epoch(self, value):
+        """Epoch seconds of a datetime, an int or a date string in the index's zone"""
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=self.zone or timezone.utc)
+            return int(value.timestamp())
+        if isinstance(value, (int, float)):
+            return int(value)
+        return to_epoch(value, self.zone)
+
+    def positions(self, start=None, end=None):
+        """(lo, hi) rows whose DTSTART lies in [start, end)"""
+        epochs = self.epochs
+        lo = bisect_left(epochs, self.epoch(start)) if start is not None else 0
+        hi = bisect_left(epochs, self.epoch(end)) if end is not None else len(self)
+        return lo, max(lo, hi)
+
+    def select(self, start=None, end=None, marker=None, taboo=None):
+        """Yield (epoch, offset, length, marker, has_taboo) rows in [start, end)
+
+        marker ('吉'/'凶') and taboo (True/False) further filter the rows.
+        """
+        code = MARKER_CODES[marker] if marker is not None else None
+        lo, hi = self.positions(start, end)
+        epochs, offsets, lengths, markers, flags = (getattr(self, name) for name, _ in COLUMNS)
+        for row in range(lo, hi):
+            if code is not None and markers[row] != code:
+                continue
+            has_taboo = bool(flags[row] & FLAG_TABOO)
+            if taboo is not None and has_taboo != taboo:
+                continue
+            yield epochs[row], offsets[row], lengths[row], MARKERS[markers[row]], has_taboo
+
+    def events(self, start=None, end=None, marker=None, taboo=None):
+        """Yield the raw VEVENT bytes of the selected rows"""
+        calendar = self._calendar
+        for _, offset, length, _, _ in self.select(start, end, marker, taboo):
+            yield calendar[offset:offset + length]
+
+    def write_slice(self, output, start=None, end=None, marker=None, taboo=None):
+        """Write a calendar holding only the selected events; return how many"""
+        calendar = self._calendar
+        count = 0
+        with ICSWriter(output, atomic=True) as writer:
+            writer.write_bytes(calendar[:self.header['header_end']])
+            for event in self.events(start, end, marker, taboo):
+                writer.write_bytes(event)
+                count += 1
+            writer.write_bytes(calendar[self.header['footer_start']:])
+        return count
+
+
+def _columns_match(header):
+    """True if every column section holds exactly header['events'] cells"""
+    events = header.get('events')
+    if not isinstance(events, int) or events < 0:
+        return False
+    sections = header['sections']
+    return all(
+        name in sections and sections[name][1] == events * array(typecode).itemsize
+        for name, typecode in COLUMNS
+    )
+
+
+def open_or_build(calendar_path):
+    """EventIndex for calendar_path, (re)building the index file if needed"""
+    index = EventIndex.open(calendar_path)
+    if index is None:
+        build_index(calendar_path)
+        index = EventIndex.open(calendar_path)
+    return index
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='(re)build the index of an enhanced calendar')
+    build.add_argument('calendar', nargs='?', default=ENHANCED_FILE)
+
+    query = commands.add_parser('query', help='cut a date range out of an indexed calendar')
+    query.add_argument('calendar', nargs='?', default=ENHANCED_FILE)
+    query.add_argument('--start', help='first DTSTART to include, e.g. 20250101 or 20250101T0900')
+    query.add_argument('--end', help='DTSTART to stop before (exclusive)')
+    query.add_argument('--marker', choices=('吉', '凶'), help='only events with this marker')
+    taboo = query.add_mutually_exclusive_group()
+    taboo.add_argument('--taboo', dest='taboo', action='store_const', const=True,
+                       help='only events that carry a Pengzu taboo')
+    taboo.add_argument('--no-taboo', dest='taboo', action='store_const', const=False,
+                       help='only events without a Pengzu taboo')
+    query.add_argument('-o', '--output', help='write the slice as a calendar to this file '
+                                              '(default: list the matching events)')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+
+    if args.command == 'build':
+        count = build_index(args.calendar)
+        print(f"✓ Indexed {count:,} events into {index_path(args.calendar)}")
+        return
+
+    index = open_or_build(args.calendar)
+    with index:
+        try:
+            if args.output:
+                count = index.write_slice(args.output, args.start, args.end, args.marker, args.taboo)
+                print(f"✓ Wrote {count:,} events to {args.output}")
+                return
+            zone = index.zone or timezone.utc
+            for epoch, offset, length, marker, has_taboo in index.select(
+                    args.start, args.end, args.marker, args.taboo):
+                when = datetime.fromtimestamp(epoch, zone).strftime('%Y-%m-%d %H:%M')
+                print(f"{when}  {marker or '-'}{'  taboo' if has_taboo else ''}  @{offset}+{length}")
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+
+
+if __name__ == '__main__':
+    main()
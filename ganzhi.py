@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Sexagenary (Ganzhi) Helpers
+Integer conversions for heavenly stems, earthly branches, the 60-position
+sexagenary cycle and YYYYMMDD dates, used by the flat lookup indexes, and
+the mapping from an hour's DTSTART to the reference calendar day it
+belongs to.
+"""
+
+from datetime import date as _date
+from functools import lru_cache
+
+STEMS = '甲乙丙丁戊己庚辛壬癸'
+BRANCHES = '子丑寅卯辰巳午未申酉戌亥'
+
+# 甲子, 乙丑, ... 癸亥: position i has stem i % 10 and branch i % 12
+SEXAGENARY = tuple(STEMS[i % 10] + BRANCHES[i % 12] for i in range(60))
+
+STEM_INDEX = {stem: i for i, stem in enumerate(STEMS)}
+BRANCH_INDEX = {branch: i for i, branch in enumerate(BRANCHES)}
+SEXAGENARY_INDEX = {ganzhi: i for i, ganzhi in enumerate(SEXAGENARY)}
+
+# Which day the 23:00-24:00 half of the 子 hour belongs to. 'early' (早子时,
+# the trunk calendar's convention) moves it to the next day, whose 子 hour
+# it starts; 'late' (晚子时) keeps it on its Gregorian date, where good_bad
+# lists it as the 13th slot.
+ZI_CONVENTIONS = ('early', 'late')
+DEFAULT_ZI_CONVENTION = 'early'
+
+# Days to add to the DTSTART date, indexed by the DTSTART hour
+DAY_KEY_SHIFTS = {
+    'early': (0,) * 23 + (1,),
+    'late': (0,) * 24,
+}
+
+
+def ganzhi_index(ganzhi):
+    """Position 0-59 of a 2-character ganzhi such as '丙子', or -1"""
+    return SEXAGENARY_INDEX.get(ganzhi, -1)
+
+
+def ganzhi_from_index(index):
+    """2-character ganzhi for a cycle position 0-59"""
+    return SEXAGENARY[index % 60]
+
+
+@lru_cache(maxsize=4096)
+def date_to_ordinal(yyyymmdd):
+    """Proleptic Gregorian ordinal for a 'YYYYMMDD' string, or -1 if invalid"""
+    try:
+        return _date(int(yyyymmdd[:4]), int(yyyymmdd[4:6]), int(yyyymmdd[6:8])).toordinal()
+    except (ValueError, TypeError):
+        return -1
+
+
+def day_key(dtstart, convention=DEFAULT_ZI_CONVENTION):
+    """Reference-day ordinal for a 'YYYYMMDD[THHMMSS]' DTSTART, or -1 if invalid
+
+    Not cached: every trunk DTSTART is unique, while the date part hits
+    date_to_ordinal's cache.
+    """
+    ordinal = date_to_ordinal(dtstart[:8])
+    hour = dtstart[9:11]
+    if ordinal < 0 or not hour.isdigit() or int(hour) > 23:
+        return ordinal
+    return ordinal + DAY_KEY_SHIFTS[convention][int(hour)]
+
+
+def ordinal_to_date(ordinal):
+    """'YYYYMMDD' string for a proleptic Gregorian ordinal"""
+    return _date.fromordinal(ordinal).strftime('%Y%m%d')
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Computed Ganzhi Calendar
+Derive the year, month, day and hour pillars of any moment arithmetically
+and synthesize cal_trunkBranch.ics-style events for any date range, so the
+trunk calendar no longer has to be downloaded and parsed.
+
+    python3 ganzhi_calendar.py pillars 2024-12-31T23:30
+    python3 ganzhi_calendar.py generate --start 2027-01-01 --end 2027-12-31 -o trunk_2027.ics
+    python3 ganzhi_calendar.py generate --start 2027-01-01 --end 2027-12-31 --enhance -o enhanced_2027.ics
+    python3 ganzhi_calendar.py validate cal_trunkBranch.ics
+
+Day pillars follow the unbroken 60-day cycle and the 23:00 slot already
+belongs to the next day (early-zi, as in the trunk calendar). Months change
+on the date of each jie (节) solar term and take their stems from the solar
+year (五虎遁); hours take theirs from the day (五鼠遁). The year pillar and
+zodiac animal change at the Lunar New Year, as the trunk calendar does.
+Solar terms and new moons come from solar_terms.py.
+
+Against the shipped 2025-2026 trunk calendar, `validate` reports only two
+days: upstream switches to 丁丑 month on 2025-01-06 although 小寒 fell on
+2025-01-05, and to 庚寅 month on 2026-02-03 although 立春 falls on
+2026-02-04. The computed calendar follows the astronomical dates.
+"""
+
+import argparse
+import re
+import sys
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from ganzhi import SEXAGENARY
+from solar_terms import jie_dates, lunar_new_year
+
+# 2025-01-01 is a 庚午 day
+DAY_CYCLE_OFFSET = (SEXAGENARY.index('庚午') - date(2025, 1, 1).toordinal()) % 60
+
+# The 寅 month of solar year 2025 is 戊寅; one month per jie since then
+MONTH_CYCLE_OFFSET = (SEXAGENARY.index('戊寅') - (2025 * 12 + 1)) % 60
+
+ZODIAC = '鼠牛虎兔龙蛇马羊猴鸡狗猪'
+
+MODIFIED = '20251209T204916'
+UPDATED = '2025-12-09'
+
+TRUNK_HEADER = (
+    "BEGIN:VCALENDAR\n"
+    "PRODID:-//YangH9//China Calendar//CN\n"
+    "VERSION:2.0\n"
+    "CALSCALE:GREGORIAN\n"
+    "METHOD:PUBLISH\n"
+    "X-WR-CALNAME:中华人民共和国天干地支、生辰八字日历\n"
+    "X-WR-TIMEZONE:Asia/Shanghai\n"
+    f"X-WR-CALDESC:更新时间：{UPDATED}\n"
+    "BEGIN:VTIMEZONE\n"
+    "TZID:Asia/Shanghai\n"
+    "X-LIC-LOCATION:Asia/Shanghai\n"
+    "BEGIN:STANDARD\n"
+    "TZOFFSETFROM:+0800\n"
+    "TZOFFSETTO:+0800\n"
+    "TZNAME:CST\n"
+    "DTSTART:19700101T000000\n"
+    "END:STANDARD\n"
+    "END:VTIMEZONE\n"
+)
+
+FOOTER = "END:VCALENDAR"
+
+SERIAL_PATTERN = re.compile(r'^UID:.*?_(\d+)@', re.MULTILINE)
+DTSTART_PATTERN = re.compile(r'^DTSTART:(\d{8}T\d{6})', re.MULTILINE)
+COMPARED_FIELDS = ('SUMMARY', 'LOCATION', 'DESCRIPTION')
+PILLAR_NAMES = ('year', 'month', 'day', 'hour')
+
+
+class Pillars(NamedTuple):
+    """Sexagenary positions 0-59 of the four pillars of a moment"""
+    year: int
+    month: int
+    day: int
+    hour: int
+
+    @property
+    def names(self):
+        """('甲辰', '丙子', '庚午', '丙子') style ganzhi of year, month, day, hour"""
+        return tuple(SEXAGENARY[position] for position in self)
+
+    @property
+    def zodiac(self):
+        return ZODIAC[self.year % 12]
+
+
+def ganzhi_day(moment):
+    """Date whose day pillar covers a moment (23:00 counts as the next day)"""
+    return (moment + timedelta(hours=1)).date()
+
+
+def day_position(day):
+    """Sexagenary position 0-59 of a date's day pillar"""
+    return (day.toordinal() + DAY_CYCLE_OFFSET) % 60
+
+
+def hour_position(day_pos, branch):
+    """Sexagenary position of the hour with `branch` on a day (五鼠遁)"""
+    stem = (day_pos % 5 * 2 + branch) % 10
+    return next(p for p in range(stem, 60, 10) if p % 12 == branch)
+
+
+def year_position(day):
+    """Sexagenary position of the year pillar (changes at the Lunar New Year)"""
+    year = day.year if day >= lunar_new_year(day.year) else day.year - 1
+    return (year - 4) % 60
+
+
+def month_position(day):
+    """Sexagenary position of the month pillar (changes on each jie's date)
+
+    Month n = year * 12 + (m - 1) starts at the jie of Gregorian month m,
+    so consecutive months step through the cycle and the 寅 month of every
+    solar year gets its 五虎遁 stem.
+    """
+    dates = jie_dates(day.year)
+    month = day.month if day >= dates[day.month - 1] else day.month - 1
+    return (day.year * 12 + month - 1 + MONTH_CYCLE_OFFSET) % 60
+
+
+def day_pillars(day):
+    """(year, month, day) positions of a ganzhi day"""
+    return year_position(day), month_position(day), day_position(day)
+
+
+def pillars(moment):
+    """Pillars of a naive China Standard Time datetime"""
+    day = ganzhi_day(moment)
+    year_pos, month_pos, day_pos = day_pillars(day)
+    branch = (moment.hour + 1) // 2 % 12
+    return Pillars(year_pos, month_pos, day_pos, hour_position(day_pos, branch))
+
+
+def slot_bounds(day, branch):
+    """(DTSTART, DTEND) of the two-hour slot with `branch` on a ganzhi day"""
+    if branch == 0:
+        previous = (day - timedelta(days=1)).strftime('%Y%m%d')
+        return f'{previous}T230000', f'{day:%Y%m%d}T005959'
+    return f'{day:%Y%m%d}T{2 * branch - 1:02d}0000', f'{day:%Y%m%d}T{2 * branch:02d}5959'
+
+
+def trunk_event(day, branch, serial, positions=None):
+    """One trunk VEVENT, in the exact layout of cal_trunkBranch.ics"""
+    year_pos, month_pos, day_pos = positions or day_pillars(day)
+    year, month, day_gz = SEXAGENARY[year_pos], SEXAGENARY[month_pos], SEXAGENARY[day_pos]
+    animal = ZODIAC[year_pos % 12]
+    hour = SEXAGENARY[hour_position(day_pos, branch)]
+    start, end = slot_bounds(day, branch)
+    created = start[:-1] + '1'
+    return (
+        "BEGIN:VEVENT\n"
+        f"DTSTART:{start}\n"
+        f"DTEND:{end}\n"
+        f"UID:{created}_ganzhi_{serial}@YangH9\n"
+        f"CREATED:{created}\n"
+        f"LAST-MODIFIED:{MODIFIED}\n"
+        f"SUMMARY:『{hour}时 {day_gz}日 {month}月 {year}{animal}年』\n"
+        f"LOCATION:{year} {month} {day_gz} {hour}\n"
+        f"DESCRIPTION:{year}{animal}年 {month}月 {day_gz}日 {hour}时\\n"
+        f"{year} {month} {day_gz} {hour}\\n\\n更新时间：{UPDATED}\n"
+        "STATUS:CONFIRMED\n"
+        "TRANSP:TRANSPARENT\n"
+        "SEQUENCE:1\n"
+        "END:VEVENT\n"
+    )
+
+
+def iter_days(first_day, last_day):
+    day = first_day
+    while day <= last_day:
+        yield day
+        day += timedelta(days=1)
+
+
+def iter_trunk_events(first_day, last_day, first_serial=1):
+    """Yield the 12 two-hour trunk VEVENTs of every ganzhi day in the range
+
+    The first slot of a ganzhi day starts at 23:00 on the previous date.
+    """
+    serial = first_serial
+    for day in iter_days(first_day, last_day):
+        positions = day_pillars(day)
+        for branch in range(12):
+            yield trunk_event(day, branch, serial, positions)
+            serial += 1
+
+
+def trunk_calendar(first_day, last_day):
+    """Whole trunk calendar text for a range of ganzhi days"""
+    return ''.join([TRUNK_HEADER, *iter_trunk_events(first_day, last_day), FOOTER])
+
+
+class ValidationReport:
+    """Outcome of comparing a trunk calendar with the computed events"""
+
+    def __init__(self):
+        self.events = 0
+        self.matched = 0
+        self.header_matches = None
+        # (DTSTART, what, shipped, computed); `what` is a pillar name when
+        # LOCATION differs, otherwise the differing property
+        self.mismatches = []
+
+    @property
+    def ok(self):
+        return self.header_matches is not False and not self.mismatches and self.matched == self.events
+
+    def by_day(self):
+        """{(ganzhi day, what, shipped, computed): event count}, in file order"""
+        groups = {}
+        for start, what, shipped, computed in self.mismatches:
+            try:
+                day = ganzhi_day(datetime.strptime(start, '%Y%m%dT%H%M%S')).isoformat()
+            except ValueError:
+                day = start
+            key = (day, what, shipped, computed)
+            groups[key] = groups.get(key, 0) + 1
+        return groups
+
+
+def event_fields(text):
+    """{property: value} of the compared properties of a VEVENT"""
+    return {
+        name: value
+        for line in text.splitlines()
+        for name, _, value in [line.partition(':')]
+        if name in COMPARED_FIELDS
+    }
+
+
+def event_differences(shipped, computed):
+    """[(what, shipped, computed)] between two versions of a trunk event"""
+    shipped_fields, computed_fields = event_fields(shipped), event_fields(computed)
+    shipped_pillars = shipped_fields.get('LOCATION', '').split()
+    computed_pillars = computed_fields['LOCATION'].split()
+    if len(shipped_pillars) == len(PILLAR_NAMES) and shipped_pillars != computed_pillars:
+        return [
+            (name, old, new)
+            for name, old, new in zip(PILLAR_NAMES, shipped_pillars, computed_pillars)
+            if old != new
+        ]
+    differences = [
+        (name, shipped_fields.get(name, ''), computed_fields[name])
+        for name in COMPARED_FIELDS
+        if shipped_fields.get(name) != computed_fields[name]
+    ]
+    return differences or [('layout', '', '')]
+
+
+def validate(filepath):
+    """Compare every event of a trunk calendar with its computed counterpart"""
+    from auspicious_times import iter_calendar_parts
+
+    report = ValidationReport()
+    for kind, text, _ in iter_calendar_parts(filepath):
+        if kind == 'header':
+            report.header_matches = text.replace('\r\n', '\n') == TRUNK_HEADER
+            continue
+        if kind != 'event':
+            continue
+
+        report.events += 1
+        # Computed events use LF; compare a CRLF calendar in that form
+        text = text.replace('\r\n', '\n')
+        start = DTSTART_PATTERN.search(text)
+        serial = SERIAL_PATTERN.search(text)
+        if not start or not serial:
+            report.mismatches.append((start.group(1) if start else '?', 'DTSTART/UID', '', ''))
+            continue
+
+        moment = datetime.strptime(start.group(1), '%Y%m%dT%H%M%S')
+        branch = (moment.hour + 1) // 2 % 12
+        computed = trunk_event(ganzhi_day(moment), branch, int(serial.group(1)))
+        if computed == text:
+            report.matched += 1
+            continue
+        for what, shipped, expected in event_differences(text, computed):
+            report.mismatches.append((start.group(1), what, shipped, expected))
+    return report
+
+
+def parse_date(text):
+    """argparse type for YYYY-MM-DD / YYYYMMDD dates"""
+    try:
+        return datetime.strptime(text.replace('-', ''), '%Y%m%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {text!r}")
+
+
+def parse_moment(text):
+    """argparse type for YYYY-MM-DDTHH:MM moments"""
+    for fmt in ('%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y%m%dT%H%M%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"invalid moment: {text!r}")
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    show = commands.add_parser('pillars', help='print the four pillars of moments')
+    show.add_argument('moments', nargs='+', type=parse_moment, help='YYYY-MM-DDTHH:MM, China Standard Time')
+
+    generate = commands.add_parser('generate', help='write a computed trunk calendar')
+    generate.add_argument('--start', type=parse_date, required=True, help='first ganzhi day (its 子 hour starts at 23:00 the day before)')
+    generate.add_argument('--end', type=parse_date, required=True, help='last ganzhi day, inclusive')
+    generate.add_argument('--enhance', action='store_true', help='add markers and taboos from the reference calendars')
+    generate.add_argument('--branch-taboos', action='store_true', help='with --enhance, also add the day branch taboo')
+    generate.add_argument('-o', '--output', default='-', help='output file (default stdout)')
+
+    check = commands.add_parser('validate', help='compare a trunk calendar with the computed events')
+    check.add_argument('trunk', nargs='?', default='cal_trunkBranch.ics')
+    check.add_argument('--show', type=int, default=20, help='mismatching days to print (default 20)')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+
+    if args.command == 'pillars':
+        for moment in args.moments:
+            p = pillars(moment)
+            year, month, day, hour = p.names
+            print(f"{moment:%Y-%m-%d %H:%M}  {year}{p.zodiac}年 {month}月 {day}日 {hour}时")
+        return
+
+    if args.command == 'generate':
+        if args.end < args.start:
+            raise SystemExit("❌ --end is before --start")
+        events = iter_trunk_events(args.start, args.end)
+        if args.enhance:
+            from auspicious_times import Enhancer
+            from metrics import RunMetrics
+            enhancer, metrics = Enhancer(branch_taboos=args.branch_taboos), RunMetrics()
+            events = (f'BEGIN:VEVENT{enhancer.enhance_event(event[12:], metrics)}' for event in events)
+
+        if args.output == '-':
+            sys.stdout.write(TRUNK_HEADER)
+            sys.stdout.writelines(events)
+            sys.stdout.write(FOOTER)
+        else:
+            from ics_writer import ICSWriter
+            with ICSWriter(args.output) as writer:
+                writer.write(TRUNK_HEADER)
+                writer.writelines(events)
+                writer.write(FOOTER)
+            days = (args.end - args.start).days + 1
+            print(f"✓ Wrote {args.output} ({writer.bytes_written:,} bytes, {days:,} days)")
+        if args.enhance and metrics.missing_lookups:
+            print(f"⚠️  {metrics.missing_lookups} hours not covered by the reference calendars", file=sys.stderr)
+        return
+
+    report = validate(args.trunk)
+    print(f"📊 {args.trunk}: {report.matched:,}/{report.events:,} events match the computed calendar")
+    if report.header_matches is False:
+        print("⚠️  Header differs from the computed header")
+    groups = list(report.by_day().items())
+    for (day, what, shipped, computed), count in groups[:args.show]:
+        print(f"  ✗ {day} {what}: shipped {shipped or '-'}, computed {computed or '-'} ({count} events)")
+    if len(groups) > args.show:
+        print(f"  ... {len(groups) - args.show} more")
+    if not report.ok:
+        sys.exit(1)
+    print("✅ All events match")
+
+if __name__ == '__main__':
+    main()
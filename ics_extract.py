@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+VEVENT Field Extraction
+Shared single-scan extraction of the properties the scripts care about.
+
+parse_event() walks a VEVENT block once with a precompiled pattern and
+returns an EventRecord holding the (start, end) spans of the DTSTART,
+DTEND, SUMMARY, LOCATION and UID values. Values are sliced out of the
+original text on demand, so untouched properties are never copied.
+
+Folded lines and CRLF endings are unfolded/normalized first (only when
+present), and properties of nested components such as VALARM are ignored.
+"""
+
+import re
+from collections import namedtuple
+
+from ics_tokenizer import fold_line, unfold
+
+# One alternation over the properties we need; first occurrence wins
+PROPERTY_PATTERN = re.compile(
+    r'^(DTSTART|DTEND|SUMMARY|LOCATION|UID)(?:;[^:\r\n]*)?:([^\r\n]*)',
+    re.MULTILINE
+)
+
+COMPONENT_PATTERN = re.compile(r'^(BEGIN|END):([^\r\n]*)', re.MULTILINE)
+
+TIME_GANZHI_PATTERN = re.compile(r'『(\S{2})时')
+
+FIELD_INDEX = {
+    'DTSTART': 1,
+    'DTEND': 2,
+    'SUMMARY': 3,
+    'LOCATION': 4,
+    'UID': 5,
+}
+
+
+class EventRecord(namedtuple('EventRecord', 'text dtstart dtend summary location uid')):
+    """Spans of the interesting properties inside one VEVENT block
+
+    Each field other than `text` is a (start, end) tuple indexing the
+    property value inside `text`, or None when the property is absent.
+    """
+
+    __slots__ = ()
+
+    def value(self, field):
+        """Return the value of a field ('summary', 'uid', ...) or None"""
+        span = getattr(self, field)
+        if span is None:
+            return None
+        return self.text[span[0]:span[1]]
+
+    @property
+    def date(self):
+        """YYYYMMDD from DTSTART, or None when DTSTART is missing/malformed"""
+        if self.dtstart is None:
+            return None
+        start = self.dtstart[0]
+        date = self.text[start:start + 8]
+        if len(date) == 8 and date.isdigit():
+            return date
+        return None
+
+    @property
+    def summary_text(self):
+        return self.value('summary')
+
+    def replace_summary(self, new_summary, fold=False):
+        """Return the event text with the SUMMARY value replaced
+
+        With fold=True the SUMMARY line is folded at 75 octets (RFC 5545).
+        """
+        start, end = self.summary
+        if fold:
+            line_start = self.text.rfind('\n', 0, start) + 1
+            head = self.text[line_start:start]
+            return self.text[:line_start] + fold_line(head + new_summary) + self.text[end:]
+        return self.text[:start] + new_summary + self.text[end:]
+
+
+def value_date(value):
+    """YYYYMMDD at the start of a DTSTART value, or None when missing/malformed"""
+    date = value[:8] if value else ''
+    return date if len(date) == 8 and date.isdigit() else None
+
+
+def _nested_spans(text):
+    """(start, end) ranges of components nested inside the VEVENT"""
+    spans = []
+    depth = 0
+    start = 0
+    for match in COMPONENT_PATTERN.finditer(text):
+        if match.group(2).strip() == 'VEVENT':
+            continue
+        if match.group(1) == 'BEGIN':
+            if depth == 0:
+                start = match.start()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                spans.append((start, match.end()))
+    if depth:
+        spans.append((start, len(text)))
+    return spans
+
+
+def parse_event(text):
+    """Scan a VEVENT block once and return its EventRecord
+
+    A folded or CRLF-terminated block is unfolded first, so the record's
+    text (and any text derived from it) is the unfolded LF form.
+    """
+    if '\r' in text or '\n ' in text or '\n\t' in text:
+        text = unfold(text)
+    nested = _nested_spans(text) if 'BEGIN:' in text[1:] else None
+
+    spans = [text, None, None, None, None, None]
+    for match in PROPERTY_PATTERN.finditer(text):
+        if nested and any(start <= match.start() < end for start, end in nested):
+            continue
+        idx = FIELD_INDEX[match.group(1)]
+        if spans[idx] is None:
+            spans[idx] = match.span(2)
+    return EventRecord._make(spans)
+
+
+def time_ganzhi(summary):
+    """Extract the 2-character hour ganzhi from an unenhanced trunk summary
+
+    Equivalent to re.search(r'『(\\S{2})时', summary) for summaries of the
+    form 『XX时 ...』, using slicing instead of a regex search.
+    """
+    if summary and summary[0] == '『' and summary[3:4] == '时':
+        ganzhi = summary[1:3]
+        if not ganzhi[0].isspace() and not ganzhi[1].isspace():
+            return ganzhi
+    match = TIME_GANZHI_PATTERN.search(summary or '')
+    return match.group(1) if match else None
+
+
+def summary_marker(summary):
+    """Return the 吉/凶 marker of an enhanced summary, or None"""
+    if summary and summary[0] == '『' and summary[1:2] in ('吉', '凶'):
+        return summary[1]
+    return None
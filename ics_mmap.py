@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped ICS Reader
+Walk an iCalendar file in place: VEVENT boundaries are found with
+bytes.find on a read-only memory map and only the properties a caller asks
+for are decoded.
+
+    with MappedCalendar('cal_trunkBranch.ics') as calendar:
+        for kind, start, end in calendar.parts():
+            if kind == 'event':
+                event = calendar.event(start, end)
+                event.date, event.summary_text      # decoded on demand
+            out.write(calendar.view[start:end])     # copied, never decoded
+
+parts() yields the same ('header' | 'event' | 'gap' | 'footer') layout as
+auspicious_times.iter_calendar_parts(), but as byte offsets into the map,
+so untouched ranges reach the output as memoryview slices without being
+decoded, normalized or re-encoded. Line endings and folding are therefore
+kept exactly as in the source. A MappedEvent locates a property with one
+find per lookup and caches the value span; properties of nested components
+such as VALARM are ignored, as in ics_extract.parse_event().
+
+BlockReader produces the same parts from plain read()s on a background
+thread, one event-aligned block at a time, so reading overlaps with
+whatever consumes the blocks.
+"""
+
+import mmap
+import os
+import queue
+import threading
+
+LF = 0x0A
+CONTINUATION = (b' ', b'\t')
+
+# BlockReader: bytes per read() and blocks read ahead of the consumer
+READ_SIZE = 1 << 20
+QUEUE_DEPTH = 4
+
+
+class MappedEvent:
+    """One VEVENT block of a mapped calendar, data[start:end]
+
+    value()/summary_text/date mirror ics_extract.EventRecord, so a
+    MappedEvent can stand in for a record (e.g. in split_engine.EventFacts).
+    """
+
+    __slots__ = ('data', 'view', 'start', 'end', '_spans', '_nested')
+
+    def __init__(self, data, view, start, end):
+        self.data = data
+        self.view = view
+        self.start = start
+        self.end = end
+        self._spans = {}
+        self._nested = None
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def chunk(self):
+        """The whole block as a memoryview slice of the map"""
+        return self.view[self.start:self.end]
+
+    def _nested_spans(self):
+        """(start, end) offsets of components nested inside the VEVENT"""
+        if self._nested is None:
+            data, end = self.data, self.end
+            spans = []
+            depth = 0
+            begin = 0
+            if data.find(b'\nBEGIN:', self.start, end) >= 0:
+                position = self.start
+                while True:
+                    position = data.find(b'\n', position, end)
+                    if position < 0 or position + 1 >= end:
+                        break
+                    position += 1
+                    line = data[position:position + 12]
+                    if line.startswith(b'BEGIN:') and line != b'BEGIN:VEVENT':
+                        if depth == 0:
+                            begin = position
+                        depth += 1
+                    elif line.startswith(b'END:') and not line.startswith(b'END:VEVENT') and depth:
+                        depth -= 1
+                        if depth == 0:
+                            line_end = data.find(b'\n', position, end)
+                            spans.append((begin, end if line_end < 0 else line_end))
+                if depth:
+                    spans.append((begin, end))
+            self._nested = tuple(spans)
+        return self._nested
+
+    def _line_end(self, position):
+        """Offset of the end of the logical line containing position, before CR/LF"""
+        data, end = self.data, self.end
+        newline = data.find(b'\n', position, end)
+        while newline >= 0 and data[newline + 1:newline + 2] in CONTINUATION and newline + 1 < end:
+            newline = data.find(b'\n', newline + 1, end)
+        if newline < 0:
+            newline = end
+        if newline > position and data[newline - 1] == 0x0D:
+            newline -= 1
+        return newline
+
+    def span(self, name):
+        """(start, end) offsets of the first NAME property value, or None
+
+        name is the property name in upper case ('SUMMARY'); the span
+        covers continuation lines when the value is folded.
+        """
+        try:
+            return self._spans[name]
+        except KeyError:
+            pass
+        data, end = self.data, self.end
+        key = b'\n' + name.encode('ascii')
+        position = self.start
+        result = None
+        while True:
+            found = data.find(key, position, end)
+            if found < 0:
+                break
+            position = found + 1
+            after = found + len(key)
+            if data[after:after + 1] not in (b':', b';'):
+                continue
+            nested = self._nested_spans()
+            if nested and any(begin <= position < stop for begin, stop in nested):
+                continue
+            colon = data.find(b':', after, end)
+            if colon < 0:
+                break
+            result = (colon + 1, self._line_end(colon + 1))
+            break
+        self._spans[name] = result
+        return result
+
+    def raw(self, field):
+        """Undecoded, unfolded bytes of a field ('summary', 'dtstart', ...), or None"""
+        span = self.span(field.upper())
+        if span is None:
+            return None
+        value = self.data[span[0]:span[1]]
+        if LF in value:
+            value = value.replace(b'\r\n', b'\n').replace(b'\n ', b'').replace(b'\n\t', b'')
+        return value
+
+    def value(self, field):
+        """Return the decoded value of a field ('summary', 'uid', ...) or None"""
+        value = self.raw(field)
+        return None if value is None else value.decode('utf-8')
+
+    @property
+    def date(self):
+        """YYYYMMDD from DTSTART, or None when DTSTART is missing/malformed"""
+        span = self.span('DTSTART')
+        if span is None:
+            return None
+        date = self.data[span[0]:min(span[0] + 8, span[1])]
+        if len(date) == 8 and date.isdigit():
+            return date.decode('ascii')
+        return None
+
+    @property
+    def summary_text(self):
+        return self.value('summary')
+
+    def line_start(self, position):
+        """Offset of the start of the physical line containing position"""
+        newline = self.data.rfind(b'\n', self.start, position)
+        return self.start if newline < 0 else newline + 1
+
+    def newline(self):
+        """The block's line ending, b'\\r\\n' or b'\\n'"""
+        first = self.data.find(b'\n', self.start, self.end)
+        return b'\r\n' if first > self.start and self.data[first - 1] == 0x0D else b'\n'
+
+
+def _line_find(data, pattern, position):
+    """Offset of the next line of data starting with pattern, or -1"""
+    found = data.find(pattern, position)
+    while found > 0 and data[found - 1] != LF:
+        found = data.find(pattern, found + 1)
+    return found
+
+
+def iter_parts(data, first=True, last=True):
+    """Yield ('header' | 'event' | 'gap' | 'footer', start, end) offsets of data
+
+    data is a whole calendar, or with first/last False a block cut from
+    one at event boundaries (see event_boundary): text ahead of the first
+    event is then a 'gap' rather than the header, and trailing text a 'gap'
+    rather than the footer. An empty header is still yielded before the
+    first event; an unterminated trailing VEVENT is left in the footer.
+    """
+    size = len(data)
+    position = 0
+    seen_event = not first
+    while True:
+        begin = _line_find(data, b'BEGIN:VEVENT', position)
+        if begin < 0:
+            break
+        end = _line_find(data, b'END:VEVENT', begin + 1)
+        if end < 0:
+            break
+        line_end = data.find(b'\n', end)
+        end = size if line_end < 0 else line_end + 1
+        if not seen_event:
+            yield 'header', position, begin
+        elif begin > position:
+            yield 'gap', position, begin
+        yield 'event', begin, end
+        seen_event = True
+        position = end
+    if last:
+        yield ('footer' if seen_event else 'header'), position, size
+    elif position < size:
+        yield ('gap' if seen_event else 'header'), position, size
+
+
+def event_boundary(data):
+    """Offset just past the last complete END:VEVENT line of data, or 0"""
+    end = data.rfind(b'\nEND:VEVENT')
+    while end >= 0:
+        line_end = data.find(b'\n', end + 1)
+        if line_end >= 0:
+            return line_end + 1
+        end = data.rfind(b'\nEND:VEVENT', 0, end)
+    return 0
+
+
+class CalendarBuffer:
+    """Calendar bytes in memory, or a block of them, addressed by offsets
+
+    offset is the position of the buffer in its file; first/last tell
+    whether it holds the file's header and footer (see iter_parts).
+    """
+
+    def __init__(self, data, first=True, last=True, offset=0):
+        self.data = data
+        self.view = memoryview(data)
+        self.first = first
+        self.last = last
+        self.offset = offset
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def parts(self):
+        """Yield ('header' | 'event' | 'gap' | 'footer', start, end) offsets"""
+        return iter_parts(self.data, self.first, self.last)
+
+    def event(self, start, end):
+        """MappedEvent for an 'event' part"""
+        return MappedEvent(self.data, self.view, start, end)
+
+    def events(self):
+        """Yield every VEVENT as a MappedEvent"""
+        for kind, start, end in self.parts():
+            if kind == 'event':
+                yield MappedEvent(self.data, self.view, start, end)
+
+    def text(self, start, end):
+        """Decoded text of data[start:end]"""
+        return str(self.view[start:end], 'utf-8')
+
+
+class MappedCalendar(CalendarBuffer):
+    """Read-only memory map of an ICS file; use as a context manager
+
+    An empty file is served from an empty bytes object, since zero-length
+    files cannot be mapped.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = str(filepath)
+        self._file = open(self.filepath, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        except BaseException:
+            self._file.close()
+            raise
+        super().__init__(self._mmap if self._mmap is not None else b'')
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        """Release the map; slices still referenced elsewhere keep it alive"""
+        if self._file.closed:
+            return
+        self.view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # An exported slice is still alive; the map closes when it is freed
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class BlockReader:
+    """Read a calendar on a background thread as event-aligned CalendarBuffers
+
+    Iterating yields the blocks in file order. The thread read()s
+    read_size bytes at a time, cuts them after the last complete VEVENT
+    and queues the block, staying at most `depth` blocks ahead of the
+    consumer; unlike a memory map, the consumer never stalls on a page
+    fault, which matters on slow or network storage.
+
+        with BlockReader('cal_trunkBranch.ics') as reader:
+            for block in reader:
+                for kind, start, end in block.parts():
+                    ...
+    """
+
+    def __init__(self, filepath, read_size=READ_SIZE, depth=QUEUE_DEPTH):
+        self.filepath = str(filepath)
+        self.read_size = read_size
+        self._queue = queue.Queue(depth)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'read {self.filepath}', daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            with open(self.filepath, 'rb', buffering=0) as f:
+                carry = b''
+                offset = 0
+                first = True
+                while True:
+                    chunk = f.read(self.read_size)
+                    if not chunk:
+                        break
+                    buffer = carry + chunk if carry else chunk
+                    cut = event_boundary(buffer)
+                    if not cut:
+                        carry = buffer
+                        continue
+                    if not self._put(CalendarBuffer(buffer[:cut], first, False, offset)):
+                        return
+                    carry = buffer[cut:]
+                    offset += cut
+                    first = False
+                self._put(CalendarBuffer(carry, first, True, offset))
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            if item.last:
+                return
+
+    def close(self):
+        """Stop the reader thread"""
+        self._stopped.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
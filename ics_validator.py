@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Streaming ICS Validator
+Check the structure of an iCalendar file in one pass over its bytes and
+report every problem with the byte offset of the line that caused it.
+
+    python3 ics_validator.py cal_trunkBranch_enhanced.ics
+    python3 ics_validator.py --no-summary-check some_other_calendar.ics
+
+Bytes are fed in arbitrary chunks, either inline as an ICSWriter writes
+them (ICSWriter(path, validator=ICSValidator())) or from a memory-mapped
+file with validate_file(), so nothing is read back or held in memory
+beyond one content line. The checks cover:
+
+- the VCALENDAR envelope, with nothing after END:VCALENDAR
+- BEGIN/END nesting, and every VEVENT inside the VCALENDAR
+- UID and DTSTART present in every VEVENT
+- UID uniqueness (a hash set of the UIDs seen so far)
+- well-formed SUMMARY values: 『[吉|凶] [taboo]... XX时 XX日 XX月 XXX年』
+- UTF-8 content lines of the form NAME[;PARAMS]:VALUE
+"""
+
+import argparse
+import mmap
+import re
+import sys
+from typing import NamedTuple
+
+from ganzhi import BRANCHES, STEMS
+from ganzhi_calendar import ZODIAC
+
+CHUNK_SIZE = 1 << 20
+MAX_ERRORS = 100
+
+_GANZHI = f'[{STEMS}][{BRANCHES}]'
+
+# Trunk summaries, optionally enhanced with a marker and bracketed taboos
+ENHANCED_SUMMARY = re.compile(
+    rf'『(?:[吉凶] )?(?:\[[^\[\]]+\] )*{_GANZHI}时 {_GANZHI}日 {_GANZHI}月 {_GANZHI}[{ZODIAC}]年』'
+)
+
+# Error codes grouped into the checks reported by ValidationReport.checks()
+CHECKS = {
+    'vcalendar_envelope': ('empty', 'missing-vcalendar', 'trailing-content'),
+    'component_nesting': ('unexpected-end', 'mismatched-end', 'unclosed-component', 'event-outside-calendar'),
+    'required_properties': ('missing-uid', 'missing-dtstart'),
+    'unique_uids': ('duplicate-uid',),
+    'summary_markers': ('malformed-summary',),
+    'content_lines': ('malformed-line', 'invalid-utf8'),
+}
+
+
+class ValidationError(NamedTuple):
+    offset: int
+    code: str
+    message: str
+
+    def __str__(self):
+        return f"byte {self.offset}: {self.code}: {self.message}"
+
+
+class ValidationReport:
+    """Errors found by an ICSValidator, plus what it saw"""
+
+    def __init__(self, max_errors=MAX_ERRORS):
+        self.max_errors = max_errors
+        self.errors = []  # the first max_errors errors, in detection order
+        self.error_counts = {}
+        self.events = 0
+        self.lines = 0
+        self.bytes = 0
+
+    def add(self, offset, code, message):
+        self.error_counts[code] = self.error_counts.get(code, 0) + 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(ValidationError(offset, code, message))
+
+    @property
+    def error_count(self):
+        return sum(self.error_counts.values())
+
+    @property
+    def ok(self):
+        return not self.error_counts
+
+    def checks(self):
+        """{check name: passed}"""
+        return {
+            name: not any(self.error_counts.get(code) for code in codes)
+            for name, codes in CHECKS.items()
+        }
+
+
+class ICSValidator:
+    """Incremental validator: feed() bytes in any chunking, then close()
+
+    summary_pattern is matched against every VEVENT SUMMARY value; pass
+    None to skip the check for calendars in another format.
+    """
+
+    def __init__(self, summary_pattern=ENHANCED_SUMMARY, max_errors=MAX_ERRORS):
+        self.summary_pattern = summary_pattern
+        self.report = ValidationReport(max_errors)
+        self.closed = False
+        self._partial = b''
+        self._position = 0  # byte offset of self._partial
+        self._logical = None  # [offset, bytes] of the content line being unfolded
+        self._stack = []  # (component name, offset of its BEGIN line)
+        self._event = None  # {'offset', 'UID', 'DTSTART'} of the open VEVENT
+        self._uids = {}  # UID -> offset of its first VEVENT
+        self._seen_content = False
+        self._finished = False  # END:VCALENDAR closed the root component
+
+    def feed(self, data):
+        """Validate the next chunk of bytes"""
+        buffer = self._partial + data if self._partial else bytes(data)
+        lines = buffer.split(b'\n')
+        self._partial = lines.pop()
+        offset = self._position
+        for line in lines:
+            self._physical_line(offset, line)
+            offset += len(line) + 1
+        self._position = offset
+
+    def close(self):
+        """Finish validation and return the ValidationReport"""
+        if self.closed:
+            return self.report
+        self.closed = True
+        if self._partial:
+            self._physical_line(self._position, self._partial)
+        self._flush()
+        report = self.report
+        report.bytes = self._position + len(self._partial)
+
+        if not self._seen_content:
+            report.add(0, 'empty', 'no content lines')
+        if self._event is not None:
+            self._finish_event()
+        for name, offset in reversed(self._stack):
+            report.add(offset, 'unclosed-component', f'BEGIN:{name} is never closed')
+        self._stack.clear()
+        return report
+
+    def _physical_line(self, offset, line):
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        if line[:1] in (b' ', b'\t'):
+            if self._logical is None:
+                self.report.add(offset, 'malformed-line', 'continuation line without a content line')
+            else:
+                self._logical[1] += line[1:]
+            return
+        self._flush()
+        if line:
+            self._logical = [offset, line]
+
+    def _flush(self):
+        if self._logical is not None:
+            offset, raw = self._logical
+            self._logical = None
+            self._content_line(offset, bytes(raw))
+
+    def _content_line(self, offset, raw):
+        report = self.report
+        report.lines += 1
+        try:
+            line = raw.decode('utf-8')
+        except UnicodeDecodeError as e:
+            report.add(offset + e.start, 'invalid-utf8', str(e.reason))
+            line = raw.decode('utf-8', 'replace')
+
+        head, colon, value = line.partition(':')
+        name = head.split(';', 1)[0].upper()
+        if not colon or not name:
+            report.add(offset, 'malformed-line', f'not a NAME:VALUE line: {line[:40]!r}')
+            return
+
+        if not self._seen_content:
+            self._seen_content = True
+            if name != 'BEGIN' or value.upper() != 'VCALENDAR':
+                report.add(offset, 'missing-vcalendar', 'file does not start with BEGIN:VCALENDAR')
+        elif self._finished:
+            report.add(offset, 'trailing-content', f'{name} after END:VCALENDAR')
+            self._finished = False  # report the first trailing line only
+
+        if name == 'BEGIN':
+            self._begin(offset, value.upper())
+        elif name == 'END':
+            self._end(offset, value.upper())
+        elif self._event is not None and self._stack[-1][0] == 'VEVENT':
+            self._event_property(offset, name, value)
+
+    def _begin(self, offset, component):
+        if component == 'VEVENT':
+            if self._event is not None and self._stack[-1][0] == 'VEVENT':
+                # A missing END:VEVENT: close the open event here so one
+                # lost line does not misplace every later event
+                self.report.add(self._event['offset'], 'unclosed-component',
+                                f'VEVENT is not closed before the next one at byte {offset}')
+                self._stack.pop()
+                self._finish_event()
+            if not self._stack or self._stack[-1][0] != 'VCALENDAR':
+                self.report.add(offset, 'event-outside-calendar', 'VEVENT outside VCALENDAR')
+            self.report.events += 1
+            self._event = {'offset': offset, 'UID': False, 'DTSTART': False}
+        self._stack.append((component, offset))
+
+    def _end(self, offset, component):
+        stack = self._stack
+        if not any(name == component for name, _ in stack):
+            self.report.add(offset, 'unexpected-end', f'END:{component} without BEGIN:{component}')
+            return
+        while stack[-1][0] != component:
+            name, begin = stack.pop()
+            self.report.add(offset, 'mismatched-end',
+                            f'END:{component} closes BEGIN:{name} opened at byte {begin}')
+            if name == 'VEVENT':
+                self._finish_event()
+        stack.pop()
+        if component == 'VEVENT':
+            self._finish_event()
+        elif component == 'VCALENDAR' and not stack:
+            self._finished = True
+
+    def _event_property(self, offset, name, value):
+        event = self._event
+        if name == 'UID':
+            event['UID'] = True
+            first = self._uids.setdefault(value, offset)
+            if first != offset:
+                self.report.add(offset, 'duplicate-uid', f'UID {value} already used at byte {first}')
+        elif name == 'DTSTART':
+            event['DTSTART'] = True
+        elif name == 'SUMMARY' and self.summary_pattern is not None:
+            if not self.summary_pattern.fullmatch(value):
+                self.report.add(offset, 'malformed-summary', f'unexpected SUMMARY {value[:60]!r}')
+
+    def _finish_event(self):
+        event, self._event = self._event, None
+        if event is None:
+            return
+        for name in ('UID', 'DTSTART'):
+            if not event[name]:
+                self.report.add(event['offset'], f'missing-{name.lower()}', f'VEVENT without {name}')
+
+
+def validate_bytes(data, summary_pattern=ENHANCED_SUMMARY, max_errors=MAX_ERRORS):
+    """ValidationReport for a complete ICS document given as bytes"""
+    validator = ICSValidator(summary_pattern, max_errors)
+    validator.feed(data)
+    return validator.close()
+
+
+def validate_file(filepath, summary_pattern=ENHANCED_SUMMARY, max_errors=MAX_ERRORS, chunk_size=CHUNK_SIZE):
+    """ValidationReport for an ICS file, read through a memory map"""
+    validator = ICSValidator(summary_pattern, max_errors)
+    with open(filepath, 'rb') as f:
+        size = f.seek(0, 2)
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, size, chunk_size):
+                    validator.feed(mapped[start:start + chunk_size])
+    return validator.close()
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='+', help='ICS files to validate')
+    parser.add_argument('--no-summary-check', action='store_true',
+                        help='do not require trunk-style 『...』 SUMMARY values')
+    parser.add_argument('--max-errors', type=int, default=20, help='errors to list per file (default 20)')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+    pattern = None if args.no_summary_check else ENHANCED_SUMMARY
+    valid = True
+    for path in args.files:
+        try:
+            report = validate_file(path, pattern, args.max_errors)
+        except OSError as e:
+            print(f"❌ {path}: {e}")
+            valid = False
+            continue
+        if report.ok:
+            print(f"✓ {path}: {report.events:,} events, {report.bytes:,} bytes, valid")
+            continue
+        valid = False
+        print(f"✗ {path}: {report.error_count:,} errors in {report.events:,} events")
+        for error in report.errors:
+            print(f"    {error}")
+        if report.error_count > len(report.errors):
+            print(f"    ... {report.error_count - len(report.errors):,} more")
+    if not valid:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
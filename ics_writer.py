@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+ICS Output Writer
+Buffered writer shared by the enhancement and split scripts.
+
+Event chunks are encoded and streamed to a buffered binary handle (or joined
+once with write_ics) instead of being concatenated onto one growing string.
+Optionally the file is written to a temporary sibling and atomically renamed
+into place, with an fsync before the rename, and the bytes are fed to an
+ics_validator.ICSValidator as they are written.
+
+PatchWriter reproduces a source buffer (usually an ics_mmap.MappedCalendar)
+with byte-range patches spliced in, copying everything between patches in
+as few writes as possible. BackgroundWriter moves any writer's file I/O
+(and inline validation) to a thread fed through a bounded queue.
+"""
+
+import os
+import queue
+import tempfile
+import threading
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+# BackgroundWriter: bytes per batch handed to the thread, and batches queued
+BATCH_SIZE = 1 << 18
+QUEUE_DEPTH = 8
+
+# Unchanged runs at least this long are copied with os.sendfile when possible
+SENDFILE_MIN = 1 << 16
+
+
+class ICSWriter:
+    """Buffered UTF-8 writer that reports the number of bytes written
+
+    Usage:
+        with ICSWriter('out.ics', atomic=True) as writer:
+            writer.write(header)
+            writer.writelines(events)
+        print(writer.bytes_written)
+    """
+
+    def __init__(self, filepath, atomic=False, fsync=False, buffer_size=DEFAULT_BUFFER_SIZE, validator=None):
+        self.filepath = str(filepath)
+        self.atomic = atomic
+        self.fsync = fsync
+        self.validator = validator
+        self.bytes_written = 0
+        self._tmp_path = None
+
+        if atomic:
+            directory = os.path.dirname(os.path.abspath(self.filepath))
+            fd, self._tmp_path = tempfile.mkstemp(
+                prefix=f'.{os.path.basename(self.filepath)}.', suffix='.tmp', dir=directory
+            )
+            # mkstemp creates the file 0600; keep the target's usual permissions
+            try:
+                mode = os.stat(self.filepath).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(self._tmp_path, mode)
+            self._handle = os.fdopen(fd, 'wb', buffering=buffer_size)
+        else:
+            self._handle = open(self.filepath, 'wb', buffering=buffer_size)
+
+    def write(self, text):
+        """Write one chunk of text, returning the number of bytes written"""
+        data = text.encode('utf-8')
+        self._handle.write(data)
+        self.bytes_written += len(data)
+        if self.validator is not None:
+            self.validator.feed(data)
+        return len(data)
+
+    def write_bytes(self, data):
+        """Write already-encoded bytes, returning the number of bytes written"""
+        self._handle.write(data)
+        self.bytes_written += len(data)
+        if self.validator is not None:
+            self.validator.feed(data)
+        return len(data)
+
+    def writelines(self, chunks, prefix=''):
+        """Write every chunk, optionally preceded by a fixed prefix"""
+        written = 0
+        if prefix:
+            encoded_prefix = prefix.encode('utf-8')
+            for chunk in chunks:
+                written += self.write_bytes(encoded_prefix)
+                written += self.write(chunk)
+        else:
+            for chunk in chunks:
+                written += self.write(chunk)
+        return written
+
+    def close(self):
+        """Flush, optionally fsync, and move the file into place"""
+        if self._handle.closed:
+            return
+        self._handle.flush()
+        if self.fsync:
+            os.fsync(self._handle.fileno())
+        self._handle.close()
+        if self._tmp_path:
+            os.replace(self._tmp_path, self.filepath)
+            self._tmp_path = None
+        if self.validator is not None:
+            self.validator.close()
+
+    def abort(self):
+        """Close without publishing; an atomic target is left untouched"""
+        if not self._handle.closed:
+            self._handle.close()
+        if self._tmp_path:
+            os.unlink(self._tmp_path)
+            self._tmp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class PatchWriter(ICSWriter):
+    """ICSWriter that emits a source buffer with (start, end, data) patches applied
+
+    Usage:
+        with MappedCalendar(source) as calendar, \\
+                PatchWriter('out.ics', calendar.view, calendar.fileno()) as writer:
+            writer.patch(start, end, b'new value')   # ascending, non-overlapping
+            writer.copy_to(calendar.size)
+        print(writer.bytes_copied, writer.bytes_patched)
+
+    Each patch replaces source[start:end]; the source bytes up to it are
+    copied as one slice. When source_fd (the file behind the buffer) is
+    given and no validator is attached, runs of SENDFILE_MIN bytes or more
+    are copied by the kernel with os.sendfile instead.
+    """
+
+    def __init__(self, filepath, source, source_fd=None, **options):
+        super().__init__(filepath, **options)
+        self.source = source
+        self.source_fd = source_fd
+        self.position = 0  # first source byte not yet emitted
+        self.bytes_copied = 0
+        self.bytes_patched = 0
+        self.patches = 0
+
+    def copy_to(self, end):
+        """Copy the source up to offset end unchanged"""
+        start = self.position
+        if end < start:
+            raise ValueError(f"patch at {end} overlaps the source already emitted up to {start}")
+        length = end - start
+        if not length:
+            return
+        if (self.source_fd is not None and self.validator is None
+                and length >= SENDFILE_MIN and hasattr(os, 'sendfile')):
+            self._handle.flush()
+            out_fd = self._handle.fileno()
+            offset = start
+            while offset < end:
+                sent = os.sendfile(out_fd, self.source_fd, offset, end - offset)
+                if not sent:
+                    raise OSError(f"sendfile stopped at source offset {offset}")
+                offset += sent
+            self.bytes_written += length
+        else:
+            self.write_bytes(self.source[start:end])
+        self.bytes_copied += length
+        self.position = end
+
+    def patch(self, start, end, data):
+        """Replace source[start:end] with data (bytes)"""
+        self.copy_to(start)
+        self.write_bytes(data)
+        self.bytes_patched += len(data)
+        self.patches += 1
+        self.position = end
+
+
+class BackgroundWriter:
+    """Perform an ICSWriter's writes on a background thread
+
+    Usage:
+        with BackgroundWriter(ICSWriter('out.ics')) as writer:
+            writer.write_bytes(data)     # returns at once
+        print(writer.bytes_written)
+
+    Chunks are collected into batches of about batch_size bytes and handed
+    over through a queue of at most `depth` batches, so the producer runs
+    ahead of the disk by a bounded amount and blocks once it is full.
+    Chunks must not change after they are written (bytes or read-only
+    memoryviews). An error on the thread is raised by the next write or
+    by close(), and the underlying writer is aborted.
+    """
+
+    def __init__(self, writer, batch_size=BATCH_SIZE, depth=QUEUE_DEPTH):
+        self.writer = writer
+        self.batch_size = batch_size
+        self._batch = []
+        self._pending = 0
+        self._error = None
+        self._queue = queue.Queue(depth)
+        self._thread = threading.Thread(target=self._run, name=f'write {writer.filepath}', daemon=True)
+        self._thread.start()
+
+    @property
+    def filepath(self):
+        return self.writer.filepath
+
+    @property
+    def bytes_written(self):
+        """Bytes written so far by the thread (all of them after close)"""
+        return self.writer.bytes_written
+
+    def _run(self):
+        write_bytes = self.writer.write_bytes
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is None:
+                try:
+                    for chunk in batch:
+                        write_bytes(chunk)
+                except BaseException as e:
+                    self._error = e  # keep draining so the producer never blocks
+
+    def _flush(self):
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+            self._pending = 0
+
+    def write_bytes(self, data):
+        """Queue already-encoded bytes, returning their length"""
+        if self._error is not None:
+            raise self._error
+        self._batch.append(data)
+        self._pending += len(data)
+        if self._pending >= self.batch_size:
+            self._flush()
+        return len(data)
+
+    def write(self, text):
+        """Queue one chunk of text, returning the number of bytes"""
+        return self.write_bytes(text.encode('utf-8'))
+
+    def _finish(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def close(self):
+        """Write everything queued, then close the underlying writer"""
+        self._flush()
+        self._finish()
+        if self._error is not None:
+            self.writer.abort()
+            raise self._error
+        self.writer.close()
+
+    def abort(self):
+        """Drop queued chunks and abort the underlying writer"""
+        self._batch = []
+        self._error = self._error or RuntimeError('aborted')
+        self._finish()
+        self.writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_ics(filepath, header, events, footer, event_prefix='', atomic=False, fsync=False):
+    """Write header, events and footer to filepath in one buffered pass
+
+    Returns the number of bytes written.
+    """
+    with ICSWriter(filepath, atomic=atomic, fsync=fsync) as writer:
+        writer.write(header)
+        writer.writelines(events, prefix=event_prefix)
+        writer.write(footer)
+    return writer.bytes_written
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Incremental Enhancement Manifest
+Remember, per trunk VEVENT, what the previous run produced so that a
+refreshed upstream calendar only needs its added or changed events
+re-enhanced.
+
+The manifest is a JSON file written next to the enhanced calendar:
+
+    {
+      "version": 1,
+      "key": {...},              # reference tables, options, output file identity
+      "events": [[uid, digest, last_modified, offset, length, flags], ...]
+    }
+
+offset/length locate the enhanced VEVENT bytes inside the enhanced file.
+flags records the outcome of enhancing it (see FLAG_*), which is enough to
+route the event to the split files and to rebuild the run statistics
+without touching the event again.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from ics_writer import ICSWriter
+
+MANIFEST_VERSION = 1
+
+FLAG_ENHANCED = 1
+FLAG_TABOO = 2
+FLAG_MISSING = 4
+FLAG_AUSPICIOUS = 8
+FLAG_INAUSPICIOUS = 16
+
+LAST_MODIFIED_PATTERN = re.compile(r'^LAST-MODIFIED(?:;[^:\r\n]*)?:([^\r\n]*)', re.MULTILINE)
+
+
+def manifest_path(enhanced_path):
+    """Manifest file kept alongside the enhanced calendar"""
+    return f'{enhanced_path}.manifest.json'
+
+
+def event_digest(event_text):
+    """Content hash of a source VEVENT block"""
+    return hashlib.blake2b(event_text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def last_modified(event_text):
+    """LAST-MODIFIED value of a VEVENT block, or None"""
+    match = LAST_MODIFIED_PATTERN.search(event_text)
+    return match.group(1) if match else None
+
+
+def output_identity(filepath):
+    """Size and mtime of a previous output, or None if it does not exist"""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+class ManifestEntry:
+    """What the previous run wrote for one UID"""
+
+    __slots__ = ('uid', 'digest', 'last_modified', 'offset', 'length', 'flags')
+
+    def __init__(self, uid, digest, last_modified, offset, length, flags):
+        self.uid = uid
+        self.digest = digest
+        self.last_modified = last_modified
+        self.offset = offset
+        self.length = length
+        self.flags = flags
+
+    def as_row(self):
+        return [self.uid, self.digest, self.last_modified, self.offset, self.length, self.flags]
+
+
+def load_manifest(path, key, enhanced_path):
+    """Return {uid: ManifestEntry} when the manifest can be reused, else None
+
+    The manifest is only trusted when it was produced with the same
+    reference tables and options (key) and the enhanced file it points
+    into has not been modified since.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('key') != key:
+        return None
+    if manifest.get('output') != output_identity(enhanced_path):
+        return None
+
+    entries = {}
+    for row in manifest.get('events', []):
+        entry = ManifestEntry(*row)
+        entries.setdefault(entry.uid, entry)
+    return entries
+
+
+def save_manifest(path, key, enhanced_path, entries):
+    """Atomically write the manifest for the enhanced file just produced"""
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'key': key,
+        'output': output_identity(enhanced_path),
+        'events': [entry.as_row() for entry in entries],
+    }
+    with ICSWriter(path, atomic=True) as writer:
+        writer.write(json.dumps(manifest, ensure_ascii=False, separators=(',', ':')))
+    return writer.bytes_written
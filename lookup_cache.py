@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Compiled Lookup Cache
+Persist the built marker and taboo tables so later runs can skip parsing
+good_bad_time.ics and pengzu_100_taboos.ics.
+
+Cache file layout (little-endian):
+    8 bytes   magic b'AUSPLKC1'
+    4 bytes   header length N
+    N bytes   UTF-8 JSON header: source keys, table shapes and section offsets
+    ...       marker cells (one byte per day x 60 sexagenary positions)
+    ...       taboo cells (uint16 text id per day x 22 stem/branch columns)
+    ...       string table: uint32 end offsets, then the UTF-8 blob
+
+The file is opened with mmap and the marker and taboo cells are used in
+place; only the small interned taboo string table is decoded. The
+cache is keyed by each source's size, mtime and SHA-256; when size and
+mtime match the hash is not recomputed, and when only the mtime differs
+the hash decides whether the cache is still valid.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from ics_writer import ICSWriter
+from marker_index import CYCLE, MarkerIndex
+from taboo_index import WIDTH, TabooIndex
+
+MAGIC = b'AUSPLKC1'
+FORMAT_VERSION = 2
+ALIGNMENT = 8
+
+# Separator between the taboo strings sharing one interned entry
+TEXT_SEPARATOR = '\n'
+
+
+def file_digest(filepath):
+    """SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(filepath, with_hash=True):
+    """Identity of a source file: size, mtime and (optionally) content hash"""
+    st = os.stat(filepath)
+    key = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if with_hash:
+        key['sha256'] = file_digest(filepath)
+    return key
+
+
+def _source_matches(filepath, cached):
+    try:
+        current = source_key(filepath, with_hash=False)
+    except FileNotFoundError:
+        return False
+    if current['size'] != cached.get('size'):
+        return False
+    if current['mtime_ns'] == cached.get('mtime_ns'):
+        return True
+    # Touched but possibly unchanged: let the content decide
+    return file_digest(filepath) == cached.get('sha256')
+
+
+def _pad(length):
+    return (-length) % ALIGNMENT
+
+
+def native_bytes(cells):
+    """Little-endian bytes of a uint16/uint32 array"""
+    if sys.byteorder == 'big':
+        cells = array(cells.typecode, cells)
+        cells.byteswap()
+    return cells.tobytes()
+
+
+def native_view(view, typecode):
+    """Typed view of little-endian cells; zero-copy on little-endian hosts"""
+    if sys.byteorder == 'big':
+        cells = array(typecode, view.tobytes())
+        cells.byteswap()
+        return cells
+    return view.cast(typecode)
+
+
+def write_sections(filepath, magic, header, sections, atomic=True, fsync=False):
+    """Write magic, a JSON header and aligned binary sections; return the bytes written
+
+    sections is a list of (name, bytes); header['sections'] is filled in
+    with the [offset, length] of each so readers can slice them out.
+    """
+    # Offsets depend on the header length, which depends on the offsets;
+    # reserve room by serializing once with placeholder offsets.
+    def layout(header_bytes_len):
+        offset = len(magic) + 4 + header_bytes_len
+        offset += _pad(offset)
+        placed = {}
+        for name, data in sections:
+            placed[name] = [offset, len(data)]
+            offset += len(data) + _pad(len(data))
+        return placed
+
+    header['sections'] = layout(0)
+    header_len = len(json.dumps(header).encode('utf-8')) + 64
+    header['sections'] = layout(header_len)
+    header_bytes = json.dumps(header).encode('utf-8').ljust(header_len, b' ')
+
+    with ICSWriter(filepath, atomic=atomic, fsync=fsync) as writer:
+        writer.write_bytes(magic)
+        writer.write_bytes(struct.pack('<I', header_len))
+        writer.write_bytes(header_bytes)
+        position = len(magic) + 4 + header_len
+        for name, data in sections:
+            offset = header['sections'][name][0]
+            writer.write_bytes(b'\0' * (offset - position))
+            writer.write_bytes(data)
+            position = offset + len(data)
+    return writer.bytes_written
+
+
+def read_sections_header(mm, magic):
+    """JSON header of a file written by write_sections, or None if malformed
+
+    Every section's [offset, length] must lie within mm, so a truncated
+    file is rejected here instead of failing later on a short slice.
+    """
+    try:
+        if mm[:len(magic)] != magic:
+            return None
+        (header_len,) = struct.unpack_from('<I', mm, len(magic))
+        start = len(magic) + 4
+        if start + header_len > len(mm):
+            return None
+        header = json.loads(mm[start:start + header_len].decode('utf-8'))
+    except (struct.error, ValueError, UnicodeDecodeError):
+        return None
+
+    sections = header.get('sections') if isinstance(header, dict) else None
+    if not isinstance(sections, dict):
+        return None
+    for placed in sections.values():
+        if not (isinstance(placed, list) and len(placed) == 2
+                and all(isinstance(value, int) and value >= 0 for value in placed)):
+            return None
+        offset, length = placed
+        if offset + length > len(mm):
+            return None
+    return header
+
+
+def save_cache(cache_path, sources, marker_index, taboo_index):
+    """Write the marker and taboo indexes to cache_path atomically
+
+    sources maps a role ('good_bad', 'pengzu') to the source file path.
+    """
+    blob = bytearray()
+    ends = array('I')
+    for texts in taboo_index.texts:
+        blob += TEXT_SEPARATOR.join(texts).encode('utf-8')
+        ends.append(len(blob))
+
+    sections = [
+        ('markers', bytes(marker_index.data)),
+        ('taboo_cells', native_bytes(array('H', taboo_index.cells))),
+        ('string_ends', native_bytes(ends)),
+        ('string_blob', bytes(blob)),
+    ]
+
+    header = {
+        'version': FORMAT_VERSION,
+        'sources': {role: source_key(path) for role, path in sources.items()},
+        'markers': {
+            'base_ordinal': marker_index.base_ordinal,
+            'days': marker_index.days,
+            'entries': len(marker_index),
+        },
+        'taboos': {
+            'base_ordinal': taboo_index.base_ordinal,
+            'days': taboo_index.days,
+            'entries': len(taboo_index),
+        },
+        'sections': {},
+    }
+
+    return write_sections(cache_path, MAGIC, header, sections)
+
+
+def _read_header(mm, sources):
+    """Parsed header if the cache is well-formed and matches the sources"""
+    header = read_sections_header(mm, MAGIC)
+    if header is None:
+        return None
+
+    if header.get('version') != FORMAT_VERSION:
+        return None
+    cached_sources = header.get('sources', {})
+    if set(cached_sources) != set(sources):
+        return None
+    if not all(_source_matches(path, cached_sources[role]) for role, path in sources.items()):
+        return None
+    if not _sections_match(header):
+        return None
+    return header
+
+
+def _sections_match(header):
+    """True if every section has the size implied by the table shapes"""
+    sections = header['sections']
+    try:
+        sizes = {
+            'markers': header['markers']['days'] * CYCLE,
+            'taboo_cells': header['taboos']['days'] * WIDTH * 2,
+        }
+    except (KeyError, TypeError):
+        return False
+    if not all(name in sections for name in ('markers', 'taboo_cells', 'string_ends', 'string_blob')):
+        return False
+    if any(sections[name][1] != size for name, size in sizes.items()):
+        return False
+    return sections['string_ends'][1] % 4 == 0
+
+
+def _read_texts(view, sections):
+    """Interned taboo texts from the cache's string table, or None if it is corrupt"""
+    offset, length = sections['string_ends']
+    ends = native_view(view[offset:offset + length], 'I')
+    offset, length = sections['string_blob']
+    blob = view[offset:offset + length]
+    try:
+        if len(ends) and ends[-1] != len(blob):
+            return None
+        texts = []
+        begin = 0
+        for end in ends:
+            joined = str(blob[begin:end], 'utf-8')
+            texts.append(tuple(joined.split(TEXT_SEPARATOR)) if joined else ())
+            begin = end
+        return texts
+    except UnicodeDecodeError:
+        return None
+    finally:
+        if isinstance(ends, memoryview):
+            ends.release()
+        blob.release()
+
+
+def load_cache(cache_path, sources):
+    """Return (marker_index, taboo_index) from a valid cache, else None"""
+    try:
+        with open(cache_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    header = _read_header(mm, sources)
+    if header is None:
+        mm.close()
+        return None
+
+    view = memoryview(mm)
+    texts = _read_texts(view, header['sections'])
+    if texts is None:
+        # Nothing may still export the mapping when it closes
+        view.release()
+        mm.close()
+        return None
+
+    def section(name):
+        offset, length = header['sections'][name]
+        return view[offset:offset + length]
+
+    shape = header['markers']
+    marker_index = MarkerIndex(
+        shape['base_ordinal'], shape['days'], section('markers'), entries=shape['entries']
+    )
+    # Keep the mapping alive for as long as the index uses it
+    marker_index.mapping = mm
+
+    cells = native_view(section('taboo_cells'), 'H')
+    shape = header['taboos']
+    taboo_index = TabooIndex(
+        shape['base_ordinal'], shape['days'], cells, texts, entries=shape['entries']
+    )
+    taboo_index.mapping = mm
+
+    return marker_index, taboo_index
+
+
+def default_cache_path(source_path):
+    """Cache file placed next to the reference sources"""
+    directory = os.path.dirname(os.path.abspath(source_path))
+    return os.path.join(directory, '.auspicious_lookup.cache')
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Flat Marker Index
+Compact replacement for the nested lookup[date][ganzhi] -> '吉'/'凶' dict.
+
+Markers live in one bytearray with 60 cells per day (one per sexagenary
+position), addressed as (day_ordinal - base_ordinal) * 60 + ganzhi_index.
+Each cell holds UNKNOWN (0), AUSPICIOUS (1) or INAUSPICIOUS (2), so a
+lookup is plain integer arithmetic and decades of good_bad_time data fit
+in a few hundred kilobytes.
+"""
+
+from ganzhi import date_to_ordinal, ganzhi_index, ordinal_to_date, SEXAGENARY
+
+UNKNOWN = 0
+AUSPICIOUS = 1
+INAUSPICIOUS = 2
+
+MARKER_CODES = {'吉': AUSPICIOUS, '凶': INAUSPICIOUS}
+MARKER_CHARS = (None, '吉', '凶')
+
+CYCLE = 60
+
+
+class MarkerIndex:
+    """Day-ordinal x sexagenary-position table of 吉/凶 markers"""
+
+    def __init__(self, base_ordinal=0, days=0, data=None, entries=None):
+        self.base_ordinal = base_ordinal
+        self.days = days
+        self.data = data if data is not None else bytearray(days * CYCLE)
+        if entries is None:
+            entries = sum(1 for code in self.data if code) if data is not None else 0
+        self.entries = entries
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build from an iterable of (yyyymmdd, ganzhi, marker) triples
+
+        Entries with an invalid date, a ganzhi outside the 60 cycle or a
+        marker other than 吉/凶 are ignored.
+        """
+        cells = []
+        for date, ganzhi, marker in entries:
+            ordinal = date_to_ordinal(date)
+            position = ganzhi_index(ganzhi)
+            code = MARKER_CODES.get(marker, UNKNOWN)
+            if ordinal < 0 or position < 0 or code == UNKNOWN:
+                continue
+            cells.append((ordinal, position, code))
+
+        if not cells:
+            return cls()
+
+        first = min(cell[0] for cell in cells)
+        last = max(cell[0] for cell in cells)
+        index = cls(first, last - first + 1)
+        data = index.data
+        for ordinal, position, code in cells:
+            offset = (ordinal - first) * CYCLE + position
+            if not data[offset]:
+                index.entries += 1
+            data[offset] = code
+        return index
+
+    def __getstate__(self):
+        # Detach from a memory-mapped cache so the index can be pickled
+        state = self.__dict__.copy()
+        state['data'] = bytearray(self.data)
+        state.pop('mapping', None)
+        return state
+
+    def __len__(self):
+        return self.entries
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    def offset(self, ordinal, position):
+        """Cell offset for (day ordinal, ganzhi position), or -1 if out of range"""
+        day = ordinal - self.base_ordinal
+        if day < 0 or day >= self.days or position < 0:
+            return -1
+        return day * CYCLE + position
+
+    def code(self, ordinal, position):
+        """Marker code for (day ordinal, ganzhi position)"""
+        offset = self.offset(ordinal, position)
+        return self.data[offset] if offset >= 0 else UNKNOWN
+
+    def lookup(self, date, ganzhi):
+        """'吉'/'凶' for a 'YYYYMMDD' date and 2-character ganzhi, or None"""
+        return self.lookup_day(date_to_ordinal(date), ganzhi)
+
+    def lookup_day(self, ordinal, ganzhi):
+        """'吉'/'凶' for a day ordinal and 2-character ganzhi, or None"""
+        return MARKER_CHARS[self.code(ordinal, ganzhi_index(ganzhi))]
+
+    def has_date(self, date):
+        ordinal = date_to_ordinal(date)
+        offset = self.offset(ordinal, 0)
+        return offset >= 0 and any(self.data[offset:offset + CYCLE])
+
+    def items(self):
+        """Yield (yyyymmdd, ganzhi, marker) for every known cell"""
+        data = self.data
+        for day in range(self.days):
+            row = day * CYCLE
+            date = None
+            for position in range(CYCLE):
+                code = data[row + position]
+                if code:
+                    date = date or ordinal_to_date(self.base_ordinal + day)
+                    yield date, SEXAGENARY[position], MARKER_CHARS[code]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Run Metrics
+Counters, per-stage wall/CPU timings and byte totals for one enhancement
+run, exportable as JSON or Prometheus text exposition format.
+
+    metrics = RunMetrics()
+    with metrics.stage('enhance') as stage:
+        ...
+        stage.events = metrics.total_events
+    metrics.warn("No enhancement found for 20241231/丙子")
+    print(metrics.to_prometheus())
+
+A RunMetrics is plain data, so worker processes can fill their own and
+send it back to be merged into the parent's with merge().
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+COUNTERS = (
+    'total_events',
+    'enhanced_events',
+    'taboo_added',
+    'skipped_events',
+    'missing_lookups',
+    'marker_hits',
+    'marker_misses',
+    'taboo_hits',
+    'taboo_misses',
+    'bytes_read',
+    'bytes_written',
+    'bytes_copied',
+    'bytes_patched',
+)
+
+COUNTER_HELP = {
+    'total_events': 'Trunk VEVENTs processed',
+    'enhanced_events': 'Events that received a marker or taboo',
+    'taboo_added': 'Events that received at least one taboo',
+    'skipped_events': 'Events left unchanged',
+    'missing_lookups': 'Events whose hour had neither a marker nor a taboo',
+    'marker_hits': 'Marker lookups that found 吉/凶',
+    'marker_misses': 'Marker lookups that found nothing',
+    'taboo_hits': 'Taboo lookups that found at least one taboo',
+    'taboo_misses': 'Taboo lookups that found nothing',
+    'bytes_read': 'Bytes read from input calendars',
+    'bytes_written': 'Bytes written to output files',
+    'bytes_copied': 'Output bytes copied unchanged from the source calendar',
+    'bytes_patched': 'Output bytes of patched SUMMARY values',
+}
+
+MAX_SAMPLES = 5
+
+METRIC_PREFIX = 'auspicious'
+
+
+class StageTiming:
+    """Wall and CPU time of one pipeline stage, plus the events it handled"""
+
+    __slots__ = ('name', 'wall_seconds', 'cpu_seconds', 'events')
+
+    def __init__(self, name, wall_seconds=0.0, cpu_seconds=0.0, events=0):
+        self.name = name
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.events = events
+
+    @property
+    def events_per_second(self):
+        return self.events / self.wall_seconds if self.wall_seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'events': self.events,
+            'events_per_second': round(self.events_per_second, 1),
+        }
+
+
+class RunMetrics:
+    """Structured metrics of one run (replaces the old global stats dict)"""
+
+    def __init__(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.stages = {}
+        self.samples = []
+        # Insertion-ordered set: O(1) dedup, first-seen order for the report
+        self._warnings = {}
+
+    # Events and warnings
+
+    def add_sample(self, sample):
+        """Keep the first MAX_SAMPLES before/after transformations"""
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(sample)
+
+    def warn(self, message):
+        """Record a warning once, however often it is raised"""
+        self._warnings.setdefault(message, None)
+
+    @property
+    def warnings(self):
+        return list(self._warnings)
+
+    def record_lookup(self, marker_found, taboo_found):
+        """Count the outcome of one marker + taboo lookup"""
+        if marker_found:
+            self.marker_hits += 1
+        else:
+            self.marker_misses += 1
+        if taboo_found:
+            self.taboo_hits += 1
+        else:
+            self.taboo_misses += 1
+
+    def record_patches(self, writer):
+        """Count the output of an ics_writer.PatchWriter"""
+        self.bytes_written += writer.bytes_written
+        self.bytes_copied += writer.bytes_copied
+        self.bytes_patched += writer.bytes_patched
+
+    def counters(self):
+        return {name: getattr(self, name) for name in COUNTERS}
+
+    # Stage timing
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as stage `name`; repeated names accumulate"""
+        timing = self.stages.get(name)
+        if timing is None:
+            timing = self.stages[name] = StageTiming(name)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield timing
+        finally:
+            timing.wall_seconds += time.perf_counter() - wall
+            timing.cpu_seconds += time.process_time() - cpu
+
+    # Combining
+
+    def merge(self, other):
+        """Fold another run's (e.g. a worker shard's) metrics into this one, in order"""
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for sample in other.samples:
+            self.add_sample(sample)
+        for warning in other._warnings:
+            self.warn(warning)
+        for name, timing in other.stages.items():
+            mine = self.stages.setdefault(name, StageTiming(name))
+            mine.wall_seconds += timing.wall_seconds
+            mine.cpu_seconds += timing.cpu_seconds
+            mine.events += timing.events
+
+    # Export
+
+    def to_dict(self):
+        return {
+            'counters': self.counters(),
+            'stages': {name: timing.as_dict() for name, timing in self.stages.items()},
+            'warnings': len(self._warnings),
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self, prefix=METRIC_PREFIX):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name in COUNTERS:
+            metric = f"{prefix}_{'events' if name == 'total_events' else name}_total"
+            lines.append(f'# HELP {metric} {COUNTER_HELP[name]}')
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {getattr(self, name)}')
+
+        metric = f'{prefix}_warnings'
+        lines.append(f'# HELP {metric} Distinct warnings raised')
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {len(self._warnings)}')
+
+        stage_metrics = (
+            ('stage_wall_seconds', 'Wall-clock time per pipeline stage', 'wall_seconds'),
+            ('stage_cpu_seconds', 'CPU time per pipeline stage', 'cpu_seconds'),
+            ('stage_events_per_second', 'Events per wall-clock second per pipeline stage',
+             'events_per_second'),
+        )
+        for suffix, help_text, attribute in stage_metrics:
+            metric = f'{prefix}_{suffix}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            for name, timing in self.stages.items():
+                lines.append(f'{metric}{{stage="{name}"}} {getattr(timing, attribute):.6f}')
+        return '\n'.join(lines) + '\n'
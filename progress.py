@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Progress Reporting
+Throttled progress reporters shared by the scripts.
+
+    progress = progress_reporter(len(events), 'Enhancing')
+    for idx, event in enumerate(events):
+        ...
+        progress.update(idx + 1)
+    progress.finish()
+
+update() is cheap enough for the hot loop: it compares the count with the
+next percentage step and only looks at the clock every CLOCK_EVERY calls,
+so output is produced at most once per step or interval instead of once
+per event. Modes:
+
+    'auto'  TTY bar when stdout is a terminal, otherwise nothing (default)
+    'tty'   carriage-return progress bar
+    'json'  one JSON object per line, for job logs and schedulers
+    'none'  no output
+"""
+
+import json
+import sys
+import time
+
+MODES = ('auto', 'tty', 'json', 'none')
+
+# Report each time another STEP of the total is done ...
+TTY_STEP = 0.01
+JSON_STEP = 0.10
+# ... or when this many seconds passed without a report
+TTY_INTERVAL = 0.2
+JSON_INTERVAL = 5.0
+
+# update() calls between clock reads
+CLOCK_EVERY = 256
+
+# Mode used when progress_reporter() is not given one; see configure()
+_default_mode = 'auto'
+
+
+def configure(mode):
+    """Set the mode used by every reporter created afterwards"""
+    global _default_mode
+    if mode not in MODES:
+        raise ValueError(f"unknown progress mode {mode!r}, expected one of {', '.join(MODES)}")
+    _default_mode = mode
+
+
+class NullProgress:
+    """Reporter that does nothing"""
+
+    def __init__(self, total=0, label=''):
+        self.total = total
+        self.label = label
+
+    def update(self, current):
+        pass
+
+    def finish(self):
+        pass
+
+
+class ThrottledProgress(NullProgress):
+    """Base reporter: decides when to emit, subclasses decide how"""
+
+    step = TTY_STEP
+    interval = TTY_INTERVAL
+
+    def __init__(self, total=0, label='', stream=None):
+        super().__init__(total, label)
+        self.stream = stream if stream is not None else sys.stdout
+        self.started = time.monotonic()
+        self.current = 0
+        self._step_size = max(1, int(total * self.step)) if total else 1
+        self._next = self._step_size
+        self._calls = 0
+        self._last_emit = self.started
+        self._finished = False
+
+    def update(self, current):
+        self.current = current
+        if current >= self._next:
+            self._next = (current // self._step_size + 1) * self._step_size
+            self._emit_now()
+            return
+        self._calls += 1
+        if self._calls >= CLOCK_EVERY:
+            self._calls = 0
+            if time.monotonic() - self._last_emit >= self.interval:
+                self._emit_now()
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self._emit_now(final=True)
+
+    def _emit_now(self, final=False):
+        self._calls = 0
+        self._last_emit = time.monotonic()
+        self.emit(final)
+
+    def emit(self, final):
+        raise NotImplementedError
+
+
+class TTYProgress(ThrottledProgress):
+    """Carriage-return progress bar for interactive terminals"""
+
+    width = 50
+
+    def emit(self, final):
+        if not self.total:
+            return
+        percent = min(self.current / self.total, 1.0)
+        filled = int(self.width * percent)
+        bar = '█' * filled + '░' * (self.width - filled)
+        label = f'{self.label} ' if self.label else ''
+        end = '\n' if final else ''
+        self.stream.write(f'\r{label}[{bar}] {self.current}/{self.total} ({100*percent:.1f}%){end}')
+        self.stream.flush()
+
+
+class JSONLinesProgress(ThrottledProgress):
+    """One JSON object per report, for piping into job logs"""
+
+    step = JSON_STEP
+    interval = JSON_INTERVAL
+
+    def emit(self, final):
+        elapsed = time.monotonic() - self.started
+        record = {
+            'event': 'progress',
+            'label': self.label,
+            'current': self.current,
+            'total': self.total,
+            'percent': round(100 * self.current / self.total, 1) if self.total else None,
+            'elapsed': round(elapsed, 3),
+            'rate': round(self.current / elapsed, 1) if elapsed else None,
+            'done': final,
+        }
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+def progress_reporter(total, label='', mode=None, stream=None):
+    """Reporter for `total` units of work in the given (or configured) mode"""
+    mode = mode or _default_mode
+    stream = stream if stream is not None else sys.stdout
+    if mode == 'auto':
+        isatty = getattr(stream, 'isatty', None)
+        mode = 'tty' if isatty is not None and isatty() else 'none'
+    if mode == 'tty':
+        return TTYProgress(total, label, stream)
+    if mode == 'json':
+        return JSONLinesProgress(total, label, stream)
+    return NullProgress(total, label)
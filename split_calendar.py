@@ -4,22 +4,12 @@ Calendar Split Script
 Split cal_trunkBranch_enhanced.ics into two separate files by auspiciousness
 """
 
-import re
-from pathlib import Path
+from split_engine import split_content, standard_feeds
 
 INPUT_FILE = "cal_trunkBranch_enhanced.ics"
 AUSPICIOUS_FILE = "cal_trunkBranch_auspicious.ics"
 INAUSPICIOUS_FILE = "cal_trunkBranch_inauspicious.ics"
 
-def progress_bar(current, total, width=50):
-    """Simple progress bar"""
-    if total == 0:
-        return
-    percent = current / total
-    filled = int(width * percent)
-    bar = '█' * filled + '░' * (width - filled)
-    print(f'\r[{bar}] {current}/{total} ({100*percent:.1f}%)', end='', flush=True)
-
 def split_calendar():
     """Split calendar into auspicious and inauspicious files"""
     
@@ -36,93 +26,34 @@ def split_calendar():
     with open(INPUT_FILE, 'r', encoding='utf-8') as f:
         content = f.read()
     
-    # Extract header (everything before first VEVENT)
-    header_match = re.search(r'(.*?)BEGIN:VEVENT', content, re.DOTALL)
-    header = header_match.group(1) if header_match else ""
-    
-    # Extract footer (everything after last VEVENT)
-    footer_match = re.search(r'END:VEVENT(.*)', content, re.DOTALL)
-    footer = footer_match.group(1) if footer_match else ""
-    
-    # Split by VEVENT
+    # Split by the marker at the start of SUMMARY, writing both files in one pass
     print("[2/3] Splitting events by auspiciousness...")
-    events = content.split('BEGIN:VEVENT')[1:]
-    
-    auspicious_events = []
-    inauspicious_events = []
-    skipped = 0
+    feeds = standard_feeds(AUSPICIOUS_FILE, INAUSPICIOUS_FILE)
+    engine = split_content(content, feeds)
+    count_auspicious, count_inauspicious = feeds[0].events, feeds[1].events
+    skipped = engine.unmatched
     
-    for idx, event in enumerate(events):
-        progress_bar(idx + 1, len(events))
-        
-        # Extract SUMMARY line to check marker
-        summary_match = re.search(r'SUMMARY:([^\n]+)', event)
-        if not summary_match:
-            skipped += 1
-            continue
-        
-        summary = summary_match.group(1)
-        
-        # Classify by marker
-        if summary.startswith('『吉'):
-            auspicious_events.append(event)
-        elif summary.startswith('『凶'):
-            inauspicious_events.append(event)
-        else:
-            # Unenhanced event (no marker)
-            skipped += 1
-    
-    print()
     print(f"\n✓ Split complete:")
-    print(f"  Auspicious events (吉): {len(auspicious_events)}")
-    print(f"  Inauspicious events (凶): {len(inauspicious_events)}")
+    print(f"  Auspicious events (吉): {count_auspicious}")
+    print(f"  Inauspicious events (凶): {count_inauspicious}")
     print(f"  Skipped (unenhanced): {skipped}")
     
-    print(f"\n[3/3] Writing split files...")
-    
-    # Function to create complete ICS file
-    def write_ics_file(filepath, events, calendar_name):
-        # Update X-WR-CALNAME in header
-        updated_header = re.sub(
-            r'X-WR-CALNAME:[^\n]*',
-            f'X-WR-CALNAME:{calendar_name}',
-            header
-        )
-        
-        # Build file content
-        file_content = updated_header
-        for event in events:
-            file_content += f'BEGIN:VEVENT{event}'
-        file_content += footer
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(file_content)
-        
-        # Verify line count
-        line_count = len(file_content.split('\n'))
-        event_count = len(events)
-        
-        return line_count, event_count
+    print(f"\n[3/3] Verifying split files...")
     
-    # Write both files
-    lines_auspicious, count_auspicious = write_ics_file(
-        AUSPICIOUS_FILE, 
-        auspicious_events,
-        "Auspicious Times"
-    )
+    # Verify line count
+    def count_lines(filepath):
+        with open(filepath, 'rb') as f:
+            return f.read().count(b'\n') + 1
     
-    lines_inauspicious, count_inauspicious = write_ics_file(
-        INAUSPICIOUS_FILE,
-        inauspicious_events,
-        "Inauspicious Times"
-    )
+    lines_auspicious = count_lines(AUSPICIOUS_FILE)
+    lines_inauspicious = count_lines(INAUSPICIOUS_FILE)
     
     print("\n" + "="*80)
     print("SPLIT COMPLETE - SUMMARY REPORT")
     print("="*80)
     
     print(f"\n📊 Event Distribution:")
-    print(f"  Total events processed: {len(events)}")
+    print(f"  Total events processed: {engine.total_events}")
     print(f"  Auspicious (吉):        {count_auspicious}")
     print(f"  Inauspicious (凶):      {count_inauspicious}")
     print(f"  Skipped (unenhanced):   {skipped}")
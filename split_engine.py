@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Predicate Split Engine
+Fan the events of an enhanced calendar out to any number of derived feeds
+in a single pass.
+
+    python3 split_engine.py --feed weekend_good.ics='auspicious+weekday:sat,sun' \\
+                            --feed rat_hours.ics='branch:子' --feed plain.ics='!taboo'
+
+Each feed is an output file plus a predicate over the facts of one event
+(EventFacts: marker, taboos, the year/month/day/hour ganzhi, weekday).
+Events may match several feeds or none; every matching feed receives the
+event bytes, encoded once. Each feed file gets the source header (with
+X-WR-CALNAME set to the feed's calendar name, when given) and footer.
+
+Predicate specs are terms joined by '+' (all must hold), each optionally
+negated with '!':
+
+    all                     every event
+    auspicious | 吉         marker 吉
+    inauspicious | 凶       marker 凶
+    unmarked                no 吉/凶 marker
+    taboo                   at least one Pengzu taboo
+    branch:子,午            hour earthly branch
+    stem:甲,己              hour heavenly stem
+    hour:甲子 / day:庚午 / month:丙子 / year:甲辰   ganzhi of that pillar
+    weekday:sat,sun         weekday of DTSTART (mon..sun or 0..6, Monday = 0)
+    date:20250101-20250331  DTSTART date range, inclusive (either end may be omitted)
+
+Feeds can also be listed in a JSON file:
+    [{"path": "good.ics", "where": "auspicious", "name": "Auspicious Times"}, ...]
+"""
+
+import argparse
+import json
+import re
+from datetime import date
+from functools import cached_property
+
+from auspicious_times import (
+    AUSPICIOUS_NAME, INAUSPICIOUS_NAME, calendar_sections, rename_calendar,
+)
+from ics_extract import parse_event, summary_marker
+from ics_mmap import MappedCalendar
+from ics_writer import BackgroundWriter, ICSWriter
+from progress import progress_reporter
+
+INPUT_FILE = "cal_trunkBranch_enhanced.ics"
+
+TABOO_PATTERN = re.compile(r'\[([^\]]*)\]')
+PILLARS_PATTERN = re.compile(r'(\S{2})时 (\S{2})日 (\S{2})月 (\S{2})')
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+class EventFacts:
+    """What the predicates can ask about one VEVENT, computed on first use
+
+    record, if given, is the already-parsed event: an EventRecord or an
+    ics_mmap.MappedEvent, which decodes only what the predicates read.
+    """
+
+    def __init__(self, text, record=None):
+        self.text = text
+        self.record = record if record is not None else parse_event(text)
+
+    @classmethod
+    def from_record(cls, record, summary=None):
+        """Facts for a parsed event, optionally with its SUMMARY replaced"""
+        facts = cls(None, record)
+        if summary is not None:
+            facts.summary = summary
+        return facts
+
+    @cached_property
+    def summary(self):
+        return self.record.summary_text or ''
+
+    @cached_property
+    def marker(self):
+        """'吉', '凶' or None"""
+        return summary_marker(self.summary)
+
+    @cached_property
+    def taboos(self):
+        return tuple(TABOO_PATTERN.findall(self.summary))
+
+    @cached_property
+    def pillars(self):
+        """(year, month, day, hour) ganzhi, or four Nones
+
+        Taken from LOCATION ('甲辰 丙子 庚午 丙子') when it holds four
+        ganzhi, otherwise from the '…时 …日 …月 …年' SUMMARY text.
+        """
+        location = (self.record.value('location') or '').split()
+        if len(location) == 4 and all(len(pillar) == 2 for pillar in location):
+            return tuple(location)
+        match = PILLARS_PATTERN.search(self.summary)
+        if match:
+            hour, day, month, year = match.groups()
+            return year, month, day, hour
+        return (None,) * 4
+
+    @property
+    def year(self):
+        return self.pillars[0]
+
+    @property
+    def month(self):
+        return self.pillars[1]
+
+    @property
+    def day(self):
+        return self.pillars[2]
+
+    @property
+    def hour(self):
+        return self.pillars[3]
+
+    @property
+    def date(self):
+        """YYYYMMDD of DTSTART, or None"""
+        return self.record.date
+
+    @cached_property
+    def weekday(self):
+        """Weekday of DTSTART, Monday = 0, or None"""
+        value = self.date
+        if value is None:
+            return None
+        return date(int(value[:4]), int(value[4:6]), int(value[6:])).weekday()
+
+
+# Predicates
+
+def _values(args):
+    values = [value.strip() for value in args.split(',') if value.strip()] if args else []
+    if not values:
+        raise ValueError("expected a comma-separated list of values")
+    return values
+
+
+def _weekdays(args):
+    days = set()
+    for value in _values(args):
+        value = value.lower()
+        if value.isdigit() and int(value) < 7:
+            days.add(int(value))
+        elif value[:3] in WEEKDAYS:
+            days.add(WEEKDAYS.index(value[:3]))
+        else:
+            raise ValueError(f"unknown weekday {value!r}")
+    return days
+
+
+def _date_range(args):
+    first, _, last = (args or '').partition('-')
+    first, last = first.strip(), last.strip()
+    for value in (first, last):
+        if value and not (len(value) == 8 and value.isdigit()):
+            raise ValueError(f"expected YYYYMMDD, got {value!r}")
+    if not (first or last):
+        raise ValueError("expected a range like 20250101-20250331")
+    return first, last
+
+
+def _pillar(index):
+    def factory(args):
+        values = set(_values(args))
+        return lambda facts: facts.pillars[index] in values
+    return factory
+
+
+def _hour_char(position):
+    def factory(args):
+        values = set(_values(args))
+        return lambda facts: facts.hour is not None and facts.hour[position] in values
+    return factory
+
+
+def _in_range(args):
+    first, last = _date_range(args)
+    return lambda facts: (facts.date is not None and (not first or facts.date >= first)
+                          and (not last or facts.date <= last))
+
+
+def _on_weekdays(args):
+    days = _weekdays(args)
+    return lambda facts: facts.weekday in days
+
+
+# name -> factory(args) returning predicate(facts)
+PREDICATES = {
+    'all': lambda args: lambda facts: True,
+    'auspicious': lambda args: lambda facts: facts.marker == '吉',
+    '吉': lambda args: lambda facts: facts.marker == '吉',
+    'inauspicious': lambda args: lambda facts: facts.marker == '凶',
+    '凶': lambda args: lambda facts: facts.marker == '凶',
+    'unmarked': lambda args: lambda facts: facts.marker is None,
+    'taboo': lambda args: lambda facts: bool(facts.taboos),
+    'stem': _hour_char(0),
+    'branch': _hour_char(1),
+    'year': _pillar(0),
+    'month': _pillar(1),
+    'day': _pillar(2),
+    'hour': _pillar(3),
+    'weekday': _on_weekdays,
+    'date': _in_range,
+}
+
+
+def parse_predicate(spec):
+    """Compile a predicate spec such as 'auspicious+!taboo+weekday:sat,sun'
+
+    Raises ValueError for unknown names or malformed arguments.
+    """
+    tests = []
+    for term in spec.split('+'):
+        term = term.strip()
+        negate = term.startswith('!')
+        name, _, args = term.lstrip('!').partition(':')
+        factory = PREDICATES.get(name.strip().lower())
+        if factory is None:
+            raise ValueError(f"unknown predicate {name!r} in {spec!r}")
+        try:
+            test = factory(args)
+        except ValueError as e:
+            raise ValueError(f"{term!r}: {e}")
+        tests.append((test, negate))
+
+    if len(tests) == 1:
+        test, negate = tests[0]
+        return (lambda facts: not test(facts)) if negate else test
+    return lambda facts: all(test(facts) != negate for test, negate in tests)
+
+
+class Feed:
+    """One derived calendar: an output path and the events that belong in it
+
+    where is a predicate spec (see parse_predicate) or a callable taking
+    EventFacts. calendar_name, when given, replaces X-WR-CALNAME.
+    """
+
+    def __init__(self, path, where='all', calendar_name=None):
+        self.path = path
+        self.where = where
+        self.predicate = parse_predicate(where) if isinstance(where, str) else where
+        self.calendar_name = calendar_name
+        self.events = 0
+        self.writer = None
+
+    def __repr__(self):
+        return f'Feed({self.path!r}, {self.where!r})'
+
+
+def standard_feeds(auspicious_path, inauspicious_path):
+    """The classic 吉/凶 pair of split files"""
+    return [
+        Feed(auspicious_path, 'auspicious', AUSPICIOUS_NAME),
+        Feed(inauspicious_path, 'inauspicious', INAUSPICIOUS_NAME),
+    ]
+
+
+class SplitEngine:
+    """Route events to every matching feed in one pass
+
+    Usage:
+        with SplitEngine(feeds) as engine:
+            engine.write_header(header)
+            for event in events:
+                engine.write_event(event)
+            engine.write_footer(footer)
+
+    Text between events ('gap' parts) belongs to no feed and is dropped.
+    With background=True each feed file is written on its own thread
+    (ics_writer.BackgroundWriter).
+    """
+
+    def __init__(self, feeds, atomic=False, fsync=False, background=False):
+        self.feeds = list(feeds)
+        self.atomic = atomic
+        self.fsync = fsync
+        self.background = background
+        self.total_events = 0
+        self.unmatched = 0
+
+    def __enter__(self):
+        opened = []
+        try:
+            for feed in self.feeds:
+                feed.events = 0
+                writer = ICSWriter(feed.path, atomic=self.atomic, fsync=self.fsync)
+                feed.writer = BackgroundWriter(writer) if self.background else writer
+                opened.append(feed.writer)
+        except BaseException:
+            for writer in opened:
+                writer.abort()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for feed in self.feeds:
+            feed.writer.__exit__(exc_type, exc, tb)
+        return False
+
+    @property
+    def bytes_written(self):
+        return sum(feed.writer.bytes_written for feed in self.feeds)
+
+    def write_header(self, header):
+        for feed in self.feeds:
+            feed.writer.write(rename_calendar(header, feed.calendar_name) if feed.calendar_name else header)
+
+    def write_footer(self, footer):
+        data = footer.encode('utf-8')
+        for feed in self.feeds:
+            feed.writer.write_bytes(data)
+
+    def write_event(self, event_text, facts=None):
+        """Write one VEVENT to each matching feed; return how many matched"""
+        facts = facts or EventFacts(event_text)
+        return self.write_event_chunks((event_text.encode('utf-8'),), facts)
+
+    def write_event_chunks(self, chunks, facts):
+        """Write one VEVENT given as byte chunks (e.g. slices of a mapped file)"""
+        self.total_events += 1
+        matched = 0
+        for feed in self.feeds:
+            if feed.predicate(facts):
+                for chunk in chunks:
+                    feed.writer.write_bytes(chunk)
+                feed.events += 1
+                matched += 1
+        if not matched:
+            self.unmatched += 1
+        return matched
+
+    def write_part(self, kind, text):
+        """Dispatch a ('header' | 'event' | 'gap' | 'footer', text) part"""
+        if kind == 'event':
+            self.write_event(text)
+        elif kind == 'header':
+            self.write_header(text)
+        elif kind == 'footer':
+            self.write_footer(text)
+
+
+def split_content(content, feeds, atomic=False, fsync=False, facts=None):
+    """Split calendar text held in memory; return the SplitEngine with its counts
+
+    facts, if given, maps an event's position to its EventFacts (e.g.
+    BinaryCalendar.facts), so the events need not be parsed again.
+    """
+    header, events, footer = calendar_sections(content)
+    with SplitEngine(feeds, atomic=atomic, fsync=fsync) as engine:
+        engine.write_header(header)
+        progress = progress_reporter(len(events), 'Splitting')
+        for idx, event in enumerate(events):
+            progress.update(idx + 1)
+            engine.write_event(f'BEGIN:VEVENT{event}', facts(idx) if facts else None)
+        progress.finish()
+        engine.write_footer(footer)
+    return engine
+
+
+def split_file(source, feeds, atomic=False, fsync=False):
+    """Split the calendar at source into the feeds; return the SplitEngine
+
+    The source is memory-mapped and events are copied to the feeds as
+    byte slices; only the properties the predicates read are decoded.
+    """
+    with MappedCalendar(source) as calendar, \
+            SplitEngine(feeds, atomic=atomic, fsync=fsync) as engine:
+        for kind, start, end in calendar.parts():
+            if kind == 'event':
+                event = calendar.event(start, end)
+                engine.write_event_chunks((event.chunk,), EventFacts.from_record(event))
+            elif kind == 'header':
+                engine.write_header(calendar.text(start, end))
+            elif kind == 'footer':
+                engine.write_footer(calendar.text(start, end))
+    return engine
+
+
+def parse_feed(argument):
+    """Feed from a PATH=SPEC command-line argument"""
+    path, separator, spec = argument.partition('=')
+    if not separator or not path.strip() or not spec.strip():
+        raise ValueError(f"expected PATH=SPEC, got {argument!r}")
+    return Feed(path.strip(), spec.strip())
+
+
+def load_feeds(filepath):
+    """Feeds listed in a JSON file as [{"path", "where", "name"}, ...]"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return [Feed(entry['path'], entry.get('where', 'all'), entry.get('name')) for entry in entries]
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        epilog='Without --feed/--feeds the classic 吉/凶 pair is written.'
+    )
+    parser.add_argument('calendar', nargs='?', default=INPUT_FILE, help=f'enhanced calendar (default {INPUT_FILE})')
+    parser.add_argument('--feed', action='append', default=[], metavar='PATH=SPEC',
+                        help='write the events matching SPEC to PATH (repeatable)')
+    parser.add_argument('--feeds', metavar='JSON', help='read feed definitions from a JSON file')
+    parser.add_argument('--atomic-writes', action='store_true',
+                        help='write each feed to a temporary file and atomically rename it into place')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+    try:
+        feeds = [parse_feed(argument) for argument in args.feed]
+        if args.feeds:
+            feeds += load_feeds(args.feeds)
+    except (ValueError, KeyError, OSError) as e:
+        raise SystemExit(f"❌ {e}")
+    if not feeds:
+        feeds = standard_feeds("cal_trunkBranch_auspicious.ics", "cal_trunkBranch_inauspicious.ics")
+
+    engine = split_file(args.calendar, feeds, atomic=args.atomic_writes)
+
+    print(f"✓ Split {engine.total_events:,} events from {args.calendar} into {len(feeds)} feeds")
+    for feed in feeds:
+        print(f"  {feed.path:<40} {feed.events:>8,}  {feed.where}")
+    print(f"  {'(no feed)':<40} {engine.unmatched:>8,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Synthetic Calendar Generator
+Write trunk, good_bad and pengzu ICS files for an arbitrary range of years
+in the exact formats enhance_calendar_v2.py parses, for benchmarking.
+
+    python3 synthetic_calendar.py --start-year 2000 --years 50 --output-dir /tmp/synthetic
+
+Day and hour pillars follow the real sexagenary cycle (early-zi: the
+23:00 slot already belongs to the next day), hour markers use the 黄道/黑道
+twelve-spirit rule and taboos the Pengzu stem/branch sayings, so every
+trunk hour finds its marker and taboo exactly as with the real calendars.
+Trunk events come from ganzhi_calendar.py, with month pillars on the
+computed solar terms and year pillars on the Lunar New Year.
+"""
+
+import argparse
+import os
+import uuid
+from datetime import date, timedelta
+
+from ganzhi import SEXAGENARY
+from ganzhi_calendar import FOOTER, TRUNK_HEADER, day_position, hour_position, iter_trunk_events
+from ics_writer import ICSWriter
+
+TRUNK_NAME = "cal_trunkBranch.ics"
+GOOD_BAD_NAME = "good_bad_time.ics"
+PENGZU_NAME = "pengzu_100_taboos.ics"
+
+MAX_YEARS = 100
+
+# 青龙 明堂 天刑 朱雀 金匮 天德 白虎 玉堂 天牢 玄武 司命 勾陈
+HUANGDAO = (True, True, False, False, True, True, False, True, False, False, True, False)
+
+STEM_TABOOS = (
+    '甲不开仓 财物耗散', '乙不栽植 千株不长', '丙不修灶 必见灾殃', '丁不剃头 头必生疮',
+    '戊不受田 田主不祥', '己不破券 二比并亡', '庚不经络 织机虚张', '辛不合酱 主人不尝',
+    '壬不泱水 更难提防', '癸不词讼 理弱敌强',
+)
+BRANCH_TABOOS = (
+    '子不问卜 自惹祸殃', '丑不冠带 主不还乡', '寅不祭祀 神鬼不尝', '卯不穿井 水泉不香',
+    '辰不哭泣 必主重丧', '巳不远行 财物伏藏', '午不苫盖 屋主更张', '未不服药 毒气入肠',
+    '申不安床 鬼祟入房', '酉不会客 醉坐颠狂', '戌不吃犬 作怪上床', '亥不嫁娶 不利新郎',
+)
+
+UID_NAMESPACE = uuid.UUID('6f1c2a52-3c4e-4f0e-9b7a-2d5c8e1f0a11')
+
+STAMP = '20260105T015232Z'
+
+DAILY_HEADER = (
+    "BEGIN:VCALENDAR\n"
+    "VERSION:2.0\n"
+    "PRODID:-//github//Chinese Calendar//oooldtoy\n"
+    "CALSCALE:GREGORIAN\n"
+    "METHOD:PUBLISH\n"
+    "X-WR-CALNAME:{name}\n"
+    "X-WR-TIMEZONE:Asia/Shanghai\n"
+    "X-WR-CALDESC:{description}\n"
+)
+
+
+def hour_marker(day_pos, branch):
+    """'吉' for a 黄道 hour, '凶' for a 黑道 hour"""
+    start = (8 + 2 * (day_pos % 12 % 6)) % 12  # where 青龙 falls for the day branch
+    return '吉' if HUANGDAO[(branch - start) % 12] else '凶'
+
+
+def iter_days(start_year, years):
+    day = date(start_year, 1, 1)
+    end = date(start_year + years, 1, 1)
+    while day < end:
+        yield day
+        day += timedelta(days=1)
+
+
+def daily_event(day, kind, summary):
+    """One all-day VEVENT in the good_bad / pengzu layout"""
+    today = day.strftime('%Y%m%d')
+    tomorrow = (day + timedelta(days=1)).strftime('%Y%m%d')
+    uid = uuid.uuid5(UID_NAMESPACE, f'{kind}:{today}')
+    return (
+        "BEGIN:VEVENT\n"
+        f"DTSTAMP:{STAMP}\n"
+        f"UID:{uid}\n"
+        f"DTSTART;VALUE=DATE:{today}\n"
+        f"DTEND;VALUE=DATE:{tomorrow}\n"
+        "STATUS:CONFIRMED\n"
+        f"SUMMARY:{summary}\n"
+        "END:VEVENT\n"
+    )
+
+
+def good_bad_summary(day):
+    """13 'ganzhi+marker' slots: 子..亥 of the day, then the next day's 子"""
+    day_pos = day_position(day)
+    slots = [(day_pos, branch) for branch in range(12)]
+    slots.append(((day_pos + 1) % 60, 0))
+    return ' '.join(
+        SEXAGENARY[hour_position(pos, branch)] + hour_marker(pos, branch)
+        for pos, branch in slots
+    )
+
+
+def pengzu_summary(day):
+    """The day stem's and day branch's taboos, comma separated"""
+    day_pos = day_position(day)
+    return f'{STEM_TABOOS[day_pos % 10]},{BRANCH_TABOOS[day_pos % 12]}'
+
+
+def write_calendar(filepath, header, events):
+    with ICSWriter(filepath) as writer:
+        writer.write(header)
+        writer.writelines(events)
+        writer.write(FOOTER)
+    return writer.bytes_written
+
+
+def generate(output_dir, start_year, years):
+    """Write the three calendars into output_dir; return {path: bytes}"""
+    if not 1 <= years <= MAX_YEARS:
+        raise ValueError(f"years must be between 1 and {MAX_YEARS}, got {years}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    span = f'{start_year}-{start_year + years - 1}'
+    outputs = {}
+
+    path = os.path.join(output_dir, TRUNK_NAME)
+    last_day = date(start_year + years, 1, 1) - timedelta(days=1)
+    outputs[path] = write_calendar(path, TRUNK_HEADER, iter_trunk_events(date(start_year, 1, 1), last_day))
+
+    path = os.path.join(output_dir, GOOD_BAD_NAME)
+    header = DAILY_HEADER.format(name='时辰吉凶', description=f'{span}时辰吉凶')
+    events = (daily_event(day, 'good_bad', good_bad_summary(day)) for day in iter_days(start_year, years))
+    outputs[path] = write_calendar(path, header, events)
+
+    path = os.path.join(output_dir, PENGZU_NAME)
+    header = DAILY_HEADER.format(name='彭祖百忌', description=f'{span}彭祖百忌')
+    events = (daily_event(day, 'pengzu', pengzu_summary(day)) for day in iter_days(start_year, years))
+    outputs[path] = write_calendar(path, header, events)
+
+    return outputs
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--start-year', type=int, default=2025, help='first Gregorian year (default 2025)')
+    parser.add_argument('--years', type=int, default=1, help=f'number of years, 1-{MAX_YEARS} (default 1)')
+    parser.add_argument('--output-dir', default='synthetic', help='directory for the three calendars')
+    return parser.parse_args()
+
+
+def main():
+    """Main execution"""
+    args = parse_args()
+    try:
+        outputs = generate(args.output_dir, args.start_year, args.years)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+
+    for path, size in outputs.items():
+        print(f"✓ Wrote {path} ({size:,} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Taboo Index
+Direct (day, stem) and (day, branch) lookup of Pengzu taboos.
+
+Each day owns 22 cells: 10 heavenly stems followed by 12 earthly branches.
+A cell holds an id into an interned table of taboo texts (0 = none), so
+finding the taboos for an hour is one array index instead of a scan over
+the day's (stem, text) list, and branch taboos such as '午不苫盖 屋主更张'
+are reachable the same way as stem taboos.
+"""
+
+from array import array
+
+from ganzhi import BRANCH_INDEX, STEM_INDEX, date_to_ordinal, ordinal_to_date, STEMS, BRANCHES
+
+STEM_COUNT = 10
+BRANCH_COUNT = 12
+WIDTH = STEM_COUNT + BRANCH_COUNT
+
+NO_TABOOS = ()
+
+
+def taboo_column(taboo_text):
+    """Cell column for a taboo: its stem (0-9) or 10 + branch, or -1"""
+    key = taboo_text[:1]
+    if key in STEM_INDEX:
+        return STEM_INDEX[key]
+    if key in BRANCH_INDEX:
+        return STEM_COUNT + BRANCH_INDEX[key]
+    return -1
+
+
+class TabooIndex:
+    """Day-ordinal x (stem | branch) table of interned taboo texts
+
+    `include_branch` controls whether lookup() also returns the taboo of
+    the hour's earthly branch. It defaults to False, matching the original
+    stem-only behaviour.
+    """
+
+    def __init__(self, base_ordinal=0, days=0, cells=None, texts=None, entries=0):
+        self.base_ordinal = base_ordinal
+        self.days = days
+        self.cells = cells if cells is not None else array('H', bytes(2 * days * WIDTH))
+        # texts[0] is the empty entry; every other id maps to a tuple of taboo strings
+        self.texts = texts if texts is not None else [NO_TABOOS]
+        self.entries = entries
+        self.include_branch = False
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build from an iterable of (yyyymmdd, taboo_text) pairs"""
+        cells = {}
+        for date, text in entries:
+            ordinal = date_to_ordinal(date)
+            column = taboo_column(text)
+            if ordinal < 0 or column < 0:
+                continue
+            cells.setdefault((ordinal, column), []).append(text)
+
+        if not cells:
+            return cls()
+
+        first = min(key[0] for key in cells)
+        last = max(key[0] for key in cells)
+        index = cls(first, last - first + 1)
+        interned = {}
+        for (ordinal, column), texts in cells.items():
+            texts = tuple(texts)
+            if texts not in interned:
+                interned[texts] = len(index.texts)
+                index.texts.append(texts)
+            index.cells[(ordinal - first) * WIDTH + column] = interned[texts]
+            index.entries += len(texts)
+        return index
+
+    def __getstate__(self):
+        # Detach from a memory-mapped cache so the index can be pickled
+        state = self.__dict__.copy()
+        state['cells'] = array('H', self.cells)
+        state.pop('mapping', None)
+        return state
+
+    def __len__(self):
+        return self.entries
+
+    @property
+    def nbytes(self):
+        return self.cells.itemsize * len(self.cells)
+
+    def _cell(self, ordinal, column):
+        day = ordinal - self.base_ordinal
+        if day < 0 or day >= self.days or column < 0:
+            return 0
+        return self.cells[day * WIDTH + column]
+
+    def stem_taboos(self, ordinal, stem):
+        """Taboo texts for a day ordinal and stem index 0-9"""
+        return self.texts[self._cell(ordinal, stem)]
+
+    def branch_taboos(self, ordinal, branch):
+        """Taboo texts for a day ordinal and branch index 0-11"""
+        return self.texts[self._cell(ordinal, STEM_COUNT + branch)]
+
+    def lookup(self, date, ganzhi):
+        """Taboo texts that apply to an hour ganzhi on a 'YYYYMMDD' date"""
+        return self.lookup_day(date_to_ordinal(date), ganzhi)
+
+    def lookup_day(self, ordinal, ganzhi):
+        """Taboo texts that apply to an hour ganzhi on a day ordinal"""
+        stem = STEM_INDEX.get(ganzhi[:1], -1)
+        taboos = self.stem_taboos(ordinal, stem) if stem >= 0 else NO_TABOOS
+        if self.include_branch:
+            branch = BRANCH_INDEX.get(ganzhi[1:2], -1)
+            if branch >= 0:
+                taboos = taboos + self.branch_taboos(ordinal, branch)
+        return taboos
+
+    def items(self):
+        """Yield (yyyymmdd, key_character, taboo_text) for every taboo"""
+        keys = STEMS + BRANCHES
+        for day in range(self.days):
+            row = day * WIDTH
+            date = None
+            for column in range(WIDTH):
+                text_id = self.cells[row + column]
+                if text_id:
+                    date = date or ordinal_to_date(self.base_ordinal + day)
+                    for text in self.texts[text_id]:
+                        yield date, keys[column], text
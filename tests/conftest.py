@@ -0,0 +1,34 @@
+"""Shared fixtures: the modules live flat in the repository root"""
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from auspicious_times import calendar_sections  # noqa: E402
+
+ENHANCED_FILE = ROOT / 'cal_trunkBranch_enhanced.ics'
+GOOD_BAD_FILE = ROOT / 'good_bad_time.ics'
+PENGZU_FILE = ROOT / 'pengzu_100_taboos.ics'
+
+
+@pytest.fixture(scope='session')
+def enhanced_sample():
+    """(header, events, footer) of the first 48 events of the shipped enhanced calendar"""
+    content = ENHANCED_FILE.read_text(encoding='utf-8')
+    header, events, footer = calendar_sections(content)
+    return header, [f'BEGIN:VEVENT{event}' for event in events[:48]], footer
+
+
+@pytest.fixture
+def reference_files(tmp_path):
+    """Copies of the reference calendars, so a test may touch or cache them freely"""
+    good_bad = tmp_path / GOOD_BAD_FILE.name
+    pengzu = tmp_path / PENGZU_FILE.name
+    shutil.copyfile(GOOD_BAD_FILE, good_bad)
+    shutil.copyfile(PENGZU_FILE, pengzu)
+    return {'good_bad': str(good_bad), 'pengzu': str(pengzu)}
@@ -0,0 +1,33 @@
+import pytest
+
+from auspicious_times import Enhancer, calendar_sections
+from conftest import ROOT
+from ics_tokenizer import fold_line
+
+
+@pytest.fixture(scope='module')
+def trunk_events():
+    content = (ROOT / 'cal_trunkBranch.ics').read_text(encoding='utf-8')
+    _, events, _ = calendar_sections(content)
+    return [f'BEGIN:VEVENT{event}' for event in events[:24]]
+
+
+@pytest.fixture
+def enhancer(reference_files):
+    return Enhancer(reference_files['good_bad'], reference_files['pengzu'], use_cache=False)
+
+
+def test_crlf_event_keeps_its_line_endings(enhancer, trunk_events):
+    for event in trunk_events:
+        enhanced = enhancer.enhance_event(event)
+        assert enhanced != event
+        assert enhancer.enhance_event(event.replace('\n', '\r\n')) == enhanced.replace('\n', '\r\n')
+
+
+def test_folded_lines_outside_summary_are_kept(enhancer, trunk_events):
+    event = trunk_events[0]
+    description = next(line for line in event.split('\n') if line.startswith('DESCRIPTION:'))
+    folded = event.replace(description, fold_line(description + ' ' * 80))
+    enhanced = enhancer.enhance_event(folded)
+    assert fold_line(description + ' ' * 80) in enhanced
+    assert 'SUMMARY:『' in enhanced and enhanced != folded
@@ -0,0 +1,52 @@
+import pytest
+
+from binary_calendar import FLAG_VERBATIM, BinaryCalendar, encode_calendar
+from ics_tokenizer import fold_line
+
+
+def variant(text, newline, fold):
+    lines = text.split('\n')
+    if fold:
+        lines = [fold_line(line, newline='\n') for line in lines]
+    return '\n'.join(lines).replace('\n', newline)
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+@pytest.mark.parametrize('fold', [False, True])
+def test_round_trip_is_byte_identical_and_templated(tmp_path, enhanced_sample, newline, fold):
+    header, events, footer = enhanced_sample
+    header, footer = variant(header, newline, fold), variant(footer, newline, fold)
+    events = [variant(event, newline, fold) for event in events]
+    path = tmp_path / 'cal.bin'
+    encode_calendar(path, header, events, footer)
+    ics = tmp_path / 'cal.ics'
+
+    with BinaryCalendar.open(path) as binary:
+        assert binary.newline == newline
+        assert not any(flag & FLAG_VERBATIM for flag in binary.flags)
+        binary.write_ics(ics)
+
+    assert ics.read_bytes() == ''.join([header, *events, footer]).encode('utf-8')
+
+
+def test_mixed_line_endings_are_stored_verbatim(tmp_path, enhanced_sample):
+    header, events, footer = enhanced_sample
+    events = list(events)
+    events[1] = events[1].replace('\n', '\r\n', 2)
+    path = tmp_path / 'cal.bin'
+    encode_calendar(path, header, events, footer)
+
+    with BinaryCalendar.open(path) as binary:
+        assert [bool(flag & FLAG_VERBATIM) for flag in binary.flags[:3]] == [False, True, False]
+        assert list(binary.iter_events()) == events
+
+
+def test_marker_rows_match_summaries(tmp_path, enhanced_sample):
+    header, events, footer = enhanced_sample
+    path = tmp_path / 'cal.bin'
+    encode_calendar(path, header, events, footer)
+
+    with BinaryCalendar.open(path) as binary:
+        auspicious = [binary.event(row) for row in binary.rows(marker='吉')]
+    assert auspicious
+    assert auspicious == [event for event in events if 'SUMMARY:『吉' in event]
@@ -0,0 +1,38 @@
+from ics_tokenizer import FOLD_LIMIT, fold_line, iter_components, iter_properties, unfold
+
+
+def test_unfold_joins_continuations_and_normalizes_crlf():
+    text = 'SUMMARY:『甲子时\r\n 吉』\r\nUID:1\r\n\tx\r\n'
+    assert unfold(text) == 'SUMMARY:『甲子时吉』\nUID:1x\n'
+
+
+def test_fold_line_round_trips_without_splitting_characters():
+    line = 'SUMMARY:『吉 [庚不经络 织机虚张] [午不苫盖 屋主更张] 甲子时 (23:00-01:00)』' * 2
+    folded = fold_line(line, newline='\r\n')
+    physical = folded.split('\r\n')
+    assert len(physical) > 1
+    assert all(len(part.encode('utf-8')) <= FOLD_LIMIT for part in physical)
+    assert all(part.startswith(' ') for part in physical[1:])
+    assert unfold(folded) == line
+
+
+def test_short_line_is_not_folded():
+    assert fold_line('UID:1') == 'UID:1'
+
+
+def test_iter_properties_across_chunk_boundaries():
+    # A folded line and a quoted parameter split over several chunks
+    chunks = ['BEGIN:VEVENT\r\nSUMMARY:ab\r', '\n c\r\nATTENDEE;CN="Doe', ';J":mailto:j@x\r\nEND:VEVENT\r\n']
+    assert list(iter_properties(chunks)) == [
+        ('BEGIN', {}, 'VEVENT'),
+        ('SUMMARY', {}, 'abc'),
+        ('ATTENDEE', {'CN': 'Doe;J'}, 'mailto:j@x'),
+        ('END', {}, 'VEVENT'),
+    ]
+
+
+def test_iter_components_skips_nested_properties():
+    text = ('BEGIN:VCALENDAR\nBEGIN:VEVENT\nBEGIN:VALARM\nSUMMARY:alarm\nEND:VALARM\n'
+            'DTSTART;TZID=Asia/Shanghai:20250101T000000\nSUMMARY:event\nSUMMARY:second\n'
+            'END:VEVENT\nEND:VCALENDAR\n')
+    assert list(iter_components([text])) == [{'DTSTART': '20250101T000000', 'SUMMARY': 'event'}]
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from auspicious_times import load_reference_tables
+from lookup_cache import default_cache_path, load_cache, save_cache
+
+
+def mapped_files(path):
+    """Mappings of path in this process"""
+    if not os.path.exists('/proc/self/maps'):
+        pytest.skip('needs /proc/self/maps')
+    with open('/proc/self/maps', encoding='utf-8') as f:
+        return sum(1 for line in f if line.rstrip().endswith(str(path)))
+
+
+@pytest.fixture
+def cache(tmp_path, reference_files):
+    marker_index, taboo_index, from_cache = load_reference_tables(*reference_files.values(), use_cache=False)
+    assert not from_cache
+    path = tmp_path / 'lookup.cache'
+    save_cache(path, reference_files, marker_index, taboo_index)
+    return path, marker_index, taboo_index
+
+
+def test_round_trip(cache, reference_files):
+    path, marker_index, taboo_index = cache
+    loaded = load_cache(path, reference_files)
+    assert loaded is not None
+    cached_markers, cached_taboos = loaded
+    assert list(cached_markers.items()) == list(marker_index.items())
+    assert list(cached_taboos.items()) == list(taboo_index.items())
+    assert cached_taboos.lookup('20250101', '庚子') == taboo_index.lookup('20250101', '庚子')
+
+
+def test_load_reference_tables_writes_and_reuses_cache(reference_files):
+    load_reference_tables(*reference_files.values())
+    assert os.path.exists(default_cache_path(reference_files['good_bad']))
+    *_, from_cache = load_reference_tables(*reference_files.values())
+    assert from_cache
+
+
+def test_changed_source_rejects_cache(cache, reference_files):
+    path, _, _ = cache
+    with open(reference_files['pengzu'], 'a', encoding='utf-8') as f:
+        f.write('\n')
+    assert load_cache(path, reference_files) is None
+
+
+@pytest.mark.parametrize('cut', [1, 100, 1000, 1 << 30])
+def test_truncated_cache_is_rejected(cache, reference_files, cut):
+    path, _, _ = cache
+    size = path.stat().st_size
+    os.truncate(path, max(size - cut, 0))
+    assert load_cache(path, reference_files) is None
+    assert mapped_files(path) == 0
+
+
+def test_corrupt_string_table_is_rejected_and_unmapped(cache, reference_files):
+    path, _, _ = cache
+    data = bytearray(path.read_bytes())
+    # The UTF-8 blob of taboo texts is the last section; break its first character
+    data[data.index('不'.encode('utf-8'))] = 0xff
+    path.write_bytes(data)
+    assert load_cache(path, reference_files) is None
+    assert mapped_files(path) == 0
+
+
+def test_missing_or_unreadable_cache(tmp_path, reference_files):
+    assert load_cache(tmp_path / 'missing.cache', reference_files) is None
+    assert load_cache(tmp_path, reference_files) is None
@@ -0,0 +1,59 @@
+import pytest
+
+from auspicious_times import AUSPICIOUS_NAME, INAUSPICIOUS_NAME
+from split_engine import split_content, split_file, standard_feeds
+
+
+@pytest.fixture
+def crlf_calendar(tmp_path, enhanced_sample):
+    header, events, footer = enhanced_sample
+    content = ''.join([header, *events, footer]).replace('\n', '\r\n')
+    path = tmp_path / 'cal.ics'
+    path.write_bytes(content.encode('utf-8'))
+    return path, content
+
+
+def split_outputs(directory):
+    return [directory / 'auspicious.ics', directory / 'inauspicious.ics']
+
+
+def assert_crlf_outputs(paths, content):
+    for path, name in zip(paths, (AUSPICIOUS_NAME, INAUSPICIOUS_NAME)):
+        data = path.read_bytes()
+        lines = data.split(b'\r\n')
+        assert b'\n' not in b''.join(lines), f"{path.name} has LF-only lines"
+        assert f'X-WR-CALNAME:{name}\r\n'.encode('utf-8') in data
+        # Every event is copied unchanged from the source
+        for event in data.decode('utf-8').split('BEGIN:VEVENT')[1:]:
+            event = event.split('END:VEVENT')[0]
+            assert f'BEGIN:VEVENT{event}END:VEVENT' in content
+
+
+def test_split_file_keeps_crlf(tmp_path, crlf_calendar):
+    source, content = crlf_calendar
+    paths = split_outputs(tmp_path)
+    engine = split_file(source, standard_feeds(*paths))
+    assert engine.total_events == 48
+    assert_crlf_outputs(paths, content)
+
+
+def test_split_content_matches_split_file(tmp_path, crlf_calendar):
+    source, content = crlf_calendar
+    mapped = split_outputs(tmp_path / 'mapped')
+    text = split_outputs(tmp_path / 'text')
+    for path in mapped + text:
+        path.parent.mkdir(exist_ok=True)
+    split_file(source, standard_feeds(*mapped))
+    split_content(content, standard_feeds(*text))
+    assert_crlf_outputs(text, content)
+    assert [path.read_bytes() for path in text] == [path.read_bytes() for path in mapped]
+
+
+def test_auspicious_and_inauspicious_partition_the_events(tmp_path, crlf_calendar):
+    source, _ = crlf_calendar
+    paths = split_outputs(tmp_path)
+    feeds = standard_feeds(*paths)
+    engine = split_file(source, feeds)
+    assert feeds[0].events and feeds[1].events
+    assert feeds[0].events + feeds[1].events == engine.total_events
+    assert all('SUMMARY:『吉' in event for event in paths[0].read_text(encoding='utf-8').split('BEGIN:VEVENT')[1:])
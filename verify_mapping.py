@@ -69,51 +69,53 @@ def enhance_summary(summary, marker):
     """Add marker to summary"""
     return f"『{marker} {summary[1:-1]}』"
 
-# Build lookup
-print("=" * 80)
-print("BUILDING LOOKUP DICTIONARY")
-print("=" * 80)
-lookup = build_lookup(good_bad_sample)
+def main():
+    """Run the mapping logic on the sample data"""
+    # Build lookup
+    print("=" * 80)
+    print("BUILDING LOOKUP DICTIONARY")
+    print("=" * 80)
+    lookup = build_lookup(good_bad_sample)
 
-for date, mapping in sorted(lookup.items()):
-    print(f"\n{date}:")
-    for ganzhi, marker in sorted(mapping.items())[:5]:
-        print(f"  {ganzhi} → {marker}")
-    print(f"  ... ({len(mapping)} total)")
+    for date, mapping in sorted(lookup.items()):
+        print(f"\n{date}:")
+        for ganzhi, marker in sorted(mapping.items())[:5]:
+            print(f"  {ganzhi} → {marker}")
+        print(f"  ... ({len(mapping)} total)")
 
-# Test mapping on samples
-print("\n" + "=" * 80)
-print("TESTING MAPPING ON SAMPLE DATA")
-print("=" * 80)
+    # Test mapping on samples
+    print("\n" + "=" * 80)
+    print("TESTING MAPPING ON SAMPLE DATA")
+    print("=" * 80)
 
-for i, event in enumerate(trunk_samples, 1):
-    print(f"\nEvent {i}:")
-    print(f"  DTSTART: {event['dtstart']}")
-    print(f"  Original SUMMARY: {event['summary']}")
-    
-    # Extract date and time
-    date = event['dtstart'][:8]
-    time_ganzhi = extract_time_ganzhi(event['summary'])
-    
-    print(f"  Extracted date: {date}")
-    print(f"  Extracted time ganzhi: {time_ganzhi}")
-    
-    if date in lookup and time_ganzhi and time_ganzhi in lookup[date]:
-        marker = lookup[date][time_ganzhi]
-        new_summary = enhance_summary(event['summary'], marker)
-        print(f"  Marker: {marker}")
-        print(f"  Enhanced SUMMARY: {new_summary}")
-    else:
-        print(f"  ⚠️  LOOKUP FAILED!")
-        if date not in lookup:
-            print(f"     Date {date} not found in lookup")
-        elif time_ganzhi not in lookup[date]:
-            print(f"     Time ganzhi {time_ganzhi} not found for date {date}")
+    for i, event in enumerate(trunk_samples, 1):
+        print(f"\nEvent {i}:")
+        print(f"  DTSTART: {event['dtstart']}")
+        print(f"  Original SUMMARY: {event['summary']}")
+        
+        # Extract date and time
+        date = event['dtstart'][:8]
+        time_ganzhi = extract_time_ganzhi(event['summary'])
+        
+        print(f"  Extracted date: {date}")
+        print(f"  Extracted time ganzhi: {time_ganzhi}")
+        
+        if date in lookup and time_ganzhi and time_ganzhi in lookup[date]:
+            marker = lookup[date][time_ganzhi]
+            new_summary = enhance_summary(event['summary'], marker)
+            print(f"  Marker: {marker}")
+            print(f"  Enhanced SUMMARY: {new_summary}")
+        else:
+            print(f"  ⚠️  LOOKUP FAILED!")
+            if date not in lookup:
+                print(f"     Date {date} not found in lookup")
+            elif time_ganzhi not in lookup[date]:
+                print(f"     Time ganzhi {time_ganzhi} not found for date {date}")
 
-print("\n" + "=" * 80)
-print("VERIFICATION COMPLETE")
-print("=" * 80)
-print("""
+    print("\n" + "=" * 80)
+    print("VERIFICATION COMPLETE")
+    print("=" * 80)
+    print("""
 ✓ Time ganzhi extraction: OK
 ✓ Date extraction: OK  
 ✓ Lookup dictionary: OK
@@ -121,3 +123,6 @@ print("""
 
 Ready to implement full solution!
 """)
+
+if __name__ == '__main__':
+    main()